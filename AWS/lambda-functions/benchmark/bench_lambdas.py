@@ -0,0 +1,222 @@
+"""
+Offline benchmark harness for the Lambda functions in AWS/lambda-functions/.
+
+Runs each lambda_handler against a local S3 stand-in seeded with a configurable
+number of keys and prefix distribution, and reports S3 API call counts,
+wall time, invocations and peak memory. By default the stand-in is moto's
+in-process S3 mock; pass --endpoint-url to use a local MinIO-compatible
+server instead.
+
+Usage:
+    $ python bench_lambdas.py --keys 20000 --prefixes 20 --distribution skewed
+    $ python bench_lambdas.py --keys 5000 --budget-ms 40000 --only delete
+    $ python bench_lambdas.py --endpoint-url http://localhost:9000 --keys 100000
+"""
+import collections
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDAS = {
+    'delete': os.path.join(LAMBDA_DIR, 'delete-keys-aws-s3-with-csv-patterns', 'lambda_functions.py'),
+    'list': os.path.join(LAMBDA_DIR, 'list-s3-content.py'),
+}
+BUCKET = 'bench-bucket'
+MANIFEST_BUCKET = 'bench-manifests'
+MAX_INVOCATIONS = 1000  # Per delete run; a resume loop that needs more is treated as stuck
+
+
+class FakeContext:
+    """Minimal Lambda context whose deadline is budget_ms after creation."""
+
+    def __init__(self, budget_ms):
+        self.deadline = time.monotonic() + budget_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def load_module(name, path):
+    """Imports a Lambda file by path (list-s3-content.py is not a valid module name)."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def count_calls(client):
+    """Counts every S3 API operation made through client."""
+    counts = collections.Counter()
+    client.meta.events.register('before-call.s3', lambda model, **kwargs: counts.update([model.name]))
+    return counts
+
+
+def prefix_weights(prefixes, distribution):
+    if distribution == 'uniform':
+        return [1] * prefixes
+    # Zipf-like: a few prefixes hold most of the keys, like real image folders
+    return [1 / (rank + 1) for rank in range(prefixes)]
+
+
+def seed_bucket(client, keys, prefixes, distribution, seed):
+    """Creates the bench bucket and fills it with keys spread over prefixes; returns the prefixes."""
+    rng = random.Random(seed)
+    names = [f'site-{i:03d}/images/' for i in range(prefixes)]
+    client.create_bucket(Bucket=BUCKET)
+    client.create_bucket(Bucket=MANIFEST_BUCKET)
+    for i, prefix in enumerate(rng.choices(names, weights=prefix_weights(prefixes, distribution), k=keys)):
+        client.put_object(Bucket=BUCKET, Key=f'{prefix}{i:08d}.jpg', Body=b'\xff\xd8\xff\xe0' + b'0' * 60)
+    return names
+
+
+def empty_bucket(client, bucket):
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket):
+        objects = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if objects:
+            client.delete_objects(Bucket=bucket, Delete={'Objects': objects, 'Quiet': True})
+
+
+@contextlib.contextmanager
+def measure(result):
+    """Records wall time and peak Python memory of the enclosed block into result."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        result['wall_sec'] = round(time.perf_counter() - start, 3)
+        result['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+
+
+def bench_delete(module, patterns, budget_ms, workdir, max_invocations=MAX_INVOCATIONS):
+    """
+    Deletes every seeded prefix, re-invoking with the cursor until the run is done.
+
+    Stops with an error after max_invocations, or as soon as an invocation hands
+    back the cursor it was given, since re-invoking would loop forever.
+    """
+    with open(os.path.join(workdir, 'patterns.csv'), 'w') as f:
+        f.write('\n'.join(patterns) + '\n')
+    os.environ['TARGET_BUCKET'] = BUCKET
+    counts = count_calls(module.s3_client)
+    result = {'lambda': 'delete', 'invocations': 0}
+
+    previous_dir = os.getcwd()
+    os.chdir(workdir)  # lambda_handler reads patterns.csv from the working directory
+    try:
+        with measure(result):
+            event = {}
+            while True:
+                response = module.lambda_handler(event, FakeContext(budget_ms))
+                result['invocations'] += 1
+                if 'error' in response or response.get('done'):
+                    break
+                if response['cursor'] == event.get('cursor'):
+                    response['error'] = 'No progress: the cursor did not change between invocations'
+                    break
+                if result['invocations'] >= max_invocations:
+                    response['error'] = f'Not done after {max_invocations} invocations'
+                    break
+                event = {'cursor': response['cursor']}
+    finally:
+        os.chdir(previous_dir)
+
+    result['deleted'] = response.get('summary', {}).get('deleted')
+    result['error'] = response.get('error')
+    result['calls'] = dict(counts)
+    return result
+
+
+def bench_list(module, process):
+    """Scans the whole bench bucket into a manifest uploaded to S3."""
+    counts = count_calls(module.s3)
+    result = {'lambda': f'list ({process})', 'invocations': 1}
+    event = {'bucket': BUCKET, 'prefix': '', 'process': process, 'output': f's3://{MANIFEST_BUCKET}/manifest.jsonl'}
+    with measure(result):
+        response = module.lambda_handler(event, FakeContext(15 * 60 * 1000))
+    result['objects'] = response['objects']
+    result['calls'] = dict(counts)
+    return result
+
+
+def print_report(results):
+    print(f"\n{'lambda':<20} {'inv':>4} {'wall s':>8} {'peak MB':>8}  calls")
+    for r in results:
+        calls = ', '.join(f'{op}={n}' for op, n in sorted(r['calls'].items()))
+        print(f"{r['lambda']:<20} {r['invocations']:>4} {r['wall_sec']:>8} {r['peak_traced_mb']:>8}  {calls}")
+        if r.get('error'):
+            print(f"{'':<20} error: {r['error']}")
+    print(f"\nProcess max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+def main():
+    parser = ArgumentParser(description='Benchmark the S3 Lambda functions against a local S3 stand-in')
+    parser.add_argument('--keys', type=int, default=5000, help='Number of objects to seed')
+    parser.add_argument('--prefixes', type=int, default=10, help='Number of top-level prefixes')
+    parser.add_argument('--distribution', choices=['uniform', 'skewed'], default='uniform')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--budget-ms', type=int, default=15 * 60 * 1000, help='Simulated Lambda time budget per invocation')
+    parser.add_argument('--max-invocations', type=int, default=MAX_INVOCATIONS,
+                        help='Give up on the delete run after this many invocations')
+    parser.add_argument('--only', choices=['delete', 'list'], help='Benchmark a single Lambda')
+    parser.add_argument('--endpoint-url', help='Use a MinIO-compatible server instead of moto')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    if args.endpoint_url:
+        os.environ['AWS_ENDPOINT_URL_S3'] = args.endpoint_url
+        stand_in = contextlib.nullcontext()
+    else:
+        from moto import mock_aws
+        stand_in = mock_aws()
+
+    import boto3
+
+    results = []
+    with stand_in, tempfile.TemporaryDirectory() as workdir:
+        client = boto3.client('s3')
+        print(f"Seeding {args.keys} keys over {args.prefixes} prefixes ({args.distribution})...")
+        patterns = seed_bucket(client, args.keys, args.prefixes, args.distribution, args.seed)
+
+        if args.only in (None, 'list'):
+            module = load_module('list_s3_content', LAMBDAS['list'])
+            for process in ('none', 'header'):
+                results.append(bench_list(module, process))
+
+        if args.only in (None, 'delete'):
+            module = load_module('lambda_functions', LAMBDAS['delete'])
+            results.append(bench_delete(module, patterns, args.budget_ms, workdir, args.max_invocations))
+
+        if args.endpoint_url:
+            for bucket in (BUCKET, MANIFEST_BUCKET):
+                empty_bucket(client, bucket)
+                client.delete_bucket(Bucket=bucket)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if any(r.get('error') for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
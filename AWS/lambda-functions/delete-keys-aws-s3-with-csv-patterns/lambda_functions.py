@@ -1,47 +1,328 @@
-import boto3
-import csv
-import os
-
-s3_client = boto3.client('s3')
-
-def lambda_handler(event, context):
-    # Define bucket name and path to local CSV file
-    bucket_name = os.getenv('TARGET_BUCKET')  # Bucket where objects are to be deleted
-    csv_file_path = 'patterns.csv'  # Local path within Lambda for the CSV file
-
-    try:
-        # Read the CSV file from the Lambda's local storage
-        patterns = []
-        with open(csv_file_path, mode='r') as file:
-            csv_reader = csv.reader(file)
-            for row in csv_reader:
-                patterns.append(row[0])  # Assuming each row has one pattern
-
-        delete_responses = []
-
-        for prefix in patterns:
-            # List objects with the specific prefix in S3
-            response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-            if 'Contents' not in response:
-                print(f"No objects found with prefix '{prefix}' in bucket '{bucket_name}'.")
-                continue
-
-            # Extract keys of objects with the prefix
-            keys_to_delete = [{'Key': obj['Key']} for obj in response['Contents']]
-
-            # Batch delete objects (max 1000 keys per batch)
-            while keys_to_delete:
-                batch = keys_to_delete[:1000]
-                keys_to_delete = keys_to_delete[1000:]
-
-                # Delete the batch of objects
-                delete_response = s3_client.delete_objects(
-                    Bucket=bucket_name,
-                    Delete={'Objects': batch}
-                )
-                delete_responses.append(delete_response)
-
-        return {"message": "Objects deleted successfully", "details": delete_responses}
-
-    except Exception as e:
-        return {"message": "Error deleting objects", "error": str(e)}
+import boto3
+import csv
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', 8))  # Prefixes processed in parallel
+MAX_REPORTED_ERRORS = 100  # Per prefix, to keep the Lambda response small
+DELETE_BATCH_SIZE = 1000  # S3 DeleteObjects accepts at most 1000 keys per call
+SAFETY_MARGIN_MS = int(os.getenv('SAFETY_MARGIN_MS', 30000))  # Stop this long before the Lambda deadline
+CURSOR_BUCKET = os.getenv('CURSOR_BUCKET')  # Optional: persist the continuation cursor to S3
+CURSOR_KEY = os.getenv('CURSOR_KEY', 'pattern-delete/cursor.json')
+
+s3_client = boto3.client('s3', config=Config(max_pool_connections=MAX_WORKERS * 2))
+
+
+def delete_keys(bucket_name, keys, report):
+    """Deletes up to 1000 keys in one call and records the outcome in report."""
+    delete_response = s3_client.delete_objects(
+        Bucket=bucket_name,
+        Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+    )
+    # In quiet mode S3 only returns the keys that failed
+    errors = delete_response.get('Errors', [])
+    report['deleted'] += len(keys) - len(errors)
+    report['error_count'] += len(errors)
+    for error in errors[:MAX_REPORTED_ERRORS - len(report['errors'])]:
+        report['errors'].append({'Key': error.get('Key'), 'Code': error.get('Code'), 'Message': error.get('Message')})
+
+
+def delete_prefix(bucket_name, prefix, continuation_token=None, out_of_time=lambda: False, globs=None):
+    """
+    Deletes every object under prefix (or only keys matching one of globs), following pagination.
+
+    Each listed page (up to 1000 keys) is deleted before the next page is
+    requested, so deletion starts before the listing has finished. If
+    out_of_time() becomes true between pages, 'complete' stays False and
+    'token' holds the ContinuationToken to resume from.
+    """
+    report = {
+        'prefix': prefix, 'listed': 0, 'deleted': 0, 'error_count': 0, 'errors': [],
+        'token': continuation_token, 'complete': False
+    }
+    try:
+        while True:
+            if out_of_time():
+                break
+
+            params = {'Bucket': bucket_name, 'Prefix': prefix, 'MaxKeys': DELETE_BATCH_SIZE}
+            if report['token']:
+                params['ContinuationToken'] = report['token']
+            page = s3_client.list_objects_v2(**params)
+
+            keys = [obj['Key'] for obj in page.get('Contents', [])]
+            report['listed'] += len(keys)
+            if globs:
+                keys = [key for key in keys if any(fnmatch.fnmatchcase(key, glob) for glob in globs)]
+            if keys:
+                delete_keys(bucket_name, keys, report)
+
+            report['token'] = page.get('NextContinuationToken') if page.get('IsTruncated') else None
+            if not report['token']:
+                report['complete'] = True
+                break
+    except Exception as e:
+        report['exception'] = str(e)
+
+    if 'exception' in report:
+        print(f"Prefix '{prefix}': failed after deleting {report['deleted']} objects: {report['exception']}")
+    elif not report['complete']:
+        print(f"Prefix '{prefix}': paused after deleting {report['deleted']} objects")
+    elif report['listed'] == 0:
+        print(f"No objects found with prefix '{prefix}' in bucket '{bucket_name}'.")
+    else:
+        print(f"Prefix '{prefix}': listed {report['listed']}, deleted {report['deleted']}, errors {report['error_count']}")
+    return report
+
+
+def read_patterns(csv_file_path):
+    """Reads one prefix pattern per CSV row, skipping blank rows."""
+    patterns = []
+    with open(csv_file_path, mode='r') as file:
+        csv_reader = csv.reader(file)
+        for row in csv_reader:
+            if row and row[0].strip():
+                patterns.append(row[0].strip())  # Assuming each row has one pattern
+    return patterns
+
+
+GLOB_CHARS = '*?['
+
+
+class PrefixTrie:
+    """Character trie of key prefixes, used to find prefixes already covered by a shorter one."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = True  # Marks the end of an inserted prefix
+
+    def covers(self, key):
+        """True if some inserted prefix is a prefix of key."""
+        node = self.root
+        for char in key:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
+
+
+def literal_prefix(pattern):
+    """The part of a glob before its first wildcard, which is what S3 can list by."""
+    positions = [pattern.find(c) for c in GLOB_CHARS if c in pattern]
+    return pattern[:min(positions)] if positions else pattern
+
+
+def compile_patterns(patterns):
+    """
+    Turns raw CSV patterns into the minimal set of listings to run.
+
+    Plain prefixes are deduplicated, and any prefix already covered by a
+    shorter one is dropped (`site/a/b/` adds nothing once `site/a/` is
+    deleted). Glob patterns (`*`, `?`, `[...]`, e.g. `site/*/thumbs/*.jpg` or
+    `*.tmp`) are matched client-side against the full key. Globs are grouped
+    under the shortest literal prefix that covers them, so they share one
+    listing, and are dropped entirely if a plain prefix already covers them.
+    Note that `*` also matches `/`.
+
+    Returns a list of {'prefix': str, 'globs': list or None} entries, sorted by prefix.
+    """
+    plain = sorted({p for p in patterns if not any(c in p for c in GLOB_CHARS)}, key=len)
+    globs = sorted({p for p in patterns if any(c in p for c in GLOB_CHARS)})
+
+    trie = PrefixTrie()
+    compiled = {}
+    for prefix in plain:  # Shortest first, so covering prefixes are inserted before the ones they cover
+        if not trie.covers(prefix):
+            trie.insert(prefix)
+            compiled[prefix] = None
+
+    grouped = {}
+    for glob in sorted(globs, key=lambda g: len(literal_prefix(g))):
+        prefix = literal_prefix(glob)
+        if trie.covers(prefix):
+            continue
+        listing = next((p for p in grouped if prefix.startswith(p)), None)
+        if listing is None:
+            listing = prefix
+            grouped[listing] = []
+        grouped[listing].append(glob)
+    compiled.update(grouped)
+
+    return [{'prefix': prefix, 'globs': compiled[prefix]} for prefix in sorted(compiled)]
+
+
+def patterns_fingerprint(compiled):
+    """Short hash of the compiled patterns, so a cursor is never applied to a different CSV."""
+    return hashlib.sha1(json.dumps(compiled, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+class DeletionRun:
+    """
+    Hands out prefixes to worker threads until the work or the time budget runs out.
+
+    The cursor records where to resume: 'in_progress' holds the pattern index and
+    ContinuationToken of every prefix that was interrupted (or never reached),
+    and every pattern from 'next_pattern' onwards has not been started yet.
+    A prefix that raised (e.g. AccessDenied) is not put back in the cursor,
+    since resuming would only raise again; it is listed in 'failed' instead.
+    """
+
+    def __init__(self, bucket_name, patterns, cursor, context):
+        self.bucket_name = bucket_name
+        self.patterns = patterns
+        self.context = context
+        cursor = cursor or {}
+        self._queue = [(item['pattern'], item.get('token')) for item in cursor.get('in_progress', [])]
+        self._next_pattern = cursor.get('next_pattern', 0)
+        self._interrupted = []
+        self.failed = []
+        self._lock = threading.Lock()
+        self.details = []
+
+    def out_of_time(self):
+        if self.context is None:
+            return False
+        return self.context.get_remaining_time_in_millis() < SAFETY_MARGIN_MS
+
+    def _take(self):
+        with self._lock:
+            if self.out_of_time():
+                return None
+            if self._queue:
+                return self._queue.pop(0)
+            if self._next_pattern < len(self.patterns):
+                self._next_pattern += 1
+                return self._next_pattern - 1, None
+            return None
+
+    def worker(self):
+        while True:
+            item = self._take()
+            if item is None:
+                return
+            index, token = item
+            pattern = self.patterns[index]
+            report = delete_prefix(self.bucket_name, pattern['prefix'], token, self.out_of_time, pattern['globs'])
+            if pattern['globs']:
+                report['globs'] = pattern['globs']
+            with self._lock:
+                self.details.append(report)
+                if 'exception' in report:
+                    self.failed.append(pattern['prefix'])
+                elif not report['complete']:
+                    self._interrupted.append({'pattern': index, 'token': report['token']})
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            for _ in range(MAX_WORKERS):
+                pool.submit(self.worker)
+
+    def made_progress(self):
+        """False if no prefix got past its first listing, e.g. when the budget was below SAFETY_MARGIN_MS from the start."""
+        return any(d['listed'] or d['complete'] or 'exception' in d for d in self.details)
+
+    def cursor(self):
+        """Returns the continuation cursor, or None when every pattern is done."""
+        in_progress = sorted(
+            self._interrupted + [{'pattern': index, 'token': token} for index, token in self._queue],
+            key=lambda item: item['pattern']
+        )
+        if not in_progress and self._next_pattern >= len(self.patterns):
+            return None
+        return {
+            'patterns': patterns_fingerprint(self.patterns),
+            'next_pattern': self._next_pattern,
+            'in_progress': in_progress,
+        }
+
+
+def load_cursor(event):
+    """Takes the cursor from the event, falling back to the persisted cursor in S3."""
+    if event and event.get('cursor'):
+        return event['cursor']
+    if CURSOR_BUCKET:
+        try:
+            body = s3_client.get_object(Bucket=CURSOR_BUCKET, Key=CURSOR_KEY)['Body'].read()
+            return json.loads(body)
+        except s3_client.exceptions.NoSuchKey:
+            return None
+    return None
+
+
+def save_cursor(cursor):
+    """Persists the cursor to S3 (or clears it once the run is complete)."""
+    if not CURSOR_BUCKET:
+        return
+    if cursor is None:
+        s3_client.delete_object(Bucket=CURSOR_BUCKET, Key=CURSOR_KEY)
+    else:
+        s3_client.put_object(Bucket=CURSOR_BUCKET, Key=CURSOR_KEY, Body=json.dumps(cursor).encode('utf-8'))
+
+
+def lambda_handler(event, context):
+    # Define bucket name and path to local CSV file
+    bucket_name = os.getenv('TARGET_BUCKET')  # Bucket where objects are to be deleted
+    csv_file_path = 'patterns.csv'  # Local path within Lambda for the CSV file
+
+    try:
+        # Read the CSV file from the Lambda's local storage
+        raw_patterns = read_patterns(csv_file_path)
+        patterns = compile_patterns(raw_patterns)
+        print(f"Compiled {len(raw_patterns)} patterns into {len(patterns)} listings.")
+
+        cursor = load_cursor(event)
+        if cursor and cursor.get('patterns') != patterns_fingerprint(patterns):
+            return {"message": "Error deleting objects", "error": "Cursor does not match the current patterns.csv"}
+
+        # Prefixes are independent, so list and delete them concurrently
+        run = DeletionRun(bucket_name, patterns, cursor, context)
+        run.run()
+        next_cursor = run.cursor()
+        save_cursor(next_cursor)
+
+        details = run.details
+        summary = {
+            'patterns': len(raw_patterns),
+            'listings': len(patterns),
+            'prefixes': len(details),
+            'listed': sum(d['listed'] for d in details),
+            'deleted': sum(d['deleted'] for d in details),
+            'errors': sum(d['error_count'] for d in details) + sum(1 for d in details if 'exception' in d),
+        }
+        # Only prefixes that failed are reported in full, to stay under the response size cap
+        failures = [
+            {k: d[k] for k in ('prefix', 'globs', 'error_count', 'errors', 'exception') if k in d}
+            for d in details if d['error_count'] or 'exception' in d
+        ]
+
+        response = {"done": next_cursor is None and not run.failed, "cursor": next_cursor, "summary": summary, "failures": failures}
+        if run.failed:
+            # Invoking again would not retry these prefixes, so this is not a resumable pause
+            return {"message": "Error deleting objects", "error": f"Listing or deleting failed for {len(run.failed)} prefixes",
+                    "failed_prefixes": run.failed, **response}
+        if next_cursor and not run.made_progress():
+            return {"message": "Error deleting objects",
+                    "error": f"No progress: less than SAFETY_MARGIN_MS ({SAFETY_MARGIN_MS} ms) of the time budget was left", **response}
+
+        if next_cursor:
+            message = "Time budget reached, invoke again with the cursor to resume"
+        elif summary['errors']:
+            message = "Objects deleted with errors"
+        else:
+            message = "Objects deleted successfully"
+        return {"message": message, **response}
+
+    except Exception as e:
+        return {"message": "Error deleting objects", "error": str(e)}
@@ -1,23 +1,163 @@
-import json
-import urllib.parse
-import boto3
-
-print('Loading function')
-
-s3 = boto3.resource('s3')
-bucket = s3.Bucket('rss-content-results-images-dev')
-objects = bucket.objects.filter(Prefix = 'firstratesearch.com/finance/')
-
-
-
-def lambda_handler(event, context):
-    print("Received event: " + json.dumps(event, indent=2))
-    # Iterates through all the objects, doing the pagination for you. Each obj
-    # is an ObjectSummary, so it doesn't contain the body. You'll need to call
-    # get to get the whole body.
-    # for obj in bucket.objects.all():
-    for obj in objects:
-        key = obj.key
-        body = obj.get()['Body'].read()
-        print(key)
-
+import csv
+import hashlib
+import json
+import os
+import urllib.parse
+import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+print('Loading function')
+
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', 16))
+HEADER_BYTES = int(os.getenv('HEADER_BYTES', 64))  # Bytes fetched per object in 'header' mode
+CHUNK_SIZE = 1024 * 1024  # Streaming read size in 'checksum' mode
+MANIFEST_FIELDS = ['key', 'size', 'etag', 'last_modified']
+
+s3 = boto3.client('s3', config=Config(max_pool_connections=MAX_WORKERS))
+
+# Leading bytes of common formats, used to sniff object types in 'header' mode
+MAGIC_NUMBERS = [
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'%PDF', 'pdf'),
+    (b'PK\x03\x04', 'zip'),
+    (b'\x1f\x8b', 'gzip'),
+]
+
+
+def sniff_type(header):
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    for magic, kind in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return kind
+    return 'unknown'
+
+
+def read_header(bucket, key):
+    """Fetches only the first HEADER_BYTES of an object with a ranged GET."""
+    body = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{HEADER_BYTES - 1}')['Body']
+    return {'type': sniff_type(body.read())}
+
+
+def read_checksum(bucket, key):
+    """Streams the whole object in chunks and returns its SHA-256, never holding the body in memory."""
+    digest = hashlib.sha256()
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    for chunk in body.iter_chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    return {'sha256': digest.hexdigest()}
+
+
+# Optional per-object body processing. 'none' keeps the scan metadata-only.
+PROCESSORS = {
+    'none': None,
+    'header': read_header,
+    'checksum': read_checksum,
+}
+
+
+def manifest_row(obj):
+    return {
+        'key': obj['Key'],
+        'size': obj['Size'],
+        'etag': obj['ETag'].strip('"'),
+        'last_modified': obj['LastModified'].isoformat(),
+    }
+
+
+def scan_page(bucket, objects, processor, pool):
+    """Builds manifest rows for one listing page, running processor concurrently if set."""
+    rows = [manifest_row(obj) for obj in objects]
+    if processor is None:
+        return rows
+
+    def process(row):
+        try:
+            row.update(processor(bucket, row['key']))
+        except Exception as e:
+            row['error'] = str(e)
+        return row
+
+    # Bounded by the pool size, one page (at most 1000 objects) at a time
+    return list(pool.map(process, rows))
+
+
+class ManifestWriter:
+    """Streams manifest rows to a local JSONL or CSV file."""
+
+    def __init__(self, path, output_format, fields):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.output_format = output_format
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(self.file, fieldnames=fields, extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, rows):
+        if self.output_format == 'csv':
+            self.writer.writerows(rows)
+        else:
+            self.file.writelines(json.dumps(row) + '\n' for row in rows)
+
+    def close(self):
+        self.file.close()
+
+
+def get_settings(event):
+    """Scanner settings from the event, falling back to environment variables."""
+    event = event or {}
+    settings = {
+        'bucket': event.get('bucket', os.getenv('SCAN_BUCKET')),
+        'prefix': event.get('prefix', os.getenv('SCAN_PREFIX', '')),
+        'process': event.get('process', os.getenv('SCAN_PROCESS', 'none')),
+        'format': event.get('format', os.getenv('MANIFEST_FORMAT', 'jsonl')),
+        'output': event.get('output', os.getenv('MANIFEST_OUTPUT', '/tmp/manifest')),
+    }
+    if not settings['bucket']:
+        raise ValueError("No bucket given. Set SCAN_BUCKET or pass 'bucket' in the event.")
+    if settings['process'] not in PROCESSORS:
+        raise ValueError(f"Unknown process mode '{settings['process']}'. Choose one of: {', '.join(PROCESSORS)}")
+    if settings['format'] not in ('jsonl', 'csv'):
+        raise ValueError(f"Unknown manifest format '{settings['format']}'. Choose jsonl or csv.")
+    return settings
+
+
+def lambda_handler(event, context):
+    print("Received event: " + json.dumps(event, indent=2))
+    settings = get_settings(event)
+    bucket, prefix = settings['bucket'], settings['prefix']
+    processor = PROCESSORS[settings['process']]
+
+    # The manifest is always streamed to local disk first; an s3:// output is uploaded at the end
+    output = settings['output']
+    upload_to = urllib.parse.urlparse(output) if output.startswith('s3://') else None
+    local_path = f"/tmp/manifest.{settings['format']}" if upload_to else output
+    if not upload_to and not os.path.splitext(local_path)[1]:
+        local_path = f"{local_path}.{settings['format']}"
+
+    fields = MANIFEST_FIELDS + {'none': [], 'header': ['type'], 'checksum': ['sha256']}[settings['process']] + ['error']
+    writer = ManifestWriter(local_path, settings['format'], fields)
+    count = total_bytes = 0
+    try:
+        # Listing returns metadata only; object bodies are never fetched unless a processor is set
+        paginator = s3.get_paginator('list_objects_v2')
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                rows = scan_page(bucket, page.get('Contents', []), processor, pool)
+                writer.write(rows)
+                count += len(rows)
+                total_bytes += sum(row['size'] for row in rows)
+    finally:
+        writer.close()
+
+    if upload_to:
+        s3.upload_file(local_path, upload_to.netloc, upload_to.path.lstrip('/'))
+        location = output
+    else:
+        location = local_path
+
+    print(f"Scanned {count} objects ({total_bytes} bytes) under s3://{bucket}/{prefix}, manifest at {location}")
+    return {'bucket': bucket, 'prefix': prefix, 'objects': count, 'bytes': total_bytes, 'manifest': location}
@@ -0,0 +1,72 @@
+"""
+Compares the dominant color strategies in fabric_uploader.py for speed and accuracy.
+
+Accuracy is measured against the original K-Means strategy: how often the detected
+CSS3 color name matches, and the mean RGB distance between the detected colors.
+
+Usage:
+    $ python benchmark_dominant_color.py ./fabric_images --repeat 3
+"""
+import os
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from fabric_uploader import DOMINANT_COLOR_STRATEGIES, get_closest_color_names, get_dominant_rgb
+
+VALID_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+BASELINE = "kmeans"
+
+
+def find_images(folder):
+    """Recursively lists every image under folder, sorted for stable output."""
+    images = []
+    for root, _, files in os.walk(folder):
+        images.extend(os.path.join(root, f) for f in files if f.lower().endswith(VALID_EXTENSIONS))
+    return sorted(images)
+
+
+def run_strategy(strategy, images, repeat):
+    """Returns (dominant colors, best wall time per image in ms) for a strategy."""
+    best = None
+    colors = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        colors = [get_dominant_rgb(path, strategy=strategy) for path in images]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return colors, best * 1000 / len(images)
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark dominant color strategies")
+    parser.add_argument('folder', help='Folder of sample fabric images')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per strategy; the fastest is reported')
+    parser.add_argument('--strategies', nargs='+', default=list(DOMINANT_COLOR_STRATEGIES), help='Strategies to compare')
+    args = parser.parse_args()
+
+    images = find_images(args.folder)
+    if not images:
+        print(f"❌ No images found in '{args.folder}'.")
+        return
+
+    strategies = [BASELINE] + [s for s in args.strategies if s != BASELINE]
+    results = {s: run_strategy(s, images, args.repeat) for s in strategies}
+    baseline_colors = np.array(results[BASELINE][0], dtype=np.float64)
+    baseline_names = get_closest_color_names(baseline_colors)
+
+    print(f"Benchmarked {len(images)} images, best of {args.repeat} runs\n")
+    print(f"{'strategy':<12} {'ms/image':>10} {'speedup':>9} {'name match':>11} {'mean ΔRGB':>10}")
+    for strategy in strategies:
+        colors, ms = results[strategy]
+        colors = np.array(colors, dtype=np.float64)
+        names = get_closest_color_names(colors)
+        match = sum(a == b for a, b in zip(names, baseline_names)) / len(images)
+        distance = np.linalg.norm(colors - baseline_colors, axis=1).mean()
+        speedup = results[BASELINE][1] / ms
+        print(f"{strategy:<12} {ms:>10.2f} {speedup:>8.1f}x {match:>10.0%} {distance:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
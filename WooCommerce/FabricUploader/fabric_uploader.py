@@ -1,11 +1,15 @@
+import functools
 import os
-import requests
-from requests.auth import HTTPBasicAuth
-from woocommerce import API
-from PIL import Image
-import numpy as np
-from sklearn.cluster import KMeans
-import webcolors
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# numpy, Pillow, webcolors, scikit-learn, the WooCommerce client and the shared
+# WordPress client (httpx) are imported where they are first used. The main
+# process only uploads and creates products, and color workers never touch the
+# network, so neither side pays for the other's imports.
+
+# Opt-in profiling; wp_profile, wp_image and wp_client are copies of the WordPress API/common helpers
+from wp_profile import init_worker, profiled, stage
 
 # Helper to load variables from a .env file if it exists
 def load_env_file(filepath=".env"):
@@ -41,64 +45,217 @@ IMAGE_FOLDER = os.environ.get("IMAGE_FOLDER", "./fabric_images") # Path to the f
 # WooCommerce Product Defaults
 PRODUCT_PRICE = os.environ.get("PRODUCT_PRICE", "15.00")
 CATEGORY_IDS = [] # List of category IDs, e.g., [12]. Keep empty if you do not want to assign a category or don't know the IDs.
+
+# Color Detection
+COLOR_SPACE = os.environ.get("COLOR_SPACE", "rgb").lower() # "rgb" or "lab" (perceptual matching)
+DOMINANT_COLOR_STRATEGY = os.environ.get("DOMINANT_COLOR_STRATEGY", "histogram") # histogram, median_cut, minibatch or kmeans
+
+# Concurrency
+COLOR_WORKERS = int(os.environ.get("COLOR_WORKERS", os.cpu_count() or 1)) # Processes used for color detection
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 8)) # Parallel media uploads to WordPress
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 60)) # Seconds before an upload request is abandoned
+PRODUCT_BATCH_SIZE = int(os.environ.get("PRODUCT_BATCH_SIZE", 100)) # Products per products/batch call (max 100, 0 = one call per product)
 # ==========================================
 
-# Initialize WooCommerce API Client
-wcapi = API(
-    url=WP_URL,
-    consumer_key=WC_CONSUMER_KEY,
-    consumer_secret=WC_CONSUMER_SECRET,
-    version="wc/v3",
-    timeout=60
-)
+@functools.lru_cache(maxsize=None)
+def get_wcapi():
+    """Returns the WooCommerce API client, created on first use."""
+    from woocommerce import API
+
+    return API(
+        url=WP_URL,
+        consumer_key=WC_CONSUMER_KEY,
+        consumer_secret=WC_CONSUMER_SECRET,
+        version="wc/v3",
+        timeout=60
+    )
+
+def _css3_palette():
+    """Returns a sorted list of (name, (r, g, b)) for every CSS3 color name."""
+    import webcolors
 
-def get_closest_color_name(rgb_tuple):
-    """Converts an RGB tuple to the closest human-readable CSS3 color name."""
-    min_colours = {}
-    
     # Handle compatibility across webcolors version changes (specifically version 24.6.0+)
     try:
         hex_to_names = webcolors.CSS3_HEX_TO_NAMES
-        for hex_str, name in hex_to_names.items():
-            r_c, g_c, b_c = webcolors.hex_to_rgb(hex_str)
-            rd = (r_c - rgb_tuple[0]) ** 2
-            gd = (g_c - rgb_tuple[1]) ** 2
-            bd = (b_c - rgb_tuple[2]) ** 2
-            min_colours[(rd + gd + bd)] = name
+        palette = {name: tuple(webcolors.hex_to_rgb(hex_str)) for hex_str, name in hex_to_names.items()}
     except AttributeError:
         # Fallback for newer versions of webcolors
-        for name in webcolors.names('css3'):
-            hex_str = webcolors.name_to_hex(name)
-            r_c, g_c, b_c = webcolors.hex_to_rgb(hex_str)
-            rd = (r_c - rgb_tuple[0]) ** 2
-            gd = (g_c - rgb_tuple[1]) ** 2
-            bd = (b_c - rgb_tuple[2]) ** 2
-            min_colours[(rd + gd + bd)] = name
-            
-    if not min_colours:
-        return "Unknown"
-        
-    return min_colours[min(min_colours.keys())]
+        palette = {name: tuple(webcolors.hex_to_rgb(webcolors.name_to_hex(name))) for name in webcolors.names('css3')}
+    return sorted(palette.items())
+
+def _rgb_to_lab(rgb):
+    """Converts an (N, 3) array of sRGB values (0-255) to CIE Lab (D65)."""
+    import numpy as np
+
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16.0 / 116.0)
+    return np.stack([
+        116.0 * f[:, 1] - 16.0,
+        500.0 * (f[:, 0] - f[:, 1]),
+        200.0 * (f[:, 1] - f[:, 2]),
+    ], axis=1)
+
+@functools.lru_cache(maxsize=None)
+def get_palette():
+    """
+    Returns (names, index): the palette built once per process, on first lookup.
+
+    Names are sorted so that ties on equal distance always resolve to the same
+    (alphabetically first) color name.
+    """
+    import numpy as np
+
+    palette = _css3_palette()
+    names = [name for name, _ in palette]
+    rgb = np.array([rgb for _, rgb in palette], dtype=np.float64).reshape(-1, 3)
+    return names, _rgb_to_lab(rgb) if COLOR_SPACE == "lab" else rgb
+
+def get_closest_color_names(rgb_tuples):
+    """Maps many RGB tuples to their closest CSS3 color names in one vectorized call."""
+    import numpy as np
+
+    names, index = get_palette()
+    if not names:
+        return ["Unknown"] * len(rgb_tuples)
+    points = np.asarray(rgb_tuples, dtype=np.float64).reshape(-1, 3)
+    if COLOR_SPACE == "lab":
+        points = _rgb_to_lab(points)
+    distances = ((points[:, None, :] - index[None, :, :]) ** 2).sum(axis=2)
+    return [names[i] for i in distances.argmin(axis=1)]
+
+def get_closest_color_name(rgb_tuple):
+    """Converts an RGB tuple to the closest human-readable CSS3 color name."""
+    return get_closest_color_names([rgb_tuple])[0]
+
+def _load_pixels(image_path, size=(50, 50)):
+    """Loads an image as an (N, 3) uint8 array of RGB pixels, downscaled to speed up processing."""
+    import numpy as np
+    from wp_image import open_bounded
+
+    # JPEGs decode at reduced scale; huge PNG/WebP scans fail with ImageTooLarge instead of exhausting the worker's memory
+    with open_bounded(image_path, max_side=max(size)) as img:
+        img = img.convert('RGB').resize(size)
+    return np.asarray(img, dtype=np.uint8).reshape((-1, 3))
+
+def _dominant_histogram(pixels, bits=4):
+    """
+    Votes pixels into quantized RGB bins and returns the mean color of the busiest bin.
+
+    There are no clusters to count, so unlike the other strategies it takes no `k`.
+    """
+    import numpy as np
+
+    shift = 8 - bits
+    q = (pixels >> shift).astype(np.int32)
+    bins = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    winner = np.argmax(np.bincount(bins, minlength=1 << (3 * bits)))
+    return pixels[bins == winner].mean(axis=0)
+
+def _dominant_median_cut(pixels, k=4):
+    """Uses Pillow's median cut quantizer and returns the most frequent palette color."""
+    import numpy as np
+    from PIL import Image
+
+    side = int(np.sqrt(len(pixels)))
+    img = Image.fromarray(pixels[:side * side].reshape((side, side, 3)), 'RGB')
+    quantized = img.quantize(colors=k, method=Image.Quantize.MEDIANCUT)
+    _, index = max(quantized.getcolors())
+    palette = quantized.getpalette()
+    return np.array(palette[index * 3:index * 3 + 3], dtype=np.float64)
+
+_minibatch_centers = None
+
+def _dominant_minibatch(pixels, k=4):
+    """MiniBatch K-Means, warm-started from the previous image's cluster centers."""
+    global _minibatch_centers
+    import numpy as np
+    from sklearn.cluster import MiniBatchKMeans
+
+    init = _minibatch_centers if _minibatch_centers is not None and len(_minibatch_centers) == k else 'k-means++'
+    kmeans = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, random_state=42, batch_size=1024)
+    kmeans.fit(pixels)
+    _minibatch_centers = kmeans.cluster_centers_
+
+    counts = np.bincount(kmeans.labels_, minlength=k)
+    return kmeans.cluster_centers_[np.argmax(counts)]
+
+def _dominant_kmeans(pixels, k=4):
+    """Full K-Means clustering (the original, slowest strategy)."""
+    import numpy as np
+    from sklearn.cluster import KMeans
 
-def get_dominant_color(image_path, k=4):
-    """Finds the dominant color in an image using K-Means clustering."""
-    img = Image.open(image_path)
-    img = img.convert('RGB')
-    img = img.resize((50, 50)) # Resize to speed up processing
-    
-    # Convert image data to numpy array
-    img_array = np.array(img)
-    pixels = img_array.reshape((-1, 3))
-    
-    # Use KMeans to find dominant colors
     kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
     kmeans.fit(pixels)
-    
+
     # Find the most frequent cluster center
     counts = np.bincount(kmeans.labels_)
-    dominant_rgb = kmeans.cluster_centers_[np.argmax(counts)]
-    
-    return get_closest_color_name(tuple(map(int, dominant_rgb)))
+    return kmeans.cluster_centers_[np.argmax(counts)]
+
+# Pluggable dominant color strategies. Only "minibatch" and "kmeans" import scikit-learn.
+DEFAULT_K = 4 # Colors or clusters for the strategies that take a k
+K_STRATEGIES = {"median_cut", "minibatch", "kmeans"}
+DOMINANT_COLOR_STRATEGIES = {
+    "histogram": _dominant_histogram,
+    "median_cut": _dominant_median_cut,
+    "minibatch": _dominant_minibatch,
+    "kmeans": _dominant_kmeans,
+}
+
+def get_dominant_rgb(image_path, k=None, strategy=None):
+    """
+    Finds the dominant RGB color of an image using the configured strategy.
+
+    `k` (default DEFAULT_K) only applies to the strategies in K_STRATEGIES;
+    passing it to any other strategy is an error rather than silently ignored.
+    """
+    strategy = strategy or DOMINANT_COLOR_STRATEGY
+    if strategy not in DOMINANT_COLOR_STRATEGIES:
+        raise ValueError(f"Unknown dominant color strategy '{strategy}'. Choose one of: {', '.join(DOMINANT_COLOR_STRATEGIES)}")
+    if k is not None and strategy not in K_STRATEGIES:
+        raise ValueError(f"The '{strategy}' strategy does not take k; only {', '.join(sorted(K_STRATEGIES))} do")
+    options = {"k": k or DEFAULT_K} if strategy in K_STRATEGIES else {}
+    with stage("decode"):
+        pixels = _load_pixels(image_path)
+    with stage("color"):
+        dominant_rgb = DOMINANT_COLOR_STRATEGIES[strategy](pixels, **options)
+    return tuple(map(int, dominant_rgb))
+
+def get_dominant_color(image_path, k=None, strategy=None):
+    """Finds the dominant color in an image and returns its closest CSS3 color name."""
+    return get_closest_color_name(get_dominant_rgb(image_path, k=k, strategy=strategy))
+
+def get_http_session():
+    """Returns the shared, authenticated WordPress client with a connection pool sized for the upload workers."""
+    from wp_client import get_client
+
+    return get_client(auth=(WP_USERNAME, WP_APP_PASSWORD), timeout=REQUEST_TIMEOUT, max_connections=UPLOAD_WORKERS)
+
+class FileChunks:
+    """
+    Request body that streams a file in chunks instead of reading it into memory.
+
+    Unlike a generator it can be iterated again, so a request the client
+    re-sends (e.g. after a 503) starts from the beginning of the file.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = path
+
+    def __len__(self):
+        return os.path.getsize(self.path)
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            yield from iter(lambda: f.read(self.CHUNK_SIZE), b'')
 
 def upload_image_to_wp(image_path):
     """Uploads an image to the WordPress Media Library and returns the Attachment ID."""
@@ -114,18 +271,19 @@ def upload_image_to_wp(image_path):
     else:
         content_type = 'image/jpeg'
         
-    headers = {
-        'Content-Disposition': f'attachment; filename="{filename}"',
-        'Content-Type': content_type
-    }
-    
+    body = FileChunks(image_path)
     try:
-        with open(image_path, 'rb') as img_file:
-            response = requests.post(
+        # An explicit Content-Length keeps the streamed body from being sent chunked, which some PHP setups reject
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Content-Type': content_type,
+            'Content-Length': str(len(body))
+        }
+        with stage("upload"):
+            response = get_http_session().post(
                 media_url,
                 headers=headers,
-                data=img_file,
-                auth=HTTPBasicAuth(WP_USERNAME, WP_APP_PASSWORD)
+                content=body
             )
             
         if response.status_code == 201:
@@ -138,8 +296,12 @@ def upload_image_to_wp(image_path):
         print(f"❌ Exception occurred during image upload: {e}")
         return None
 
-def create_woocommerce_product(product_name, color_name, image_ids):
-    """Creates a simple WooCommerce product with the generated data."""
+def product_sku(product_name):
+    """Returns the SKU a product is created under."""
+    return f"FABRIC-{product_name.upper().replace(' ', '-')}"
+
+def build_product_payload(product_name, color_name, image_ids):
+    """Builds the WooCommerce product payload for a simple fabric product."""
     # Ensure color name is appended if it's not already in the product name
     if color_name.lower() not in product_name.lower():
         title = f"{product_name} ({color_name.title()})"
@@ -147,7 +309,7 @@ def create_woocommerce_product(product_name, color_name, image_ids):
         title = product_name
         
     description = f"Experience the comfort and breathability of our high-quality fabric. This beautiful shade of {color_name} is perfect for apparel, home decor, and crafting projects."
-    sku = f"FABRIC-{product_name.upper().replace(' ', '-')}"
+    sku = product_sku(product_name)
     
     # Prepare image payload. WooCommerce REST API treats the first image in the array 
     # as the featured (main) image, and any subsequent images as product gallery images.
@@ -165,90 +327,230 @@ def create_woocommerce_product(product_name, color_name, image_ids):
     
     if CATEGORY_IDS:
         data["categories"] = [{"id": cat_id} for cat_id in CATEGORY_IDS]
+
+    return data
+
+def create_woocommerce_product(product_name, color_name, image_ids):
+    """Creates a simple WooCommerce product with the generated data."""
+    data = build_product_payload(product_name, color_name, image_ids)
         
     try:
-        response = wcapi.post("products", data)
+        with stage("product"):
+            response = get_wcapi().post("products", data)
         
         if response.status_code == 201:
-            print(f"🎉 Product created successfully: {title}")
+            print(f"🎉 Product created successfully: {data['name']}")
         else:
             print(f"❌ Failed to create product: {response.status_code} - {response.text}")
     except Exception as e:
         print(f"❌ Exception occurred during product creation: {e}")
 
-def main():
-    if not os.path.exists(IMAGE_FOLDER):
-        print(f"❌ Image folder '{IMAGE_FOLDER}' does not exist. Please create it and add your product subfolders.")
-        return
-        
+class ProductBatcher:
+    """
+    Buffers product payloads and sends them through the WooCommerce `products/batch`
+    endpoint, which accepts up to 100 creates/updates per request.
+
+    Products whose SKU already exists are sent as updates instead of failing as
+    duplicate creates. Results are reported per SKU, including products that
+    failed before reaching the batcher (see `fail`). A product whose SKU was
+    already added in this run (two folders with the same name after
+    normalization) is not sent and is recorded in `duplicates`, since sending
+    it would overwrite the first one.
+    """
+
+    MAX_BATCH_SIZE = 100 # WooCommerce limit for products/batch
+
+    def __init__(self, batch_size=MAX_BATCH_SIZE):
+        self.batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        self.results = {} # SKU -> (action, product ID or None, error message or None)
+        self.duplicates = [] # (SKU, product name) of products skipped as duplicates
+        self._seen = set()
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def add(self, product_name, color_name, image_ids):
+        """Queues a product and flushes automatically once a full batch is buffered."""
+        data = build_product_payload(product_name, color_name, image_ids)
+        with self._lock:
+            if data["sku"] in self._seen:
+                self.duplicates.append((data["sku"], product_name))
+                print(f"❌ Skipped product '{product_name}': SKU {data['sku']} is already used by another product in this run")
+                return
+            self._seen.add(data["sku"])
+            self._buffer.append(data)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self._send(batch)
+
+    def fail(self, product_name, step, error):
+        """Records a product that failed before it could be queued (color detection, image uploads)."""
+        sku = product_sku(product_name)
+        with self._lock:
+            if sku in self._seen:
+                self.duplicates.append((sku, product_name))
+                return
+            self._seen.add(sku)
+            self.results[sku] = (step, None, error)
+
+    def flush(self):
+        """Sends any buffered products."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._send(batch)
+
+    def _existing_ids_by_sku(self, skus):
+        """Looks up which SKUs already exist, returning {sku: product_id}."""
+        response = get_wcapi().get("products", params={"sku": ",".join(skus), "per_page": self.MAX_BATCH_SIZE, "status": "any"})
+        if response.status_code != 200:
+            print(f"⚠️ Could not look up existing SKUs ({response.status_code}); sending all as creates.")
+            return {}
+        return {product["sku"]: product["id"] for product in response.json() if product.get("sku")}
+
+    def _fail_batch(self, batch, error):
+        """Records every product of a batch that never got per-item results as failed."""
+        for data in batch:
+            self.results[data["sku"]] = ("batch", None, error)
+
+    def _send(self, batch):
+        try:
+            existing = self._existing_ids_by_sku([data["sku"] for data in batch])
+            creates = [data for data in batch if data["sku"] not in existing]
+            updates = [dict(data, id=existing[data["sku"]]) for data in batch if data["sku"] in existing]
+
+            with stage("product"):
+                response = get_wcapi().post("products/batch", {"create": creates, "update": updates})
+            if response.status_code not in (200, 201):
+                print(f"❌ Failed to send product batch: {response.status_code} - {response.text}")
+                self._fail_batch(batch, f"products/batch returned {response.status_code}")
+                return
+            body = response.json()
+        except Exception as e:
+            print(f"❌ Exception occurred during batch product creation: {e}")
+            self._fail_batch(batch, str(e))
+            return
+
+        # The batch endpoint returns one item per request item, in the same order
+        for action, sent in (("create", creates), ("update", updates)):
+            for data, item in zip(sent, body.get(action, [])):
+                error = item.get("error")
+                if error:
+                    self.results[data["sku"]] = (action, None, error.get("message"))
+                    print(f"❌ Failed to {action} product {data['sku']}: {error.get('code')} - {error.get('message')}")
+                else:
+                    self.results[data["sku"]] = (action, item.get("id"), None)
+                    verb = "created" if action == "create" else "updated"
+                    print(f"🎉 Product {verb} successfully: {data['name']} (SKU {data['sku']}, ID {item.get('id')})")
+        self._fail_batch([data for data in batch if data["sku"] not in self.results], "No result in the products/batch response")
+
+def find_product_jobs():
+    """
+    Returns a list of (product_name, label, images) tuples to import.
+
+    Each subfolder of IMAGE_FOLDER is a product whose sorted images become the
+    featured image and gallery. Without subfolders, every image in the root is
+    imported as its own product.
+    """
+    valid_extensions = ('.png', '.jpg', '.jpeg', '.webp')
+
     # Scan subfolders inside IMAGE_FOLDER (each subfolder is a product)
-    subfolders = [os.path.join(IMAGE_FOLDER, d) for d in os.listdir(IMAGE_FOLDER) if os.path.isdir(os.path.join(IMAGE_FOLDER, d))]
-    
+    subfolders = sorted(os.path.join(IMAGE_FOLDER, d) for d in os.listdir(IMAGE_FOLDER) if os.path.isdir(os.path.join(IMAGE_FOLDER, d)))
+
     if not subfolders:
         print(f"ℹ️ No subfolders found in '{IMAGE_FOLDER}'. Checking for files in root...")
         # Fallback to checking the root directory for direct files
-        files_to_process = [f for f in os.listdir(IMAGE_FOLDER) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
+        files_to_process = sorted(f for f in os.listdir(IMAGE_FOLDER) if f.lower().endswith(valid_extensions))
         if files_to_process:
             print("💡 Found images directly in root folder. Processing as individual products...")
-            for filename in files_to_process:
-                image_path = os.path.join(IMAGE_FOLDER, filename)
-                name_without_ext = os.path.splitext(filename)[0].replace("_", " ").replace("-", " ").title()
-                
-                try:
-                    color_name = get_dominant_color(image_path)
-                    print(f"\nProcessing file: {filename}...")
-                    print(f"🎨 Detected Color: {color_name}")
-                except Exception as e:
-                    print(f"❌ Failed to detect color for {filename}: {e}")
-                    continue
-                
-                image_id = upload_image_to_wp(image_path)
-                if image_id:
-                    create_woocommerce_product(name_without_ext, color_name, [image_id])
-        return
+        return [
+            (os.path.splitext(f)[0].replace("_", " ").replace("-", " ").title(), f, [os.path.join(IMAGE_FOLDER, f)])
+            for f in files_to_process
+        ]
 
+    jobs = []
     for folder_path in subfolders:
         folder_name = os.path.basename(folder_path)
         product_name = folder_name.replace("_", " ").replace("-", " ").title()
-        
-        print(f"\n📁 Processing Product Folder: '{folder_name}'...")
-        
-        # Get all valid images in the subfolder
-        valid_extensions = ('.png', '.jpg', '.jpeg', '.webp')
-        images = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(valid_extensions)]
-        
+
+        # Sort images to ensure consistent main image ordering (e.g. image_1, image_2, etc.)
+        images = sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.lower().endswith(valid_extensions))
+
         if not images:
             print(f"⚠️ No valid images found in folder '{folder_name}'. Skipping.")
             continue
-            
-        # Sort images to ensure consistent main image ordering (e.g. image_1, image_2, etc.)
-        images.sort()
-        
-        main_image_path = images[0]
-        print(f"🖼️ Main (featured) image: {os.path.basename(main_image_path)}")
-        if len(images) > 1:
-            print(f"🖼️ Gallery images: {', '.join([os.path.basename(img) for img in images[1:]])}")
-            
-        # 1. Detect Color using the main (first) image
-        try:
-            color_name = get_dominant_color(main_image_path)
-            print(f"🎨 Detected Color (from main image): {color_name}")
-        except Exception as e:
-            print(f"❌ Failed to detect color for {os.path.basename(main_image_path)}: {e}")
-            continue
-            
-        # 2. Upload all images to WordPress and get attachment IDs
-        uploaded_image_ids = []
-        for img_path in images:
-            image_id = upload_image_to_wp(img_path)
-            if image_id:
-                uploaded_image_ids.append(image_id)
-                
-        # 3. Create Product in WooCommerce
-        if uploaded_image_ids:
-            create_woocommerce_product(product_name, color_name, uploaded_image_ids)
-        else:
-            print(f"❌ Failed to upload any images for product '{product_name}'. Product creation skipped.")
+        jobs.append((product_name, folder_name, images))
+    return jobs
+
+def process_product(product_name, label, images, color_future, upload_pool, batcher=None):
+    """Waits for this product's color, uploads its images concurrently, then creates the product."""
+    main_image_path = images[0]
+
+    # 1. Detect Color using the main (first) image (computed in the process pool)
+    try:
+        color_name = color_future.result()
+        print(f"🎨 Detected Color for '{label}' (from {os.path.basename(main_image_path)}): {color_name}")
+    except Exception as e:
+        print(f"❌ Failed to detect color for {os.path.basename(main_image_path)}: {e}")
+        if batcher:
+            batcher.fail(product_name, "color", str(e))
+        return
+
+    # 2. Upload all images to WordPress and get attachment IDs, keeping featured/gallery order
+    upload_futures = [upload_pool.submit(upload_image_to_wp, img_path) for img_path in images]
+    uploaded_image_ids = [image_id for image_id in (f.result() for f in upload_futures) if image_id]
+
+    # 3. Create Product in WooCommerce (or queue it for the next products/batch call)
+    if uploaded_image_ids and batcher:
+        batcher.add(product_name, color_name, uploaded_image_ids)
+    elif uploaded_image_ids:
+        create_woocommerce_product(product_name, color_name, uploaded_image_ids)
+    else:
+        print(f"❌ Failed to upload any images for product '{product_name}'. Product creation skipped.")
+        if batcher:
+            batcher.fail(product_name, "upload", "No image could be uploaded")
+
+def main():
+    if not os.path.exists(IMAGE_FOLDER):
+        print(f"❌ Image folder '{IMAGE_FOLDER}' does not exist. Please create it and add your product subfolders.")
+        return
+
+    jobs = find_product_jobs()
+    if not jobs:
+        return
+
+    print(f"\n📦 Importing {len(jobs)} products ({COLOR_WORKERS} color workers, {UPLOAD_WORKERS} upload workers)...")
+    batcher = ProductBatcher(PRODUCT_BATCH_SIZE) if PRODUCT_BATCH_SIZE > 0 else None
+
+    # Color detection is CPU bound and runs in processes; uploads are network bound
+    # and share one pooled session across threads. Each product only waits on its
+    # own color and images, so detection, uploads and product creation overlap.
+    with ProcessPoolExecutor(max_workers=COLOR_WORKERS, initializer=init_worker) as color_pool, \
+            ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as upload_pool, \
+            ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as product_pool:
+        color_futures = [color_pool.submit(get_dominant_color, images[0]) for _, _, images in jobs]
+        product_futures = {
+            product_pool.submit(process_product, product_name, label, images, color_future, upload_pool, batcher): product_name
+            for (product_name, label, images), color_future in zip(jobs, color_futures)
+        }
+        for future in as_completed(product_futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Unexpected error while importing product '{product_futures[future]}': {e}")
+                if batcher:
+                    batcher.fail(product_futures[future], "import", str(e))
+
+    if batcher:
+        batcher.flush()
+        failed = sorted(sku for sku, (_, _, error) in batcher.results.items() if error)
+        print(f"\n📊 {len(batcher.results) - len(failed)} products saved, {len(failed)} failed, "
+              f"{len(batcher.duplicates)} skipped as duplicate SKUs.")
+        if failed:
+            print(f"❌ Failed SKUs: {', '.join(failed)}")
+        if batcher.duplicates:
+            print(f"❌ Duplicate SKUs: {', '.join(f'{sku} ({name})' for sku, name in batcher.duplicates)}")
 
 if __name__ == "__main__":
-    main()
+    with profiled("fabric_uploader"):
+        main()
@@ -0,0 +1,219 @@
+"""
+Copy of `WordPress API/common/wp_profile.py`, vendored so this tool folder runs
+on its own. Make changes there and copy the file over.
+
+Opt-in profiling for the WordPress and WooCommerce scripts.
+
+Profiling is off unless PROFILE_DIR is set or the script is started with
+`--profile DIR`. When it is on, every run gets its own directory,
+`<PROFILE_DIR>/<script>-<timestamp>-<pid>/`, holding:
+
+* profile.pstats / profile.txt: cProfile of the main process, merged with the
+  worker processes started by `profiled_pool()` or by a pool or
+  ProcessPoolExecutor with `initializer=init_worker`
+* allocations.txt: the tracemalloc top-N allocation sites of the main process
+  and its peak traced memory
+* stages.json: wall-clock totals per stage (decode, encode, upload, parse,
+  write, ...) from `with stage("upload"):` blocks, across all threads and
+  worker processes
+
+Workers flush their numbers every FLUSH_INTERVAL_SEC and again when they exit
+cleanly. A terminated pool loses up to the last FLUSH_INTERVAL_SEC of its
+workers' data. profiled_pool() closes the pool instead of terminating it.
+
+    with profiled("delete_wp_records"):
+        main()
+"""
+import contextlib
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from multiprocessing import Pool, util as mp_util
+
+PROFILE_ENV = "PROFILE_DIR"
+RUN_DIR_ENV = "PROFILE_RUN_DIR"  # Set by the main process so workers write into the same run directory
+TOP_N = int(os.getenv("PROFILE_TOP_N", 25))
+FLUSH_INTERVAL_SEC = 5.0
+
+_state = None
+_NO_STAGE = contextlib.nullcontext()
+
+
+class _ProfileState(object):
+    def __init__(self, run_dir, is_worker):
+        self.run_dir = run_dir
+        self.is_worker = is_worker
+        self.profile = cProfile.Profile()
+        self.stages = {}  # name -> [count, total seconds]
+        self.lock = threading.Lock()
+        self.last_flush = time.time()
+        self.start = time.time()
+
+    def add(self, name, elapsed):
+        with self.lock:
+            totals = self.stages.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+
+
+def enabled():
+    return _state is not None
+
+
+def argv_profile_dir(argv=None):
+    """Removes `--profile DIR` / `--profile=DIR` from argv (sys.argv by default) and returns DIR, if given."""
+    argv = sys.argv if argv is None else argv
+    for i, arg in enumerate(argv[1:], start=1):
+        if arg.startswith("--profile="):
+            del argv[i]
+            return arg.split("=", 1)[1]
+        if arg == "--profile" and i + 1 < len(argv):
+            value = argv[i + 1]
+            del argv[i:i + 2]
+            return value
+    return None
+
+
+def start(name, base_dir=None):
+    """Starts profiling the main process if a profile directory is configured; returns the run directory or None."""
+    global _state
+    base_dir = base_dir or argv_profile_dir() or os.getenv(PROFILE_ENV)
+    if not base_dir or _state is not None:
+        return None
+
+    run_dir = os.path.join(base_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    os.makedirs(run_dir, exist_ok=True)
+    os.environ[RUN_DIR_ENV] = run_dir
+
+    _state = _ProfileState(run_dir, is_worker=False)
+    tracemalloc.start()
+    _state.profile.enable()
+    return run_dir
+
+
+def init_worker():
+    """Pool/ProcessPoolExecutor initializer: profiles the worker if its parent is profiling. A no-op otherwise."""
+    global _state
+    run_dir = os.getenv(RUN_DIR_ENV)
+    if not run_dir:
+        return
+    if _state is not None:
+        # A forked worker inherits its parent's profiler and tracing; it gets its own profiler instead
+        _state.profile.disable()
+        tracemalloc.stop()
+    _state = _ProfileState(run_dir, is_worker=True)
+    _state.profile.enable()
+    mp_util.Finalize(None, flush, exitpriority=10)
+
+
+@contextlib.contextmanager
+def profiled_pool(processes):
+    """A multiprocessing.Pool whose workers are profiled with the main process. On exit it is closed, not terminated, so workers flush."""
+    pool = Pool(processes, initializer=init_worker)
+    try:
+        yield pool
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def stage(name):
+    """Context manager adding the block's wall time to stage `name`. Costs nothing when profiling is off."""
+    if _state is None:
+        return _NO_STAGE
+    return _timed_stage(name)
+
+
+@contextlib.contextmanager
+def _timed_stage(name):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        _state.add(name, time.perf_counter() - start_time)
+        if _state.is_worker and time.time() - _state.last_flush >= FLUSH_INTERVAL_SEC:
+            flush()
+
+
+def flush():
+    """Writes this worker's profile and stage totals into the run directory."""
+    if _state is None or not _state.is_worker:
+        return
+    pid = os.getpid()
+    _state.profile.disable()
+    try:
+        _state.profile.dump_stats(os.path.join(_state.run_dir, f"worker-{pid}.pstats"))
+    finally:
+        _state.profile.enable()
+    with _state.lock:
+        stages = {name: list(totals) for name, totals in _state.stages.items()}
+    with open(os.path.join(_state.run_dir, f"worker-{pid}.stages.json"), "w") as f:
+        json.dump(stages, f)
+    _state.last_flush = time.time()
+
+
+def finish():
+    """Stops profiling and writes the run directory's reports. Returns the run directory or None."""
+    global _state
+    if _state is None or _state.is_worker:
+        return None
+    state, _state = _state, None
+    state.profile.disable()
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.environ.pop(RUN_DIR_ENV, None)
+
+    stats = pstats.Stats(state.profile)
+    worker_profiles = sorted(glob.glob(os.path.join(state.run_dir, "worker-*.pstats")))
+    for path in worker_profiles:
+        stats.add(path)
+    stats.dump_stats(os.path.join(state.run_dir, "profile.pstats"))
+    report = io.StringIO()
+    pstats.Stats(os.path.join(state.run_dir, "profile.pstats"), stream=report).sort_stats("cumulative").print_stats(50)
+    with open(os.path.join(state.run_dir, "profile.txt"), "w") as f:
+        f.write(f"Main process plus {len(worker_profiles)} worker processes\n")
+        f.write(report.getvalue())
+
+    with open(os.path.join(state.run_dir, "allocations.txt"), "w") as f:
+        f.write(f"Traced memory: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB\n\n")
+        f.write(f"Top {TOP_N} allocation sites still held at exit:\n")
+        for entry in snapshot.statistics("lineno")[:TOP_N]:
+            f.write(f"{entry}\n")
+
+    stages = {name: list(totals) for name, totals in state.stages.items()}
+    for path in glob.glob(os.path.join(state.run_dir, "worker-*.stages.json")):
+        with open(path) as f:
+            for name, (count, total) in json.load(f).items():
+                totals = stages.setdefault(name, [0, 0.0])
+                totals[0] += count
+                totals[1] += total
+    with open(os.path.join(state.run_dir, "stages.json"), "w") as f:
+        json.dump({
+            "wall_sec": round(time.time() - state.start, 3),
+            "stages": {name: {"count": count, "total_sec": round(total, 3), "mean_ms": round(total / count * 1000, 3)}
+                       for name, (count, total) in sorted(stages.items(), key=lambda item: -item[1][1])},
+        }, f, indent=2)
+    return state.run_dir
+
+
+@contextlib.contextmanager
+def profiled(name, base_dir=None):
+    """Profiles the enclosed block (usually a script's main()) when profiling is switched on."""
+    run_dir = start(name, base_dir)
+    try:
+        yield run_dir
+    finally:
+        if run_dir:
+            finish()
+            print(f"Profile written to {os.path.abspath(run_dir)}", file=sys.stderr)
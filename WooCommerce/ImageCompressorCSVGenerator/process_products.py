@@ -1,120 +1,225 @@
 import os
 import csv
+import hashlib
+import json
+from io import BytesIO
 from PIL import Image
 
+# Opt-in profiling and bounded image loading; wp_image and wp_profile are copies of the WordPress API/common helpers
+from wp_image import ImageTooLarge, flatten_to_rgb, open_bounded
+from wp_profile import profiled, stage
+
 # ================= CONFIGURATION =================
 INPUT_FOLDER = 'original_images'       # Base folder containing your product subfolders
 OUTPUT_FOLDER = 'compressed_images'    # Flat folder where ALL compressed images will go
 CSV_FILENAME = 'woocommerce_import.csv' # Name of the generated CSV file
 MAX_FILE_SIZE_KB = 1500                 # Target maximum file size in KB
+MAX_DIMENSION = 2560                    # Longest side in pixels; larger images are downscaled before encoding
+SKIP_UNCHANGED = True                   # Reuse compressed images that are newer than their source
 # =================================================
 
+CSV_HEADERS = [
+    'Type', 'SKU', 'Name', 'Published', 'Is featured?',
+    'Visibility in catalog', 'Regular price', 'Categories', 'Images'
+]
+VALID_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+SETTINGS_FILE = '.compression-settings.json'  # In OUTPUT_FOLDER: the settings its images were compressed with
+
+
+def slugify(value):
+    """Turns a folder or file name into a lowercase, filesystem-safe slug."""
+    slug = "".join(c if c.isalnum() else "-" for c in value.lower())
+    return "-".join(part for part in slug.split("-") if part) or "image"
+
+
+def output_name_for(product_name, input_path, used_names):
+    """
+    Builds a deterministic output file name scoped to its product.
+
+    Two products can both contain `1.jpg`, so the product slug is prefixed to
+    the image name. If two sources still map to the same name (e.g. "Red Linen"
+    and "red-linen"), a short hash of the source path keeps them apart.
+    """
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    final_img_name = f"{slugify(product_name)}-{slugify(base_name)}.webp"
+    if final_img_name in used_names:
+        digest = hashlib.sha1(input_path.encode('utf-8')).hexdigest()[:8]
+        final_img_name = f"{slugify(product_name)}-{slugify(base_name)}-{digest}.webp"
+    used_names.add(final_img_name)
+    return final_img_name
+
+
+def compression_settings():
+    """The settings that change what compress_image() writes."""
+    return {'max_file_size_kb': MAX_FILE_SIZE_KB, 'max_dimension': MAX_DIMENSION}
+
+
+def settings_unchanged():
+    """True if the images in OUTPUT_FOLDER were compressed with the current settings."""
+    try:
+        with open(os.path.join(OUTPUT_FOLDER, SETTINGS_FILE), encoding='utf-8') as f:
+            return json.load(f) == compression_settings()
+    except (OSError, ValueError):
+        return False
+
+
+def save_compression_settings():
+    with open(os.path.join(OUTPUT_FOLDER, SETTINGS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(compression_settings(), f)
+
+
+def is_up_to_date(input_path, output_path, same_settings=True):
+    """True if the compressed output exists, is newer than its source image and used the current settings."""
+    return (same_settings and os.path.exists(output_path)
+            and os.path.getmtime(output_path) >= os.path.getmtime(input_path))
+
+
+def sku_for(product_name, folder, used_skus):
+    """
+    Builds the product's SKU from its folder name.
+
+    Rows are written one folder at a time, so two folders with the same name in
+    different parents (`x/Blue` and `Blue`) would share a SKU and the importer
+    would overwrite one with the other. The second one gets a short hash of its
+    path, as output_name_for() does for file names.
+    """
+    sku = f"FABRIC-{product_name.upper().replace(' ', '-')}"
+    if sku in used_skus:
+        sku = f"{sku}-{hashlib.sha1(folder.encode('utf-8')).hexdigest()[:8].upper()}"
+        print(f"Warning: Another folder is also named '{product_name}'; {folder} gets SKU {sku}")
+    used_skus.add(sku)
+    return sku
+
+
+def product_row(product_name, sku, image_list):
+    """Builds the WooCommerce CSV row for a single product."""
+    return {
+        'Type': 'simple',
+        'SKU': sku,
+        'Name': product_name,
+        'Published': 1,
+        'Is featured?': 0,
+        'Visibility in catalog': 'visible',
+        'Regular price': '1500',
+        'Categories': 'Linen Fabrics',
+        'Images': ", ".join(image_list)
+    }
+
 def compress_image(input_path, output_path, max_kb):
-    """Compresses an image, preserving color profiles and using WebP for optimal quality."""
-    img = Image.open(input_path)
-    
-    # 1. Extract the color profile to prevent colors from dulling or shifting
-    icc_profile = img.info.get('icc_profile')
-    
-    # 2. Properly handle PNG transparency (RGBA) by adding a white background
-    # Otherwise, transparent areas turn solid black when converted.
-    if img.mode in ("RGBA", "P"):
-        background = Image.new("RGB", img.size, (255, 255, 255))
-        if img.mode == "RGBA":
-            # Use the alpha channel as a mask
-            background.paste(img, mask=img.split()[3])
-        else:
-            background.paste(img)
-        img = background
-    elif img.mode != "RGB":
-        img = img.convert("RGB")
-
-    quality = 85
-    # Save as WebP - retains high quality and accurate colors at much lower file sizes
-    img.save(output_path, format='WEBP', icc_profile=icc_profile, quality=quality, method=4)
-    
-    # 3. Smarter reduction: Resize the dimensions if it's still too big, 
-    # but NEVER drop the visual quality below 65.
-    while os.path.getsize(output_path) > max_kb * 1024 and quality >= 65:
-        # If the file is significantly larger than the target, resize the dimensions first
-        if os.path.getsize(output_path) > max_kb * 1500:
-            width, height = img.size
-            img = img.resize((int(width * 0.8), int(height * 0.8)), Image.Resampling.LANCZOS)
-        else:
-            # Only drop quality if we are close to the target size
-            quality -= 5 
-            
-        img.save(output_path, format='WEBP', icc_profile=icc_profile, quality=quality, method=4)
+    """
+    Compresses an image, preserving color profiles and using WebP for optimal quality.
+
+    Memory stays bounded: the image is decoded already downscaled to MAX_DIMENSION
+    (see wp_image), every encode attempt reuses one in-memory buffer, and the
+    output file is written once, when the final size is known.
+    """
+    with stage("decode"):
+        with open_bounded(input_path, MAX_DIMENSION) as img:
+            # 1. Extract the color profile to prevent colors from dulling or shifting
+            icc_profile = img.info.get('icc_profile')
+
+            # 2. Properly handle PNG transparency by adding a white background.
+            # Otherwise, transparent areas turn solid black when converted.
+            img = flatten_to_rgb(img)
+
+    with stage("encode"):
+        quality = 85
+        buffer = BytesIO()
+
+        def encode():
+            buffer.seek(0)
+            buffer.truncate()
+            # Save as WebP - retains high quality and accurate colors at much lower file sizes
+            img.save(buffer, format='WEBP', icc_profile=icc_profile, quality=quality, method=4)
+            return buffer.tell()
+
+        size = encode()
+
+        # 3. Smarter reduction: Resize the dimensions if it's still too big,
+        # but NEVER drop the visual quality below 65.
+        while size > max_kb * 1024 and quality >= 65:
+            # If the file is significantly larger than the target, resize the dimensions first
+            if size > max_kb * 1500:
+                width, height = img.size
+                img = img.resize((int(width * 0.8), int(height * 0.8)), Image.Resampling.LANCZOS)
+            else:
+                # Only drop quality if we are close to the target size
+                quality -= 5
+            size = encode()
+
+        with open(output_path, 'wb') as f:
+            f.write(buffer.getbuffer())
 
 def main():
     if not os.path.exists(OUTPUT_FOLDER):
         os.makedirs(OUTPUT_FOLDER)
 
-    csv_headers = [
-        'Type', 'SKU', 'Name', 'Published', 'Is featured?', 
-        'Visibility in catalog', 'Regular price', 'Categories', 'Images'
-    ]
-    csv_data = []
-    valid_extensions = ('.jpg', '.jpeg', '.png', '.webp')
-
-    products = {}
+    used_names = set()
+    used_skus = set()
+    product_count = 0
+    same_settings = settings_unchanged()
+    if SKIP_UNCHANGED and not same_settings:
+        print("Compression settings changed (or were never recorded); recompressing every image.")
 
     print("Scanning folders...")
 
-    for root, dirs, files in os.walk(INPUT_FOLDER):
-        if root == INPUT_FOLDER:
-            continue # Skip files not in a subfolder
-            
-        product_name = os.path.basename(root)
-        valid_files = [f for f in files if f.lower().endswith(valid_extensions)]
-        
-        if valid_files:
-            valid_files.sort()
-            
-            if product_name not in products:
-                products[product_name] = []
-
+    # Rows are written as soon as each product's images are done, so memory
+    # stays flat no matter how large the catalog is. The CSV is only opened for
+    # the first product, so a run that finds nothing keeps the previous CSV.
+    csv_file = writer = None
+    try:
+        for root, dirs, files in os.walk(INPUT_FOLDER):
+            dirs.sort()  # Deterministic walk order keeps output names stable between runs
+            if root == INPUT_FOLDER:
+                continue # Skip files not in a subfolder
+
+            product_name = os.path.basename(root)
+            valid_files = sorted(f for f in files if f.lower().endswith(VALID_EXTENSIONS))
+            if not valid_files:
+                continue
+
+            image_list = []
             for file in valid_files:
                 input_path = os.path.join(root, file)
-                
-                base_name = os.path.splitext(file)[0]
-                # CHANGED: Save as WebP instead of JPG
-                final_img_name = f"{base_name}.webp" 
+                final_img_name = output_name_for(product_name, os.path.relpath(input_path, INPUT_FOLDER), used_names)
                 output_path = os.path.join(OUTPUT_FOLDER, final_img_name)
-                
-                compress_image(input_path, output_path, MAX_FILE_SIZE_KB)
-                print(f"Processed: Product '{product_name}' -> {final_img_name}")
-                
-                products[product_name].append(final_img_name)
 
-    if not products:
+                if SKIP_UNCHANGED and is_up_to_date(input_path, output_path, same_settings):
+                    print(f"Unchanged: Product '{product_name}' -> {final_img_name}")
+                else:
+                    try:
+                        compress_image(input_path, output_path, MAX_FILE_SIZE_KB)
+                    except ImageTooLarge as e:
+                        print(f"Skipped: {e}")
+                        continue
+                    print(f"Processed: Product '{product_name}' -> {final_img_name}")
+
+                image_list.append(final_img_name)
+
+            if not image_list:
+                print(f"Skipped: Product '{product_name}' has no usable images")
+                continue
+            sku = sku_for(product_name, os.path.relpath(root, INPUT_FOLDER), used_skus)
+
+            with stage("write"):
+                if writer is None:
+                    csv_file = open(CSV_FILENAME, mode='w', newline='', encoding='utf-8')
+                    writer = csv.DictWriter(csv_file, fieldnames=CSV_HEADERS)
+                    writer.writeheader()
+                writer.writerow(product_row(product_name, sku, image_list))
+                csv_file.flush()
+            product_count += 1
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+
+    if not product_count:
         print(f"Error: Found 0 valid images inside subfolders of '{INPUT_FOLDER}'.")
         return
+    save_compression_settings()
 
-    print(f"\nFound {len(products)} unique products. Generating CSV...")
-
-    for product_name, image_list in products.items():
-        images_string = ", ".join(image_list)
-        safe_sku = f"FABRIC-{product_name.upper().replace(' ', '-')}"
-
-        csv_data.append({
-            'Type': 'simple',
-            'SKU': safe_sku,                           
-            'Name': product_name,                       
-            'Published': 1,
-            'Is featured?': 0,
-            'Visibility in catalog': 'visible',
-            'Regular price': '1500',                    
-            'Categories': 'Linen Fabrics',              
-            'Images': images_string                     
-        })
-
-    with open(CSV_FILENAME, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=csv_headers)
-        writer.writeheader()
-        writer.writerows(csv_data)
-
-    print(f"\nSuccess! \n- Saved to: {OUTPUT_FOLDER}/\n- CSV saved as: {CSV_FILENAME}")
+    print(f"\nSuccess! {product_count} products exported.\n- Saved to: {OUTPUT_FOLDER}/\n- CSV saved as: {CSV_FILENAME}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profiled("process_products"):
+        main()
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+Copy of `WordPress API/common/wp_image.py`, vendored so this tool folder runs
+on its own. Make changes there and copy the file over.
+
+Memory-bounded image loading for the image compressors.
+
+Opening a 20000x15000 scan and compressing it the naive way decodes all
+300 MP (900 MB as RGB), allocates a second full-size RGB copy to flatten
+transparency, and then resizes full-size copies in a loop. load_bounded()
+instead:
+
+* refuses images over IMAGE_MAX_PIXELS from their header, before decoding
+  anything, with an ImageTooLarge error naming the file and its size
+* lets JPEG decode at 1/2, 1/4 or 1/8 scale (Image.draft) when only a smaller
+  image is needed, so the full-resolution pixels are never in memory
+* refuses to decode anything that would take more than IMAGE_MEMORY_MB in
+  this process. The budget is per process, so a pool of N compressors needs
+  about N x IMAGE_MEMORY_MB.
+* downscales to `max_side` before any other work, so flattening and the
+  encode loop only ever touch the small image
+
+Pillow is imported on first use, so importing this module stays cheap.
+
+    with open_bounded(path, max_side=2560) as img:
+        img = flatten_to_rgb(img)
+"""
+import os
+import warnings
+
+MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 120_000_000))  # Larger images are rejected unread
+MEMORY_BUDGET_MB = float(os.getenv("IMAGE_MEMORY_MB", 512))  # Decoded pixels one process may hold
+MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", 2560))  # WordPress scales anything larger down to 2560 anyway
+
+# Decoded bytes per pixel of the common modes; anything else is assumed to take 4
+BYTES_PER_PIXEL = {"1": 1, "L": 1, "P": 1, "LA": 2, "I;16": 2, "RGB": 3, "YCbCr": 3, "LAB": 3, "HSV": 3}
+
+
+class ImageTooLarge(ValueError):
+    """An image is over the pixel limit or would not fit in the memory budget."""
+
+
+def decoded_mb(size, mode):
+    width, height = size
+    return width * height * BYTES_PER_PIXEL.get(mode, 4) / (1024 * 1024)
+
+
+def fit_within(size, max_side):
+    """The size scaled down (never up) so that its longer side is at most max_side."""
+    width, height = size
+    scale = min(1.0, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def load_bounded(img, max_side=MAX_SIDE, budget_mb=None, max_pixels=None):
+    """
+    Decodes an opened, not yet loaded image, downscaled to fit max_side, within the memory budget.
+
+    Returns the image, which is resized in place. Raises ImageTooLarge when the
+    image is over max_pixels or its smallest possible decode is over budget_mb.
+    `max_side=None` keeps the full size.
+    """
+    from PIL import Image
+
+    budget_mb = MEMORY_BUDGET_MB if budget_mb is None else budget_mb
+    max_pixels = MAX_PIXELS if max_pixels is None else max_pixels
+    name = getattr(img, "filename", None) or "image"
+
+    width, height = img.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"{name}: {width}x{height} is {width * height / 1e6:.0f} MP, "
+                            f"over the IMAGE_MAX_PIXELS limit of {max_pixels / 1e6:.0f} MP")
+
+    target = fit_within(img.size, max_side) if max_side else img.size
+    if target != img.size:
+        # JPEG decodes straight at the smallest 1/2, 1/4 or 1/8 scale that is still >= target; a no-op for other formats
+        img.draft(None, target)
+
+    needed = decoded_mb(img.size, img.mode)
+    if needed > budget_mb:
+        raise ImageTooLarge(f"{name}: decoding {img.size[0]}x{img.size[1]} {img.mode} needs {needed:.0f} MB, "
+                            f"over the IMAGE_MEMORY_MB budget of {budget_mb:.0f} MB")
+
+    if target != img.size:
+        # reducing_gap shrinks by an integer factor first, which is much cheaper than one big LANCZOS pass
+        img.thumbnail(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    else:
+        img.load()
+    return img
+
+
+def open_bounded(path, max_side=MAX_SIDE, budget_mb=None, max_pixels=None):
+    """
+    Image.open() + load_bounded(). Pillow's own decompression bomb check is turned into ImageTooLarge too.
+
+    The pixel cap is checked against the image's header size; Pillow's global
+    Image.MAX_IMAGE_PIXELS is left alone, since other code in the process may
+    rely on it. Pillow still refuses images over twice that limit (about 179 MP
+    by default) while opening them, so an IMAGE_MAX_PIXELS above that only takes
+    effect if the application raises Image.MAX_IMAGE_PIXELS itself.
+    """
+    from PIL import Image
+
+    try:
+        with warnings.catch_warnings():
+            # load_bounded() rejects these with a clearer error
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            img = Image.open(path)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(f"{path}: {e}") from None
+    try:
+        return load_bounded(img, max_side, budget_mb, max_pixels)
+    except BaseException:
+        img.close()
+        raise
+
+
+def flatten_to_rgb(img, background=(255, 255, 255)):
+    """
+    Returns an RGB version of the image with any transparency composited on the background.
+
+    Without this, transparent areas turn black when saved as JPEG or WebP. Call it
+    after load_bounded() so the extra copy is only the size of the downscaled image.
+    """
+    from PIL import Image
+
+    if img.mode == "P":
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    if img.mode in ("RGBA", "LA"):
+        flat = Image.new("RGB", img.size, background)
+        flat.paste(img, mask=img.getchannel("A"))
+        return flat
+    return img if img.mode == "RGB" else img.convert("RGB")
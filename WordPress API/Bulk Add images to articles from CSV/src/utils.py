@@ -1,7 +1,9 @@
 import os
-from PIL import Image, ExifTags
 from io import BytesIO
-from iptcinfo3 import IPTCInfo
+
+from wp_image import MAX_SIDE, ImageTooLarge, flatten_to_rgb, load_bounded
+
+# Pillow and iptcinfo3 are imported where they are used, so importing this module stays cheap.
 
 
 def extract_caption_credit(image_input):
@@ -26,6 +28,7 @@ def extract_caption_credit(image_input):
 
         # --- IPTC ---
         try:
+            from iptcinfo3 import IPTCInfo
             iptc = IPTCInfo(input_stream, force=True)
             caption = iptc["credit"] if iptc["credit"] else None
             caption = caption.decode('UTF-8')
@@ -42,19 +45,28 @@ def extract_caption_credit(image_input):
         return None, None
 
 
-def compress_image(image: Image.Image, max_size_mb=2):
+def compress_image(image: "PIL.Image.Image", max_size_mb=2, max_side=MAX_SIDE):
     """
     Compress image to ensure it is under max_size_mb.
 
+    The image is downscaled to fit max_side before encoding, and transparency is
+    flattened onto white. An image that is not loaded yet (fresh from Image.open)
+    is decoded within the memory budget of wp_image.load_bounded.
+
     Parameters:
         image (PIL.Image): Pillow image object.
         max_size_mb (float): Max size in megabytes.
+        max_side (int): Longest side of the output in pixels; None keeps the full size.
 
     Returns:
         bytes: Compressed image in JPEG format, or None if failed.
+
+    Raises:
+        ImageTooLarge: The image is over IMAGE_MAX_PIXELS or would not fit in IMAGE_MEMORY_MB.
     """
     try:
-        buffer = BytesIO()
+        image = flatten_to_rgb(load_bounded(image, max_side))
+        buffer = BytesIO()  # Reused for every quality step
         quality = 95
         while True:
             buffer.seek(0)
@@ -65,6 +77,8 @@ def compress_image(image: Image.Image, max_size_mb=2):
                 break
             quality -= 5
         return buffer.getvalue()
+    except ImageTooLarge:
+        raise
     except Exception as e:
         print(f"❌ Failed to compress image: {e}")
         return None
@@ -1,69 +1,74 @@
-import copy
-import httpx
 import json
-import gzip
+import logging
 import os
 import sys
 import nanoid
 import time
-import urllib.parse
-from multiprocessing import Pool
+from argparse import ArgumentParser
 from loguru import logger
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from wp_actions import DeleteAction, PRECHECK_PAGE_SIZE
+from wp_input import post_id as parse_post_id, read_ids
+from wp_jobs import JobSpec, run_job
+from wp_profile import profiled, profiled_pool, stage
 
 class EnvVars(object):
     def __init__(self, **entries):
         self.__dict__.update(entries)
 
 
-def delete_post(post_id, env: EnvVars):
-    try:
-        with httpx.Client() as client:
-            post_url = os.path.join(env.WP_API_ENDPOINT, str(post_id))
-
-            # We _really_ want to delete the article!
-            post_url = urllib.parse.urlparse(post_url)._replace(query='force=true').geturl()
-
-            response = client.delete(
-                url=post_url,
-                auth=env.AUTH,
-                headers={
-                    'Content-Type': 'application/json',
-                },
-                timeout=env.TIMEOUT_SEC
-            )
-
-        status = {
-            'id': post_id,
-            'status_code': response.status_code,
-            'post_url': post_url,
-            'response': response.text
-        }
-
-        if response.status_code == 200:
-            status['message'] = f"Post {post_id} deleted successfully."
-        else:
-            status['message'] = f"Failed to delete post {post_id}."
-    except httpx.Timeout:
-        status = {
-            'id': post_id,
-            'post_url': post_url,
-            'status_code': None,
-            'response': None,
-            'message': f"Timeout while trying to delete post {post_id}."
-        }
-    except Exception as exc:
-        status = {
-            'id': post_id,
-            'post_url': post_url,
-            'status_code': None,
-            'response': None,
-            'message': f"Exception while trying to delete post {post_id}."
-        }
-        logger.exception(exc)
-
-    return status
+def find_existing_ids(post_ids: list, env: EnvVars) -> tuple:
+    """Returns (ids of post_ids that still exist, None), or (None, error message) if the check failed."""
+    return DeleteAction(env).find_existing(post_ids)
+
+
+def plan_deletions(post_ids: list, env: EnvVars, starmap=None) -> tuple:
+    """
+    Splits post_ids into (ids to delete, ids already gone, invalid ids) with bulk existence checks.
+
+    Ids whose check failed are kept in the delete list, so a flaky pre-check can
+    never cause a post to be skipped. Ids that aren't positive integers are
+    never sent. `starmap` defaults to a Pool of BATCH_SIZE processes.
+    """
+    if starmap is None:
+        with profiled_pool(env.BATCH_SIZE) as pool:
+            return plan_deletions(post_ids, env, pool.starmap)
+
+    valid_ids, invalid = [], []
+    for value in post_ids:
+        try:
+            valid_ids.append(parse_post_id(value))
+        except ValueError:
+            invalid.append(value)
+    unique_ids = list(dict.fromkeys(valid_ids))
+    chunks = [unique_ids[i:i + PRECHECK_PAGE_SIZE] for i in range(0, len(unique_ids), PRECHECK_PAGE_SIZE)]
+    to_delete, missing = [], []
+
+    for chunk, (existing, error) in zip(chunks, starmap(find_existing_ids, [(chunk, env) for chunk in chunks])):
+        if existing is None:
+            logger.warning(f"Existence check failed for {len(chunk)} ids ({error}); keeping them in the plan.")
+            to_delete.extend(chunk)
+            continue
+        for post_id in chunk:
+            (to_delete if post_id in existing else missing).append(post_id)
+
+    return to_delete, missing, invalid
+
+
+def write_plan_file(env: EnvVars, to_delete: list, missing: list, invalid: list = ()) -> str:
+    """Writes the deletion plan next to the status file and returns its path."""
+    base = env.STATUS_FILE[:-3] if env.STATUS_FILE.endswith(".gz") else env.STATUS_FILE
+    plan_file = f"{os.path.splitext(base)[0]}.plan.jsonl"
+    with open(plan_file, 'w') as f:
+        for post_id in to_delete:
+            f.write(json.dumps({'id': post_id, 'action': 'delete'}) + '\n')
+        for post_id in missing:
+            f.write(json.dumps({'id': post_id, 'action': 'skip', 'reason': 'not found'}) + '\n')
+        for post_id in invalid:
+            f.write(json.dumps({'id': post_id, 'action': 'skip', 'reason': 'invalid id'}) + '\n')
+    return plan_file
 
 
 def log_detailed_humane_time(seconds):
@@ -75,24 +80,6 @@ def log_detailed_humane_time(seconds):
         return f"{seconds // 3600} hours, {(seconds % 3600) // 60} minutes, and {(seconds % 3600) % 60} seconds"
 
 
-def log_random_record(current_batch: list):
-    # Log a random record from the current batch list
-    random_record_index = int(nanoid.generate(alphabet='123456789', size=12)) % len(current_batch)
-    random_record = copy.deepcopy(current_batch[random_record_index])
-
-    response = json.loads(random_record['response']) if random_record['response'] else None
-    if random_record['status_code'] and random_record['status_code'] == 200:
-        status_record = {
-            'deleted': response.get('deleted', False),
-            'id': response.get('previous', {}).get('id', None),
-            'title': response.get('previous', {}).get('title', {}).get('raw', None),
-            'slug': response.get('previous', {}).get('slug', None),
-        }
-
-        random_record['response'] = json.dumps(status_record)
-    logger.info(f"Random record from current batch: {random_record}")
-
-
 def get_env_vars():
     env = EnvVars(**os.environ)
 
@@ -107,6 +94,11 @@ def get_env_vars():
     env.AUTH = (env.AUTH_USERNAME, env.AUTH_PASSWORD)
     env.TIMEOUT_SEC = float(os.getenv('TIMEOUT_SEC', 10))
     env.BULK_SIZE = int(os.getenv('BULK_SIZE', 100))
+    env.PROGRESS_INTERVAL_SEC = float(os.getenv('PROGRESS_INTERVAL_SEC', 10))
+    env.STATUS_CAPTURE = os.getenv('STATUS_CAPTURE', 'failure')  # failure, always or never
+    env.CLIENT_OPTIONS = {}  # Extra get_client() settings, e.g. a per-host pool set by the multi-site runner
+    env.PRECHECK = os.getenv('PRECHECK', 'true').lower() in ('1', 'true', 'yes')
+    env.DRY_RUN = os.getenv('DRY_RUN', 'false').lower() in ('1', 'true', 'yes')
 
     return env
 
@@ -120,76 +112,57 @@ def log_env_vars(envs: EnvVars):
     logger.info(f"AUTH_PASSWORD: {'*' * len(envs.AUTH_PASSWORD)}")
     logger.info(f"STATUS_FILE: {envs.STATUS_FILE}")
     logger.info(f"TIMEOUT_SEC: {envs.TIMEOUT_SEC}")
+    logger.info(f"PROGRESS_INTERVAL_SEC: {envs.PROGRESS_INTERVAL_SEC}")
+    logger.info(f"STATUS_CAPTURE: {envs.STATUS_CAPTURE}")
+    logger.info(f"PRECHECK: {envs.PRECHECK}")
+    logger.info(f"DRY_RUN: {envs.DRY_RUN}")
+
+
+def job_spec(env: EnvVars) -> JobSpec:
+    """This run as a wp_jobs spec: FILE through the delete action, BULK_SIZE ids per chunk on BATCH_SIZE processes."""
+    return JobSpec('delete', env.FILE, status_file=env.STATUS_FILE, concurrency=env.BATCH_SIZE,
+                   chunk_size=env.BULK_SIZE, progress_interval_sec=env.PROGRESS_INTERVAL_SEC,
+                   options={'precheck': env.PRECHECK})
 
 
 def main():
+    parser = ArgumentParser(description='Delete every post id in FILE')
+    parser.add_argument('--fresh', action='store_true', help='Ignore the checkpoint of an earlier run and start over')
+    args = parser.parse_args()
+
     load_dotenv(os.getenv("ENV", None))
+    logging.basicConfig(level=os.getenv('APP_LOG_LEVEL', 'INFO'), format='[%(asctime)s] [%(levelname)s] %(message)s')
 
     env = get_env_vars()
     log_env_vars(env)
 
-    # Load the jsonl file
-    logger.info(f"Reading file {os.path.abspath(env.FILE)}...")
-    post_ids = get_non_empty_ids(env)
-    args_for_delete_post = [(post_id, env) for post_id in post_ids]
-    logger.info(f"Total post ids to process: {len(post_ids)}")
-
+    if env.DRY_RUN:
+        logger.info(f"Reading file {os.path.abspath(env.FILE)}...")
+        with stage("read"):
+            post_ids = get_non_empty_ids(env)
+        start = time.time()
+        with stage("precheck"):
+            post_ids, missing, invalid = plan_deletions(post_ids, env)
+        plan_file = write_plan_file(env, post_ids, missing, invalid)
+        logger.info(f"Plan: {len(post_ids)} posts to delete, {len(missing)} already gone, {len(invalid)} invalid ids "
+                    f"(checked in {log_detailed_humane_time(time.time() - start)}). Plan written to {os.path.abspath(plan_file)}")
+        logger.info("DRY_RUN is set, nothing was deleted.")
+        return
+
+    # Reading, the pre-check, the worker pool, retries, the status file and checkpoints are all wp_jobs.run_job's
     start = time.time()
-    results = delete_records(args_for_delete_post, env)
-    end = time.time()
-    logger.info(f"Submitted {len(post_ids)} posts in {log_detailed_humane_time(end - start)}.")
-
-    # Write results to the status file
-    logger.info(f"Writing status file to {os.path.abspath(env.STATUS_FILE)}...")
-    write_status_file(env, results)
-    logger.info(f"Status file written to {os.path.abspath(env.STATUS_FILE)}")
-
-
-def delete_records(args_for_delete_post: list, env: EnvVars) -> list:
-    results = []
-
-    with Pool(env.BATCH_SIZE) as pool:
-        for i in range(0, len(args_for_delete_post), env.BULK_SIZE):
-            current_batch = []
-            batch = args_for_delete_post[i:i + env.BULK_SIZE]
-            current_batch.extend(pool.starmap(delete_post, batch))
-            results.extend(current_batch)
-            logger.info(f"Submitted {len(batch)} records for deletion, total submitted: {i + len(batch)}")
-
-            log_random_record(current_batch)
-
-    return results
-
-
-def write_status_file(env: EnvVars, results: list):
-    if env.STATUS_FILE.endswith(".gz"):
-        with gzip.open(env.STATUS_FILE, 'wt') as f:
-            for result in results:
-                f.write(json.dumps(result) + '\n')
-    else:
-        with open(env.STATUS_FILE, 'w') as f:
-            for result in results:
-                f.write(json.dumps(result) + '\n')
+    metrics = run_job(job_spec(env), fresh=args.fresh, env=env)
+    logger.info(f"Processed {metrics.done} posts in {log_detailed_humane_time(time.time() - start)}.")
 
 
 def get_non_empty_ids(env: EnvVars) -> list:
-    if env.FILE.endswith(".gz"):
-        open_file = gzip.open
-    else:
-        open_file = open
-    with open_file(env.FILE, 'rt') as f:
-        post_ids = []
-        for line in f:
-            record = json.loads(line)
-            if record.get('id', None):
-                post_ids.append(record['id'])
-
-    return post_ids
+    return read_ids(env.FILE, 'id')
 
 
 if __name__ == '__main__':
     try:
-        main()
+        with profiled('delete_wp_records'):
+            main()
     except Exception as e:
         logger.exception(e)
         sys.exit(1)
@@ -1,57 +1,58 @@
 import os
 import sys
-import jsonlines
 import csv
 import time
-import httpx
+import logging
 from argparse import ArgumentParser
 from loguru import logger
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from wp_cache import HTTPCache
+from wp_input import iter_jsonl
+from wp_jobs import JobSpec, run_job
+from wp_profile import profiled, stage
+
 
 class EnvVars(object):
     def __init__(self, **entries):
         self.__dict__.update(entries)
 
 
-def fetch_record_by_slug(env, slug):
-    """Send POST request to WordPress API to get the article ID by slug"""
-    endpoint = f"{env.WP_ENDPOINT}?slug={slug}"
-    try:
-        response = httpx.get(endpoint, timeout=None)
-        if response.status_code != 200:
-            logger.error(f"Failed to fetch ID for slug {slug}. Status code: {response.status_code}")
-            return None
-    except Exception as e:
-        logger.exception(e)
-        return None
-
-    return response.json()
-
-
-def process_jsonl_and_fetch_ids(jsonl_file, env):
-    """Process JSONL file, fetch IDs from WordPress, and store results in a list"""
-    records = []
-    
-    with jsonlines.open(jsonl_file) as reader:
-        for obj in reader:
-            slug = obj.get('slug')
-            if not slug:
-                logger.error("Missing 'slug' in the JSONL record")
-                continue
-            
-            record_data = (env, slug)
-            if record_data:
-                logger.info(f"Fetched ID {record_data}")
-                record_id = record_data[0]['id']
-                if record_id:
-                    records.append({'slug': slug, 'id': record_id})
-                    logger.info(f"Fetched ID {record_id} for slug {slug}")
-                else:
-                    logger.error(f"No ID returned for slug {slug}")
+def fetch_ids_paced(fetch, slug_rows):
+    """
+    wp_jobs map_fn for the slug lookups: one request at a time, a second apart,
+    to avoid rate-limiting. Answers from the local HTTP cache are not paced.
+    """
+    statuses = []
+    for row in slug_rows:
+        status = fetch(row)
+        if status.id is None:
+            logger.error(f"{status.message} Status code: {status.status_code}")
+        else:
+            logger.info(status.message)
+        statuses.append(status)
+        if (status.timing or {}).get('cache') != 'hit':
             time.sleep(1)  # To avoid rate-limiting
+    return statuses
+
+
+def process_jsonl_and_fetch_ids(jsonl_file, env, status_file, fresh=False):
+    """
+    Fetches the ID of every slug in jsonl_file through wp_jobs.run_job and returns the found ones as
+    slug/id records, in input order
+    """
+    spec = JobSpec('fetch-by-slug', jsonl_file, status_file=status_file, concurrency=1,
+                   chunk_size=env.BULK_SIZE, retries=0)
+    run_job(spec, fresh=fresh, map_fn=fetch_ids_paced, env=env)
 
-    return records
+    # The status file also holds the lookups of earlier runs of this job; only this input's slugs are
+    # exported, and the last lookup of each slug wins
+    found = dict.fromkeys(slug for slug, in iter_jsonl(jsonl_file, ('slug',)) if slug)
+    for slug, record_id in iter_jsonl(status_file, ('slug', 'id')):
+        if slug in found:
+            found[slug] = record_id
+    return [{'slug': slug, 'id': record_id} for slug, record_id in found.items() if record_id]
 
 
 def save_to_csv(records, output_file):
@@ -73,33 +74,41 @@ def get_env_vars():
     env.BATCH_SIZE = int(os.getenv('BATCH_SIZE', 8))
     env.AUTH_USERNAME = os.getenv('WP_USERNAME', None)
     env.AUTH_PASSWORD = os.getenv('WP_PASSWORD', None)
-    env.STATUS_FILE = os.getenv('WP_STATUS_FILE', f'/tmp/wp_deletion_status_status.jsonl')
+    env.STATUS_FILE = os.getenv('WP_STATUS_FILE', None)  # Defaults to <output_csv>.status.jsonl
     env.AUTH = (env.AUTH_USERNAME, env.AUTH_PASSWORD)
     env.TIMEOUT_SEC = float(os.getenv('TIMEOUT_SEC', 10))
     env.BULK_SIZE = int(os.getenv('BULK_SIZE', 100))
+    env.STATUS_CAPTURE = os.getenv('STATUS_CAPTURE', 'failure')  # failure, always or never
+    env.CLIENT_OPTIONS = {}
+    env.HTTP_CACHE = HTTPCache.from_env()  # On-disk GET cache for development reruns, off unless HTTP_CACHE_DIR is set
 
     return env
 
 
 def main():
     load_dotenv(os.getenv(".env", None))
+    logging.basicConfig(level=os.getenv('APP_LOG_LEVEL', 'INFO'), format='[%(asctime)s] [%(levelname)s] %(message)s')
     env = get_env_vars()
 
     parser = ArgumentParser(description='Process JSONL file and fetch IDs')
     parser.add_argument('jsonl_file', type=str, help='Input JSONL file with slugs')
     parser.add_argument('output_csv', type=str, help='Output CSV file to save slugs and IDs')
+    parser.add_argument('--fresh', action='store_true', help='Ignore the lookups of earlier runs and start over')
     args = parser.parse_args()
 
     # Process JSONL and fetch IDs
-    records = process_jsonl_and_fetch_ids(args.jsonl_file, env)
+    status_file = env.STATUS_FILE or f"{os.path.splitext(args.output_csv)[0]}.status.jsonl"
+    records = process_jsonl_and_fetch_ids(args.jsonl_file, env, status_file, args.fresh)
 
     # Save records to CSV
-    save_to_csv(records, args.output_csv)
+    with stage("write"):
+        save_to_csv(records, args.output_csv)
 
 
 if __name__ == "__main__":
     try:
-        main()
+        with profiled('fetch_by_slug'):
+            main()
     except Exception as e:
         logger.exception(e)
         sys.exit(1)
\ No newline at end of file
@@ -3,12 +3,16 @@ import sys
 import yaml
 import jsonlines
 import time
-import httpx
+from functools import partial
 from argparse import ArgumentParser
 from loguru import logger
-from multiprocessing import Pool
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from wp_cache import HTTPCache
+from wp_client import get_client
+from wp_profile import profiled, profiled_pool, stage
+
 
 class EnvVars(object):
     def __init__(self, **entries):
@@ -38,22 +42,30 @@ language_map = {
     "ro": "Romanian"
 }
 
-def fetch_records(page_url):
+def fetch_records(page_url, timeout=60.0, client_options=None, cache=None):
     try:
-        response = httpx.get(page_url, timeout=None)
+        with stage("request"):
+            response = get_client(timeout=timeout, cache=cache, **(client_options or {})).get(page_url)
         if response.status_code != 200:
             print(f"Failed to fetch data for page {page_url}. Status code: {response.status_code}")
             return None
     except Exception as e:
         logger.exception(e)
 
-    return response.json()
+    with stage("parse"):
+        return response.json()
+
+def fetch_all_records(env, map_pages=None):
+    """Fetches every page of the titles endpoint. `map_pages` defaults to a Pool of BATCH_SIZE processes."""
+    if map_pages is None:
+        with profiled_pool(env.BATCH_SIZE) as pool:
+            return fetch_all_records(env, pool.map)
 
-def fetch_all_records(env):
     all_records = []
     article_titles_url = env.WP_ARTICLE_TITLES_ENDPOINT
-    
-    first_page_data = fetch_records(f"{article_titles_url}&_envelope")
+    fetch_page = partial(fetch_records, timeout=env.TIMEOUT_SEC, client_options=env.CLIENT_OPTIONS, cache=env.HTTP_CACHE)
+
+    first_page_data = fetch_page(f"{article_titles_url}&_envelope")
     all_records.extend(first_page_data.get('body', []))
 
     total_pages = int(first_page_data.get('headers', {}).get('X-WP-TotalPages', 0))
@@ -62,14 +74,13 @@ def fetch_all_records(env):
     
     if total_pages > 1:
         page_urls = [f"{article_titles_url}&page={page}" for page in range(2, total_pages + 1)] 
-        with Pool(env.BATCH_SIZE) as pool:
-            for i in range(0, len(page_urls), env.BULK_SIZE):
-                    current_batch = []
-                    batch = page_urls[i:i + env.BULK_SIZE]
-                    current_batch.extend(pool.map(fetch_records, batch))
-                    for result in current_batch:
-                        all_records.extend(result)
-                    logger.info(f"Submitted {len(batch)} records for retrieve, total submitted: {i + len(batch)}")
+        for i in range(0, len(page_urls), env.BULK_SIZE):
+                current_batch = []
+                batch = page_urls[i:i + env.BULK_SIZE]
+                current_batch.extend(map_pages(fetch_page, batch))
+                for result in current_batch:
+                    all_records.extend(result)
+                logger.info(f"Submitted {len(batch)} records for retrieve, total submitted: {i + len(batch)}")
 
     return all_records
     
@@ -109,6 +120,12 @@ def prepare_annotation_record(record, args, prompt_template):
 
     return prep_record
 
+def write_prep_file(prep_file, articles, args, prompt_template):
+    with open(prep_file, "wt") as writer:
+        jsonl_writer = jsonlines.Writer(writer)
+        for article in articles:
+            jsonl_writer.write(prepare_annotation_record(article, args, dict(prompt_template)))
+
 def log_detailed_humane_time(seconds):
     if seconds < 60:
         return f"{seconds} seconds"
@@ -123,6 +140,9 @@ def get_env_vars():
     env.WP_ARTICLE_TITLES_ENDPOINT = os.getenv('WP_ARTICLE_TITLES_ENDPOINT')
     env.BATCH_SIZE = int(os.getenv('BATCH_SIZE', 8))
     env.BULK_SIZE = int(os.getenv('BULK_SIZE', 100))
+    env.TIMEOUT_SEC = float(os.getenv('TIMEOUT_SEC', 60))
+    env.CLIENT_OPTIONS = {}  # Extra get_client() settings, e.g. a per-host pool set by the multi-site runner
+    env.HTTP_CACHE = HTTPCache.from_env()  # On-disk GET cache for development reruns, off unless HTTP_CACHE_DIR is set
 
     return env
 
@@ -155,17 +175,16 @@ def main():
 
     logger.info(f"Retrieved {len(all_articles)} articles in {log_detailed_humane_time(end - start)}.")
 
-    with open(args.prep_file, "wt") as writer:
-        jsonl_writer = jsonlines.Writer(writer)
-        for article in all_articles:
-            jsonl_writer.write(prepare_annotation_record(article, args, dict(prompt_template)))
+    with stage("write"):
+        write_prep_file(args.prep_file, all_articles, args, prompt_template)
 
     if os.path.exists(args.predicted_file):
         os.remove(args.predicted_file)
 
 if __name__ == "__main__":
     try:
-        main()
+        with profiled('keyword_generation_prep'):
+            main()
     except Exception as e:
         logger.exception(e)
         sys.exit(1)
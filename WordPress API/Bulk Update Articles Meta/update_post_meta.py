@@ -1,77 +1,25 @@
-import copy
-import httpx
-import json
-import gzip
+import logging
 import os
 import sys
 import nanoid
 import time
-import urllib.parse
-from multiprocessing import Pool
+from argparse import ArgumentParser
 from loguru import logger
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common'))
+from wp_jobs import JobSpec, run_job
+from wp_profile import profiled
+
+
+META = {"tin_locale": "ek_DU"}
+
 
 class EnvVars(object):
     def __init__(self, **entries):
         self.__dict__.update(entries)
 
 
-def update_post_meta(post_id, env: EnvVars):
-    try:
-        with httpx.Client() as client:
-            post_url = os.path.join(env.WP_API_ENDPOINT, str(post_id))
-
-            # We _really_ want to delete the article!
-            # post_url = urllib.parse.urlparse(post_url)._replace(query='force=true').geturl()
-            payload = json.dumps({
-                "meta": {
-                    "tin_locale": "ek_DU"
-                }
-            })
-
-            response = client.post(
-                url=post_url,
-                auth=env.AUTH,
-                headers={
-                    'Content-Type': 'application/json',
-                },
-                data=payload,
-                timeout=env.TIMEOUT_SEC
-            )
-
-        status = {
-            'id': post_id,
-            'status_code': response.status_code,
-            'post_url': post_url,
-            'response': response.text
-        }
-
-        if response.status_code == 200:
-            status['message'] = f"Post {post_id} Updated successfully."
-        else:
-            status['message'] = f"Failed to Update post {post_id}."
-    except httpx.Timeout:
-        status = {
-            'id': post_id,
-            'post_url': post_url,
-            'status_code': None,
-            'response': None,
-            'message': f"Timeout while trying to Update post {post_id}."
-        }
-    except Exception as exc:
-        status = {
-            'id': post_id,
-            'post_url': post_url,
-            'status_code': None,
-            'response': None,
-            'message': f"Exception while trying to Update post {post_id}."
-        }
-        logger.exception(exc)
-
-    return status
-
-
 def log_detailed_humane_time(seconds):
     if seconds < 60:
         return f"{seconds} seconds"
@@ -81,23 +29,6 @@ def log_detailed_humane_time(seconds):
         return f"{seconds // 3600} hours, {(seconds % 3600) // 60} minutes, and {(seconds % 3600) % 60} seconds"
 
 
-def log_random_record(current_batch: list):
-    # Log a random record from the current batch list
-    random_record_index = int(nanoid.generate(alphabet='123456789', size=12)) % len(current_batch)
-    random_record = copy.deepcopy(current_batch[random_record_index])
-
-    response = json.loads(random_record['response']) if random_record['response'] else None
-    if random_record['status_code'] and random_record['status_code'] == 200:
-        status_record = {
-            'id': response.get('id', None),
-            'title': response.get('title', {}).get('raw', None),
-            'slug': response.get('slug', None),
-        }
-
-        random_record['response'] = json.dumps(status_record)
-    logger.info(f"Random record from current batch: {random_record}")
-
-
 def get_env_vars():
     env = EnvVars(**os.environ)
 
@@ -112,6 +43,9 @@ def get_env_vars():
     env.AUTH = (env.AUTH_USERNAME, env.AUTH_PASSWORD)
     env.TIMEOUT_SEC = float(os.getenv('TIMEOUT_SEC', 10))
     env.BULK_SIZE = int(os.getenv('BULK_SIZE', 100))
+    env.PROGRESS_INTERVAL_SEC = float(os.getenv('PROGRESS_INTERVAL_SEC', 10))
+    env.STATUS_CAPTURE = os.getenv('STATUS_CAPTURE', 'failure')  # failure, always or never
+    env.CLIENT_OPTIONS = {}  # Extra get_client() settings, e.g. a per-host pool set by the multi-site runner
 
     return env
 
@@ -125,76 +59,38 @@ def log_env_vars(envs: EnvVars):
     logger.info(f"AUTH_PASSWORD: {'*' * len(envs.AUTH_PASSWORD)}")
     logger.info(f"STATUS_FILE: {envs.STATUS_FILE}")
     logger.info(f"TIMEOUT_SEC: {envs.TIMEOUT_SEC}")
+    logger.info(f"PROGRESS_INTERVAL_SEC: {envs.PROGRESS_INTERVAL_SEC}")
+    logger.info(f"STATUS_CAPTURE: {envs.STATUS_CAPTURE}")
+
+
+def job_spec(env: EnvVars) -> JobSpec:
+    """This run as a wp_jobs spec: FILE through the update-meta action, BULK_SIZE ids per chunk on BATCH_SIZE processes."""
+    return JobSpec('update-meta', env.FILE, status_file=env.STATUS_FILE, concurrency=env.BATCH_SIZE,
+                   chunk_size=env.BULK_SIZE, progress_interval_sec=env.PROGRESS_INTERVAL_SEC,
+                   options={'meta': META})
 
 
 def main():
+    parser = ArgumentParser(description='Set META on every post id in FILE')
+    parser.add_argument('--fresh', action='store_true', help='Ignore the checkpoint of an earlier run and start over')
+    args = parser.parse_args()
+
     load_dotenv(os.getenv("ENV", None))
+    logging.basicConfig(level=os.getenv('APP_LOG_LEVEL', 'INFO'), format='[%(asctime)s] [%(levelname)s] %(message)s')
 
     env = get_env_vars()
     log_env_vars(env)
 
-    # Load the jsonl file
-    logger.info(f"Reading file {os.path.abspath(env.FILE)}...")
-    post_ids = get_non_empty_ids(env)
-    args_for_update_post_meta = [(post_id, env) for post_id in post_ids]
-    logger.info(f"Total post ids to process: {len(post_ids)}")
-
+    # Reading, the worker pool, retries, the status file and checkpoints are all wp_jobs.run_job's
     start = time.time()
-    results = update_post_meta_records(args_for_update_post_meta, env)
-    end = time.time()
-    logger.info(f"Submitted {len(post_ids)} posts in {log_detailed_humane_time(end - start)}.")
-
-    # Write results to the status file
-    logger.info(f"Writing status file to {os.path.abspath(env.STATUS_FILE)}...")
-    write_status_file(env, results)
-    logger.info(f"Status file written to {os.path.abspath(env.STATUS_FILE)}")
-
-
-def update_post_meta_records(args_for_update_post_meta: list, env: EnvVars) -> list:
-    results = []
-
-    with Pool(env.BATCH_SIZE) as pool:
-        for i in range(0, len(args_for_update_post_meta), env.BULK_SIZE):
-            current_batch = []
-            batch = args_for_update_post_meta[i:i + env.BULK_SIZE]
-            current_batch.extend(pool.starmap(update_post_meta, batch))
-            results.extend(current_batch)
-            logger.info(f"Submitted {len(batch)} records for deletion, total submitted: {i + len(batch)}")
-
-            log_random_record(current_batch)
-
-    return results
-
-
-def write_status_file(env: EnvVars, results: list):
-    if env.STATUS_FILE.endswith(".gz"):
-        with gzip.open(env.STATUS_FILE, 'wt') as f:
-            for result in results:
-                f.write(json.dumps(result) + '\n')
-    else:
-        with open(env.STATUS_FILE, 'w') as f:
-            for result in results:
-                f.write(json.dumps(result) + '\n')
-
-
-def get_non_empty_ids(env: EnvVars) -> list:
-    if env.FILE.endswith(".gz"):
-        open_file = gzip.open
-    else:
-        open_file = open
-    with open_file(env.FILE, 'rt') as f:
-        post_ids = []
-        for line in f:
-            record = json.loads(line)
-            if record.get('id', None):
-                post_ids.append(record['id'])
-
-    return post_ids
+    metrics = run_job(job_spec(env), fresh=args.fresh, env=env)
+    logger.info(f"Processed {metrics.done} posts in {log_detailed_humane_time(time.time() - start)}.")
 
 
 if __name__ == '__main__':
     try:
-        main()
+        with profiled('update_post_meta'):
+            main()
     except Exception as e:
         logger.exception(e)
         sys.exit(1)
@@ -0,0 +1,285 @@
+"""
+Runs the bulk WordPress jobs (delete, update-meta, keyword-prep) across many sites from one process.
+
+Every site in the manifest gets its own env (the same keys as the tool's .env),
+its own worker threads and its own status and metrics files. Sites on the same
+host share one connection pool and one concurrency limit, so a slow host only
+slows down its own sites. All sites run at the same time, so a fleet run takes
+about as long as its slowest site.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import yaml
+from dotenv import dotenv_values
+from loguru import logger
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(HERE, '..', 'common'))
+from wp_jobs import run_job
+from wp_metrics import RunMetrics
+from wp_profile import profiled
+
+TOOLS = {
+    'delete': os.path.join('Bulk Delete Articles', 'delete_wp_records.py'),
+    'update-meta': os.path.join('Bulk Update Articles Meta', 'update_post_meta.py'),
+    'keyword-prep': os.path.join('Bulk Fetch Articles', 'keyword_generation_prep.py'),
+}
+
+
+class LoguruHandler(logging.Handler):
+    """Sends the stdlib logging of wp_jobs and wp_actions to loguru, so their lines carry the site too."""
+
+    def emit(self, record):
+        logger.opt(depth=6, exception=record.exc_info).log(record.levelname, record.getMessage())
+
+
+def load_tool(job):
+    """Imports a tool script by path. Two tools share a file name, so each gets its own module name."""
+    name = f"wp_tool_{job.replace('-', '_')}"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, '..', TOOLS[job]))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+@contextmanager
+def site_environ(values):
+    """Temporarily overlays a site's settings on os.environ so the tool's own get_env_vars() reads them."""
+    saved = dict(os.environ)
+    os.environ.update({key: str(value) for key, value in values.items()})
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+class Site(object):
+    """One manifest entry: its tool, env and share of its host's connections."""
+
+    def __init__(self, spec, env, tool, host, host_slots):
+        self.name = spec['name']
+        self.job = spec['job']
+        self.spec = spec
+        self.env = env
+        self.tool = tool
+        self.host = host
+        self.host_slots = host_slots
+        self.concurrency = int(spec.get('concurrency', env.BATCH_SIZE))
+        self.fresh = False  # Start over instead of resuming from the site's checkpoint
+        self.executor = None
+
+    def starmap(self, fn, arg_tuples):
+        """Pool.starmap replacement: runs on this site's threads, holding one of its host's slots per call."""
+        def call(args):
+            with self.host_slots, logger.contextualize(site=self.name):
+                return fn(*args)
+
+        return list(self.executor.map(call, arg_tuples))
+
+    def map(self, fn, items):
+        return self.starmap(fn, [(item,) for item in items])
+
+
+def load_manifest(path):
+    """Reads a sites manifest (JSON or YAML) with optional `defaults` and `host_limits` blocks."""
+    with open(path) as f:
+        manifest = yaml.safe_load(f) if path.endswith(('.yaml', '.yml')) else json.load(f)
+
+    names = [site.get('name') for site in manifest.get('sites', [])]
+    if not names or None in names or len(set(names)) != len(names):
+        raise ValueError(f"{path}: every site needs a unique 'name'")
+    for site in manifest['sites']:
+        if site.get('job') not in TOOLS:
+            raise ValueError(f"{path}: site {site['name']} has job {site.get('job')!r}, expected one of {sorted(TOOLS)}")
+    return manifest
+
+
+def site_settings(manifest, site, manifest_dir, status_dir):
+    """Merges defaults, the site's env_file and its inline env, then fills in a per-site status file."""
+    settings = dict(manifest.get('defaults', {}))
+    if site.get('env_file'):
+        settings.update(dotenv_values(os.path.join(manifest_dir, site['env_file'])))
+    settings.update(site.get('env', {}))
+    settings.setdefault('WP_STATUS_FILE', os.path.join(status_dir, f"{site['name']}.jsonl"))
+    return settings
+
+
+def endpoint_of(env):
+    return getattr(env, 'WP_API_ENDPOINT', None) or getattr(env, 'WP_ARTICLE_TITLES_ENDPOINT', None) or ''
+
+
+def build_sites(manifest, manifest_dir, status_dir):
+    """Builds every Site up front, sequentially, since reading env goes through os.environ."""
+    prepared = []
+    for spec in manifest['sites']:
+        tool = load_tool(spec['job'])
+        with site_environ(site_settings(manifest, spec, manifest_dir, status_dir)):
+            env = tool.get_env_vars()
+        url = urllib.parse.urlparse(endpoint_of(env))
+        prepared.append((spec, env, tool, url))
+
+    # A host's limit is its host_limits entry, or the largest concurrency asked for by its sites
+    configured = manifest.get('host_limits', {})
+    host_limits = {}
+    for spec, env, _, url in prepared:
+        wanted = int(spec.get('concurrency', env.BATCH_SIZE))
+        host_limits[url.netloc] = int(configured.get(url.netloc, max(host_limits.get(url.netloc, 0), wanted)))
+
+    host_slots = {host: threading.BoundedSemaphore(limit) for host, limit in host_limits.items()}
+    sites = []
+    for spec, env, tool, url in prepared:
+        # Same options for every site on a host, so get_client() hands them one shared pool sized to the host limit
+        env.CLIENT_OPTIONS = {'base_url': f"{url.scheme}://{url.netloc}", 'max_connections': host_limits[url.netloc]}
+        sites.append(Site(spec, env, tool, url.netloc, host_slots[url.netloc]))
+    return sites
+
+
+def run_delete(site, metrics):
+    tool, env = site.tool, site.env
+    if env.DRY_RUN:
+        post_ids = tool.get_non_empty_ids(env)
+        post_ids, missing, invalid = tool.plan_deletions(post_ids, env, site.starmap)
+        plan_file = tool.write_plan_file(env, post_ids, missing, invalid)
+        logger.info(f"Plan: {len(post_ids)} posts to delete, {len(missing)} already gone, {len(invalid)} invalid ids. "
+                    f"Plan written to {plan_file}")
+        return {'items': len(post_ids), 'skipped': len(missing) + len(invalid), 'plan_file': plan_file}
+    return run_tool_job(site, metrics)
+
+
+def run_update_meta(site, metrics):
+    return run_tool_job(site, metrics)
+
+
+def run_tool_job(site, metrics):
+    """Runs the tool's wp_jobs spec on the site's threads; a rerun with the same status file resumes."""
+    run_job(site.tool.job_spec(site.env), fresh=site.fresh, map_fn=site.map, env=site.env, metrics=metrics)
+    summary = {'items': metrics.done, 'status_file': site.env.STATUS_FILE}
+    metrics_file = RunMetrics.summary_path(site.env.STATUS_FILE)
+    if os.path.exists(metrics_file):
+        summary['metrics_file'] = metrics_file
+    return summary
+
+
+def run_keyword_prep(site, metrics):
+    """Takes the CLI arguments of keyword_generation_prep.py from PREP_FILE, PROMPT_TEMPLATE, NUM_KEYWORDS and PROMPT_CONFIG."""
+    tool, env = site.tool, site.env
+    args = SimpleNamespace(
+        prep_file=env.PREP_FILE,
+        prompt_template=env.PROMPT_TEMPLATE,
+        num_keywords=int(getattr(env, 'NUM_KEYWORDS', 5)),
+        source_language=getattr(env, 'SOURCE_LANGUAGE', 'en'),
+        target_language=getattr(env, 'TARGET_LANGUAGE', 'en'),
+    )
+    with open(getattr(env, 'PROMPT_CONFIG', 'prompt_config.yaml')) as f:
+        prompt_template = yaml.full_load(f)[args.prompt_template]
+
+    articles = tool.fetch_all_records(env, site.map)
+    tool.write_prep_file(args.prep_file, articles, args, prompt_template)
+    return {'items': len(articles), 'prep_file': args.prep_file}
+
+
+JOBS = {
+    'delete': run_delete,
+    'update-meta': run_update_meta,
+    'keyword-prep': run_keyword_prep,
+}
+
+
+def run_site(site):
+    """Runs one site's job on its own threads and returns its summary; never raises."""
+    metrics = RunMetrics(progress_interval_sec=getattr(site.env, 'PROGRESS_INTERVAL_SEC', 10.0))
+    summary = {'site': site.name, 'job': site.job, 'host': site.host, 'concurrency': site.concurrency}
+    start = time.time()
+    with logger.contextualize(site=site.name), ThreadPoolExecutor(site.concurrency) as executor:
+        site.executor = executor
+        try:
+            logger.info(f"Starting {site.job} on {site.host} with {site.concurrency} workers")
+            summary.update(JOBS[site.job](site, metrics))
+            summary['ok'] = True
+        except Exception as exc:
+            logger.exception(exc)
+            summary.update(ok=False, error=repr(exc))
+    summary['elapsed_sec'] = round(time.time() - start, 3)
+    if metrics.done:
+        summary.update({key: value for key, value in metrics.summary().items() if key != 'latency_ms'})
+        summary['latency_p99_ms'] = metrics.histograms['total_ms'].percentile(99)
+    with logger.contextualize(site=site.name):
+        logger.info(f"Finished in {summary['elapsed_sec']}s: {metrics.progress_line() if metrics.done else 'no requests'}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the bulk WordPress jobs across many sites')
+    parser.add_argument('manifest', help='Sites manifest (.json or .yaml)')
+    parser.add_argument('--status-dir', default='/tmp/wp-sites', help='Where per-site status files go by default')
+    parser.add_argument('--max-sites', type=int, default=0, help='Sites to run at the same time (default: all)')
+    parser.add_argument('--only', nargs='+', help='Only run these site names')
+    parser.add_argument('--fresh', action='store_true', help="Ignore the sites' checkpoints and start over")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.configure(extra={'site': '-'})
+    logger.add(sys.stderr, level=os.getenv('APP_LOG_LEVEL', 'INFO'),
+               format='<green>{time:HH:mm:ss}</green> | {level: <7} | <cyan>{extra[site]}</cyan> | {message}')
+    logging.basicConfig(level=os.getenv('APP_LOG_LEVEL', 'INFO'), handlers=[LoguruHandler()], force=True)
+
+    manifest = load_manifest(args.manifest)
+    if args.only:
+        unknown = sorted(set(args.only) - {site['name'] for site in manifest['sites']})
+        if unknown:
+            logger.warning(f"--only names not in {args.manifest}: {', '.join(unknown)}")
+        manifest['sites'] = [site for site in manifest['sites'] if site['name'] in args.only]
+    if not manifest['sites']:
+        logger.info("No sites to run.")
+        return
+    os.makedirs(args.status_dir, exist_ok=True)
+    sites = build_sites(manifest, os.path.dirname(os.path.abspath(args.manifest)), args.status_dir)
+    for site in sites:
+        site.fresh = args.fresh
+    logger.info(f"Running {len(sites)} sites on {len({site.host for site in sites})} hosts")
+
+    start = time.time()
+    with ThreadPoolExecutor(args.max_sites or len(sites)) as executor:
+        summaries = list(executor.map(run_site, sites))
+    elapsed = time.time() - start
+
+    fleet = {'elapsed_sec': round(elapsed, 3),
+             'slowest_site_sec': max(summary['elapsed_sec'] for summary in summaries),
+             'sum_of_sites_sec': round(sum(summary['elapsed_sec'] for summary in summaries), 3),
+             'sites': summaries}
+    summary_file = os.path.join(args.status_dir, 'fleet-summary.json')
+    with open(summary_file, 'w') as f:
+        json.dump(fleet, f, indent=2)
+
+    for summary in summaries:
+        errors = sum(summary.get('errors', {}).values())
+        logger.info(f"{summary['site']:<24} {summary['job']:<13} {'ok' if summary['ok'] else 'FAILED':<6} "
+                    f"{summary.get('items', 0):>8} items {errors:>6} errors {summary['elapsed_sec']:>9}s")
+    logger.info(f"Fleet finished in {elapsed:.1f}s (sum of sites {fleet['sum_of_sites_sec']}s). "
+                f"Summary written to {os.path.abspath(summary_file)}")
+
+    if not all(summary['ok'] for summary in summaries):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    try:
+        with profiled('run_sites'):
+            main()
+    except Exception as e:
+        logger.exception(e)
+        sys.exit(1)
@@ -0,0 +1,121 @@
+"""
+Measures the startup (import) cost of every script entry point in the repo.
+
+Each script is loaded in a fresh interpreter under `python -X importtime`,
+without running its main(), so the numbers are what a cron job or container
+pays before doing any work. For every entry point it reports the wall time
+of the whole process, the time spent loading the script, and the heaviest
+top-level imports.
+
+    $ python3 bench_startup.py --repeat 5 --json startup.json
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+ENTRY_POINTS = {
+    'fabric_uploader': 'WooCommerce/FabricUploader/fabric_uploader.py',
+    'process_products': 'WooCommerce/ImageCompressorCSVGenerator/process_products.py',
+    'wp_image_uploader': 'WordPress API/Bulk Add images to articles from CSV/src/wp_image_uploader.py',
+    'delete_wp_records': 'WordPress API/Bulk Delete Articles/delete_wp_records.py',
+    'update_post_meta': 'WordPress API/Bulk Update Articles Meta/update_post_meta.py',
+    'fetch_by_slug': 'WordPress API/Bulk Fetch Articles By Slug/update_post_meta.py',
+    'keyword_generation_prep': 'WordPress API/Bulk Fetch Articles/keyword_generation_prep.py',
+    'run_sites': 'WordPress API/Multi Site Runner/run_sites.py',
+}
+
+MARKER = '--bench-startup--'
+
+# Loads the script as a module named __bench__, so its `if __name__ == '__main__'` block does not run
+LOADER = f"""
+import importlib.util, sys, time
+path = sys.argv[1]
+sys.stderr.write({MARKER!r} + '\\n')
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('__bench__', path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def parse_importtime(stderr):
+    """Returns {top-level module: cumulative µs} for the imports done while loading the script."""
+    _, _, lines = stderr.partition(MARKER)
+    top_level = {}
+    for line in lines.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):  # Nested imports are indented under their parent
+            top_level[name.strip()] = top_level.get(name.strip(), 0) + int(cumulative)
+    return top_level
+
+
+def measure(path, repeat):
+    """Loads the script `repeat` times and returns the median timings, or the error if it fails to import."""
+    wall, load, imports = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', LOADER, path],
+                              cwd=os.path.dirname(path), capture_output=True, text=True)
+        wall.append((time.perf_counter() - start) * 1000)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()
+            return {'error': error[-1] if error else f'exit code {proc.returncode}'}
+        load.append(float(proc.stdout.strip().splitlines()[-1]))
+        imports.append(parse_importtime(proc.stderr))
+
+    heaviest = sorted(imports[-1].items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        'wall_ms': round(statistics.median(wall), 1),
+        'load_ms': round(statistics.median(load), 1),
+        'imports_ms': round(statistics.median(sum(run.values()) for run in imports) / 1000, 1),
+        'heaviest': [{'module': name, 'ms': round(us / 1000, 1)} for name, us in heaviest],
+    }
+
+
+def measure_baseline(repeat):
+    """Median wall time of an interpreter that imports nothing, to read the other numbers against."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        runs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(runs)
+
+
+def main():
+    parser = ArgumentParser(description='Measure the import cost of each script entry point')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per entry point; the median is reported')
+    parser.add_argument('--only', nargs='+', choices=sorted(ENTRY_POINTS), help='Only measure these entry points')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    baseline = measure_baseline(args.repeat)
+    print(f"Interpreter startup: {baseline:.1f} ms\n")
+    print(f"{'entry point':<26}{'wall ms':>9}{'load ms':>9}  heaviest imports")
+
+    results = {'interpreter_ms': round(baseline, 1), 'entry_points': {}}
+    for name in args.only or ENTRY_POINTS:
+        result = measure(os.path.join(REPO_ROOT, ENTRY_POINTS[name]), args.repeat)
+        results['entry_points'][name] = result
+        if 'error' in result:
+            print(f"{name:<26}{'-':>9}{'-':>9}  failed to import: {result['error']}")
+            continue
+        heaviest = ', '.join(f"{item['module']} {item['ms']}" for item in result['heaviest'])
+        print(f"{name:<26}{result['wall_ms']:>9}{result['load_ms']:>9}  {heaviest}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
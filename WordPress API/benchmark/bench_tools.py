@@ -0,0 +1,144 @@
+"""
+Load-test benchmark for the WordPress bulk tools against mock_wp_server.
+
+Each tool runs as a subprocess, exactly as in production, pointed at a local
+mock WordPress with configurable latency, error rate and 429 injection. For
+every concurrency setting it reports throughput, tail latency, CPU time and
+peak RSS, so regressions show up before deploy.
+
+Usage:
+    $ python bench_tools.py --posts 2000 --concurrency 1 4 8 16 --latency-ms 30
+    $ python bench_tools.py --tools delete update --error-rate 0.02 --rate-limit-rate 0.05 --json results.json
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from mock_wp_server import POSTS_ROUTE, MockWordPress, start_server
+
+WP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS = {
+    "delete": os.path.join(WP_DIR, "Bulk Delete Articles", "delete_wp_records.py"),
+    "update": os.path.join(WP_DIR, "Bulk Update Articles Meta", "update_post_meta.py"),
+    "prep": os.path.join(WP_DIR, "Bulk Fetch Articles", "keyword_generation_prep.py"),
+    "images": os.path.join(WP_DIR, "Bulk Add images to articles from CSV", "src", "wp_image_uploader.py"),
+}
+PROMPT_CONFIG = """bench:
+  model: gpt-4o-mini
+  system_message: "Generate {num_keywords} keywords in {target_language}."
+  user_message: "Article {article_id}: {keyword}"
+"""
+
+
+def write_ids(path, count):
+    with open(path, "w") as f:
+        for post_id in range(1, count + 1):
+            f.write(json.dumps({"id": post_id}) + "\n")
+
+
+def write_images(workdir, count):
+    """Writes small JPEGs and the uploader CSV; needs Pillow, like the uploader itself."""
+    from PIL import Image
+
+    image_dir = os.path.join(workdir, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    csv_path = os.path.join(workdir, "articles.csv")
+    with open(csv_path, "w") as f:
+        f.write("image file name,domain,content_id,slug\n")
+        for post_id in range(1, count + 1):
+            name = f"{post_id}.jpeg"
+            Image.new("RGB", (640, 480), (post_id % 255, 90, 160)).save(os.path.join(image_dir, name))
+            f.write(f"{name},mock.example.com,{post_id},mock-article-{post_id}\n")
+    return csv_path, image_dir
+
+
+def tool_command(tool, workdir, base_url, posts, concurrency):
+    """Returns (argv, extra env, metrics file or None) for one tool run."""
+    status_file = os.path.join(workdir, f"{tool}-{concurrency}.jsonl")
+    env = {
+        "WP_USERNAME": "bench", "WP_PASSWORD": "bench", "WP_APP_PASSWORD": "bench",
+        "BATCH_SIZE": str(concurrency), "BULK_SIZE": str(max(concurrency * 4, 20)),
+        "TIMEOUT_SEC": "30", "WP_STATUS_FILE": status_file,
+    }
+    if tool in ("delete", "update"):
+        ids_file = os.path.join(workdir, "ids.jsonl")
+        write_ids(ids_file, posts)
+        env.update(FILE=ids_file, WP_ENDPOINT=base_url + POSTS_ROUTE)
+        return [sys.executable, TOOLS[tool]], env, status_file.replace(".jsonl", ".metrics.json")
+    if tool == "prep":
+        with open(os.path.join(workdir, "prompt_config.yaml"), "w") as f:
+            f.write(PROMPT_CONFIG)
+        env["WP_ARTICLE_TITLES_ENDPOINT"] = f"{base_url}{POSTS_ROUTE}?per_page=100"
+        argv = [sys.executable, TOOLS[tool], os.path.join(workdir, "prep.jsonl"), os.path.join(workdir, "predicted.jsonl"), "bench", "5"]
+        return argv, env, None
+    csv_path, image_dir = write_images(workdir, posts)
+    env["WP_SITE_URL"] = base_url
+    return [sys.executable, TOOLS[tool], "--csv", csv_path, "--images", image_dir], env, None
+
+
+def run_tool(argv, extra_env, workdir):
+    """Runs one tool and returns (exit code, wall seconds, CPU seconds, peak RSS MB) including its worker processes."""
+    env = dict(os.environ, **extra_env)
+    start = time.perf_counter()
+    proc = subprocess.Popen(argv, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    stderr = proc.stderr.read()
+    # wait4 reports the tool's own usage plus that of the pool workers it reaped
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    code = proc.returncode = os.waitstatus_to_exitcode(status)
+    if code != 0:
+        print(stderr.decode(errors="replace")[-2000:], file=sys.stderr)
+    return code, wall, usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the WordPress bulk tools against a mock WordPress")
+    parser.add_argument("--tools", nargs="+", choices=list(TOOLS), default=["delete", "update", "prep"])
+    parser.add_argument("--posts", type=int, default=1000, help="Posts seeded (and processed) per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16], help="BATCH_SIZE values to try")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'tool':<8} {'conc':>5} {'exit':>5} {'wall s':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'cpu s':>7} {'rss MB':>7}")
+    for tool in args.tools:
+        # The image uploader is sequential, so extra concurrency settings would only repeat the same run
+        for concurrency in (args.concurrency if tool != "images" else [1]):
+            # A fresh server per run, since deletes consume the seeded posts
+            wp = MockWordPress(args.posts, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate)
+            server, base_url = start_server(wp)
+            with tempfile.TemporaryDirectory() as workdir:
+                argv, env, metrics_file = tool_command(tool, workdir, base_url, args.posts, concurrency)
+                code, wall, cpu, rss = run_tool(argv, env, workdir)
+                latency = {}
+                if metrics_file and os.path.exists(metrics_file):
+                    with open(metrics_file) as f:
+                        latency = json.load(f)["latency_ms"]["total_ms"]
+            server.shutdown()
+
+            requests = sum(wp.requests.values())
+            result = {
+                "tool": tool, "concurrency": concurrency, "exit_code": code, "wall_sec": round(wall, 3),
+                "requests": requests, "requests_per_sec": round(requests / wall, 1),
+                "p50_ms": latency.get("p50"), "p95_ms": latency.get("p95"), "p99_ms": latency.get("p99"),
+                "cpu_sec": round(cpu, 2), "peak_rss_mb": round(rss, 1), "server_requests": dict(wp.requests),
+            }
+            results.append(result)
+            print(f"{tool:<8} {concurrency:>5} {code:>5} {wall:>8.2f} {result['requests_per_sec']:>8} "
+                  f"{str(result['p50_ms'] or '-'):>8} {str(result['p99_ms'] or '-'):>8} {cpu:>7.2f} {rss:>7.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
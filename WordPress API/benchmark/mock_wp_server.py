@@ -0,0 +1,222 @@
+"""
+In-memory stand-in for the WordPress REST API, for load-testing the bulk tools offline.
+
+Supports the endpoints the tools in this folder use:
+
+* GET    /wp-json/wp/v2/posts            paging (X-WP-Total / X-WP-TotalPages), slug=, include=, _fields=, _envelope
+* GET    /wp-json/wp/v2/posts/<id>
+* POST   /wp-json/wp/v2/posts/<id>       meta / featured_media / content updates
+* DELETE /wp-json/wp/v2/posts/<id>       ?force=true
+* POST   /wp-json/wp/v2/media            raw body upload
+* POST   /wp-json/batch/v1               WordPress batch framework (up to 25 sub-requests)
+
+Latency, error rate and 429 rate-limiting can be injected to see how the
+tools behave against a slow or flaky origin.
+
+Run standalone:
+    $ python mock_wp_server.py --posts 5000 --latency-ms 40 --error-rate 0.01 --rate-limit-rate 0.02
+"""
+import json
+import random
+import threading
+import time
+import urllib.parse
+from argparse import ArgumentParser
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+POSTS_ROUTE = "/wp-json/wp/v2/posts"
+MEDIA_ROUTE = "/wp-json/wp/v2/media"
+BATCH_ROUTE = "/wp-json/batch/v1"
+
+
+def make_post(post_id):
+    slug = f"mock-article-{post_id}"
+    return {
+        "id": post_id,
+        "slug": slug,
+        "status": "publish",
+        "link": f"https://mock.example.com/{slug}/",
+        "title": {"raw": f"Mock article {post_id}", "rendered": f"Mock article {post_id}"},
+        # Rendered content makes responses about as heavy as a real post
+        "content": {"raw": "<p>Lorem ipsum.</p>" * 200, "rendered": "<p>Lorem ipsum.</p>" * 200},
+        "meta": {"tin_locale": "en_US"},
+        "tin_locale": "en_US",
+        "amg_category": {"title": ["Mock Category"]},
+        "featured_media": 0,
+    }
+
+
+def project(record, fields):
+    """Applies `_fields=` projection (top-level fields only)."""
+    return {k: v for k, v in record.items() if k in fields} if fields else record
+
+
+class MockWordPress:
+    """Thread-safe in-memory posts/media store plus fault injection settings."""
+
+    def __init__(self, posts=1000, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=42):
+        self.posts = {i: make_post(i) for i in range(1, posts + 1)}
+        self.next_media_id = 1
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()
+
+    def inject(self):
+        """Sleeps for the configured latency, then returns an injected (status, body) failure or None."""
+        delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return 429, {"code": "rest_too_many_requests", "message": "Too many requests."}
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500, {"code": "internal_server_error", "message": "Injected failure."}
+        return None
+
+    def list_posts(self, query):
+        with self.lock:
+            posts = sorted(self.posts.values(), key=lambda p: p["id"])
+        if "slug" in query:
+            slugs = set(query["slug"][0].split(","))
+            posts = [p for p in posts if p["slug"] in slugs]
+        if "include" in query:
+            ids = {int(i) for i in query["include"][0].split(",") if i}
+            posts = [p for p in posts if p["id"] in ids]
+        per_page = min(int(query.get("per_page", ["10"])[0]), 100)
+        page = int(query.get("page", ["1"])[0])
+        total_pages = max(1, -(-len(posts) // per_page))
+        if page > total_pages:
+            return 400, {"code": "rest_post_invalid_page_number", "message": "Invalid page number."}, {}
+        fields = set(query["_fields"][0].split(",")) if "_fields" in query else None
+        body = [project(p, fields) for p in posts[(page - 1) * per_page:page * per_page]]
+        return 200, body, {"X-WP-Total": str(len(posts)), "X-WP-TotalPages": str(total_pages)}
+
+    def handle(self, method, path, query, body):
+        """Routes one request and returns (status, json_body, headers)."""
+        if path == POSTS_ROUTE and method == "GET":
+            return self.list_posts(query)
+
+        if path.startswith(POSTS_ROUTE + "/"):
+            try:
+                post_id = int(path.rsplit("/", 1)[1])
+            except ValueError:
+                return 404, {"code": "rest_no_route", "message": "No route."}, {}
+            with self.lock:
+                post = self.posts.get(post_id)
+                if post is None:
+                    return 404, {"code": "rest_post_invalid_id", "message": "Invalid post ID."}, {}
+                if method == "GET":
+                    return 200, post, {}
+                if method == "POST":
+                    update = json.loads(body or b"{}")
+                    post["meta"].update(update.get("meta", {}))
+                    for key in ("featured_media", "acf"):
+                        if key in update:
+                            post[key] = update[key]
+                    if "content" in update:
+                        post["content"] = {"raw": update["content"], "rendered": update["content"]}
+                    return 200, post, {}
+                if method == "DELETE":
+                    del self.posts[post_id]
+                    return 200, {"deleted": True, "previous": post}, {}
+
+        if path == MEDIA_ROUTE and method == "POST":
+            with self.lock:
+                media_id = self.next_media_id
+                self.next_media_id += 1
+            return 201, {"id": media_id, "source_url": f"https://mock.example.com/uploads/{media_id}.jpg"}, {}
+
+        if path == BATCH_ROUTE and method == "POST":
+            requests = json.loads(body or b"{}").get("requests", [])
+            if len(requests) > 25:
+                return 400, {"code": "rest_batch_max_requests", "message": "Maximum of 25 requests."}, {}
+            responses = []
+            for sub in requests:
+                parsed = urllib.parse.urlparse(sub["path"])
+                status, sub_body, sub_headers = self.handle(
+                    sub.get("method", "POST"), "/wp-json" + parsed.path, urllib.parse.parse_qs(parsed.query, keep_blank_values=True),
+                    json.dumps(sub.get("body", {})).encode()
+                )
+                responses.append({"status": status, "body": sub_body, "headers": sub_headers})
+            return 207, {"responses": responses}, {}
+
+        return 404, {"code": "rest_no_route", "message": "No route was found."}, {}
+
+
+def make_handler(wp):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like a real origin
+
+        def _serve(self):
+            parsed = urllib.parse.urlparse(self.path)
+            query = urllib.parse.parse_qs(parsed.query, keep_blank_values=True)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            route = parsed.path.rstrip("/")
+            base, _, last = route.rpartition("/")
+            wp.requests[f"{self.command} {base + '/<id>' if last.isdigit() else route}"] += 1
+
+            injected = wp.inject()
+            if injected:
+                status, payload = injected
+                headers = {"Retry-After": "1"} if status == 429 else {}
+            else:
+                status, payload, headers = wp.handle(self.command, route, query, body)
+
+            # `_envelope` wraps the response the way WordPress does, with headers in the body
+            if "_envelope" in query:
+                payload = {"body": payload, "status": status, "headers": headers}
+                status = 200
+
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_DELETE = do_PUT = _serve
+
+        def log_message(self, format, *args):
+            pass  # Keep benchmark output readable
+
+    return Handler
+
+
+def start_server(wp, host="127.0.0.1", port=0):
+    """Starts the mock server in a background thread and returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), make_handler(wp))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = ArgumentParser(description="Run a mock WordPress REST API")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    wp = MockWordPress(args.posts, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate)
+    server, base_url = start_server(wp, port=args.port)
+    print(f"Mock WordPress with {args.posts} posts listening on {base_url}{POSTS_ROUTE}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(dict(wp.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+COMMON = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+WOOCOMMERCE = os.path.join(COMMON, '..', '..', 'WooCommerce')
+COPIES = [
+    ('FabricUploader', 'wp_client.py'),
+    ('FabricUploader', 'wp_image.py'),
+    ('FabricUploader', 'wp_profile.py'),
+    ('ImageCompressorCSVGenerator', 'wp_image.py'),
+    ('ImageCompressorCSVGenerator', 'wp_profile.py'),
+]
+
+
+@pytest.mark.parametrize("tool, name", COPIES)
+def test_woocommerce_copies_match_common(tool, name):
+    with open(os.path.join(COMMON, name)) as f:
+        original = f.read()
+    with open(os.path.join(WOOCOMMERCE, tool, name)) as f:
+        copy = f.read()
+
+    # The copy only adds a note to the top of the module docstring
+    assert copy.endswith(original[len('"""\n'):])
@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import wp_actions
+import wp_jobs
+from wp_client import WPClient
+
+
+def attach_action(tmp_path, monkeypatch, update_codes):
+    """An AttachImageAction whose site answers post updates with update_codes, one per attempt."""
+    (tmp_path / "a.jpg").write_bytes(b"\xff\xd8\xff")
+    uploads = []
+    post = {"featured_media": 0, "content": {"raw": "body"}}
+    codes = iter(update_codes)
+
+    def handler(request):
+        if request.method == "GET":
+            return httpx.Response(200, json=post)
+        code = next(codes, 200)
+        if code == 200 and "featured_media" in request.content.decode():
+            post["featured_media"] = 7
+        return httpx.Response(code, json={})
+
+    client = WPClient(retries=0, http2=False)
+    client.client = httpx.Client(transport=httpx.MockTransport(handler))
+    env = SimpleNamespace(WP_SITE_URL="https://example.com", AUTH=None, TIMEOUT_SEC=5, CLIENT_OPTIONS={})
+    action = wp_actions.AttachImageAction(env, images_dir=str(tmp_path))
+    monkeypatch.setattr(action, "client", lambda: client)
+    monkeypatch.setattr(action, "upload", lambda path: uploads.append(path) or (7, "https://example.com/a.jpg"))
+    monkeypatch.setattr(wp_actions, "image_utils", lambda: SimpleNamespace(extract_caption_credit=lambda path: (None, None)))
+    monkeypatch.setattr(wp_actions.time, "sleep", lambda sec: None)
+    return action, uploads, post
+
+
+def test_attach_retries_the_update_without_uploading_again(tmp_path, monkeypatch):
+    action, uploads, post = attach_action(tmp_path, monkeypatch, [502])
+
+    status = action.run(1, "a.jpg")
+
+    assert status.error_code is None
+    assert len(uploads) == 1
+    assert post["featured_media"] == 7
+    assert not action.should_retry(status)
+
+
+def test_attach_gives_up_after_its_attempts(tmp_path, monkeypatch):
+    action, uploads, _ = attach_action(tmp_path, monkeypatch, [502] * 5)
+
+    status = action.run(1, "a.jpg")
+
+    assert status.error_code == "attach_failed"
+    assert len(uploads) == 1
+    assert action.is_done(status)
+
+
+def test_delete_skips_invalid_ids_instead_of_crashing(tmp_path, monkeypatch):
+    input_path = tmp_path / "ids.jsonl"
+    input_path.write_text("".join(f'{{"id": {value}}}\n' for value in ('" 5 "', '"abc"', 6, '"7x"', 8)))
+    env = SimpleNamespace(WP_API_ENDPOINT="https://example.com/wp-json/wp/v2/posts", STATUS_CAPTURE="never",
+                          TIMEOUT_SEC=5, CLIENT_OPTIONS={})
+    monkeypatch.setattr(wp_actions.DeleteAction, "find_existing", lambda self, ids: ({5, 6}, None))
+    monkeypatch.setattr(wp_actions.DeleteAction, "send", lambda self, url: httpx.Response(200, json={}))
+    spec = wp_jobs.JobSpec("delete", str(input_path), status_file=str(tmp_path / "status.jsonl"), retries=0)
+
+    metrics = wp_jobs.run_job(spec, map_fn=lambda fn, items: [fn(item) for item in items], env=env)
+
+    with open(spec.status_file) as f:
+        records = {record["id"]: record for record in map(json.loads, f)}
+    assert metrics.done == 2
+    assert records["abc"]["error_code"] == records["7x"]["error_code"] == "invalid_input"
+    assert records[8]["message"] == "Post 8 not found, skipped."
+    assert {5, 6} <= records.keys()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from wp_cache import HTTPCache
+from wp_client import WPClient
+
+
+def cached_client(tmp_path):
+    """A WPClient with an HTTPCache whose server answers with the Accept header it got."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"accept": request.headers.get("Accept")})
+
+    client = WPClient(cache=HTTPCache(str(tmp_path)), http2=False)
+    client.client = httpx.Client(transport=httpx.MockTransport(handler))
+    return client, requests
+
+
+def test_headers_are_part_of_the_key(tmp_path):
+    client, requests = cached_client(tmp_path)
+
+    json_response = client.get("https://example.com/wp-json/wp/v2/posts", headers={"Accept": "application/json"})
+    text_response = client.get("https://example.com/wp-json/wp/v2/posts", headers={"Accept": "text/plain"})
+
+    assert len(requests) == 2
+    assert json_response.json() == {"accept": "application/json"}
+    assert text_response.json() == {"accept": "text/plain"}
+
+
+def test_fresh_hit_is_marked_and_makes_no_request(tmp_path):
+    client, requests = cached_client(tmp_path)
+    url = "https://example.com/wp-json/wp/v2/posts?slug=a"
+
+    miss = client.get(url)
+    hit = client.get(url)
+
+    assert len(requests) == 1
+    assert miss.timings["cache"] == "miss" and miss.timings["attempts"] == 1
+    assert hit.timings["cache"] == "hit" and "attempts" not in hit.timings
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import wp_image
+
+
+def test_pixel_cap_leaves_pillow_limit_alone(tmp_path):
+    path = str(tmp_path / "a.png")
+    Image.new("RGB", (300, 200)).save(path)
+    pillow_limit = Image.MAX_IMAGE_PIXELS
+
+    with pytest.raises(wp_image.ImageTooLarge):
+        wp_image.open_bounded(path, max_pixels=1_000)
+    with wp_image.open_bounded(path, max_pixels=60_000) as img:
+        assert img.size == (300, 200)
+
+    assert Image.MAX_IMAGE_PIXELS == pillow_limit
@@ -0,0 +1,76 @@
+import csv
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import wp_input
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # A few KB per block, so a modest file spans many blocks
+    monkeypatch.setattr(wp_input, "CHUNK_BYTES", 4096)
+
+
+def write_jsonl(path, count):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt") as f:
+        for i in range(1, count + 1):
+            f.write(json.dumps({"id": i, "slug": f"post-{i}"}) + "\n")
+            if i % 1000 == 0:
+                f.write("\n")
+
+
+@pytest.mark.parametrize("name", ["ids.jsonl", "ids.jsonl.gz"])
+def test_jsonl_chunks_are_chunk_rows_long_across_blocks(tmp_path, small_blocks, name):
+    path = str(tmp_path / name)
+    write_jsonl(path, 30_000)
+
+    chunks = list(wp_input.iter_jsonl_chunks(path, ("id",), chunk_rows=1000))
+
+    assert [len(chunk) for chunk in chunks] == [1000] * 30
+    assert [row[0] for chunk in chunks for row in chunk] == list(range(1, 30_001))
+
+
+def test_jsonl_last_chunk_holds_the_remainder(tmp_path, small_blocks):
+    path = str(tmp_path / "ids.jsonl")
+    write_jsonl(path, 2_500)
+
+    chunks = list(wp_input.iter_jsonl_chunks(path, ("id", "slug"), chunk_rows=1000))
+
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert chunks[-1][-1] == (2500, "post-2500")
+
+
+def test_csv_chunks_are_chunk_rows_long(tmp_path):
+    path = str(tmp_path / "rows.csv")
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["content_id", "image file name"])
+        for i in range(1, 2_501):
+            writer.writerow([i, "" if i == 7 else f"{i}.jpg"])
+
+    chunks = list(wp_input.iter_csv_chunks(path, ("content_id", "image file name"), chunk_rows=1000, types=(int, str)))
+
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert chunks[0][6] == (7, None)
+
+
+def test_read_ids_skips_empty_ids(tmp_path, small_blocks):
+    path = str(tmp_path / "ids.jsonl")
+    with open(path, "w") as f:
+        for value in (1, None, 2, "", 3):
+            f.write(json.dumps({"id": value}) + "\n")
+
+    assert wp_input.read_ids(path) == [1, 2, 3]
+
+
+def test_post_id_normalizes_and_rejects():
+    assert [wp_input.post_id(value) for value in (5, "5", " 12 ")] == [5, 5, 12]
+    for value in ("", " ", "abc", "1.5", "-3", 0, True, 1.5):
+        with pytest.raises(ValueError):
+            wp_input.post_id(value)
@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import wp_jobs
+from wp_status import StatusRecord
+
+
+@wp_jobs.register_action
+class EchoAction(wp_jobs.Action):
+    name = "test-echo"
+
+    def run(self, item_id):
+        return StatusRecord(item_id, status_code=200, message="ok")
+
+
+class Crash(Exception):
+    pass
+
+
+def crashing_map(after_calls):
+    """A map_fn that runs in-process and crashes on call number after_calls + 1."""
+    calls = []
+
+    def map_fn(fn, items):
+        if len(calls) == after_calls:
+            raise Crash()
+        calls.append(len(items))
+        return [fn(item) for item in items]
+
+    return map_fn, calls
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def read_checkpoint(spec):
+    """The keys in the checkpoint, after its job header."""
+    return read_lines(spec.checkpoint)[1:]
+
+
+@pytest.fixture
+def spec(tmp_path):
+    input_path = tmp_path / "ids.jsonl"
+    with open(input_path, "w") as f:
+        for i in range(1, 5_001):
+            f.write(json.dumps({"id": i}) + "\n")
+    return wp_jobs.JobSpec("test-echo", str(input_path), status_file=str(tmp_path / "status.jsonl"),
+                           chunk_size=100, retries=0)
+
+
+def test_checkpoint_advances_once_per_chunk(spec):
+    map_fn, calls = crashing_map(after_calls=3)
+    with pytest.raises(Crash):
+        wp_jobs.run_job(spec, map_fn=map_fn)
+
+    # Three chunks of chunk_size finished before the crash; nothing of the fourth was recorded
+    assert calls == [100, 100, 100]
+    assert read_checkpoint(spec) == list(range(1, 301))
+    assert [record["id"] for record in read_lines(spec.status_file)] == list(range(1, 301))
+
+
+def test_resume_runs_only_the_rest(spec):
+    map_fn, _ = crashing_map(after_calls=3)
+    with pytest.raises(Crash):
+        wp_jobs.run_job(spec, map_fn=map_fn)
+
+    map_fn, calls = crashing_map(after_calls=None)
+    metrics = wp_jobs.run_job(spec, map_fn=map_fn)
+
+    assert metrics.done == 4_700
+    assert sorted(read_checkpoint(spec)) == list(range(1, 5_001))
+    assert len(read_lines(spec.status_file)) == 5_000
+
+
+def test_rerun_of_finished_job_keeps_metrics_summary(spec):
+    map_fn, _ = crashing_map(after_calls=None)
+    wp_jobs.run_job(spec, map_fn=map_fn)
+    summary_path = os.path.splitext(spec.status_file)[0] + ".metrics.json"
+    with open(summary_path) as f:
+        summary = f.read()
+
+    wp_jobs.run_job(spec, map_fn=map_fn)
+
+    with open(summary_path) as f:
+        assert f.read() == summary
+
+
+def test_rows_with_empty_fields_are_skipped(tmp_path):
+    input_path = tmp_path / "ids.jsonl"
+    with open(input_path, "w") as f:
+        for value in (1, None, 2):
+            f.write(json.dumps({"id": value}) + "\n")
+    spec = wp_jobs.JobSpec("test-echo", str(input_path), status_file=str(tmp_path / "status.jsonl"))
+    map_fn, _ = crashing_map(after_calls=None)
+
+    wp_jobs.run_job(spec, map_fn=map_fn)
+
+    records = read_lines(spec.status_file)
+    assert [record.get("error_code") for record in records] == ["missing_fields", None, None]
+    assert read_checkpoint(spec) == [1, 2]
+
+
+def test_rerun_with_empty_rows_keeps_metrics_summary(tmp_path):
+    input_path = tmp_path / "ids.jsonl"
+    with open(input_path, "w") as f:
+        for value in (1, None):
+            f.write(json.dumps({"id": value}) + "\n")
+    spec = wp_jobs.JobSpec("test-echo", str(input_path), status_file=str(tmp_path / "status.jsonl"))
+    map_fn, _ = crashing_map(after_calls=None)
+    wp_jobs.run_job(spec, map_fn=map_fn)
+
+    metrics = wp_jobs.run_job(spec, map_fn=map_fn)
+
+    assert metrics.done == 0
+    with open(wp_jobs.RunMetrics.summary_path(spec.status_file)) as f:
+        assert json.load(f)["requests"] == 1
+
+
+def test_other_job_refuses_the_checkpoint(spec):
+    map_fn, _ = crashing_map(after_calls=None)
+    wp_jobs.run_job(spec, map_fn=map_fn)
+
+    other = wp_jobs.JobSpec("test-echo", spec.input, status_file=spec.status_file, options={"meta": {"a": 1}})
+    with pytest.raises(wp_jobs.CheckpointMismatch):
+        wp_jobs.run_job(other, map_fn=map_fn)
+
+    metrics = wp_jobs.run_job(other, fresh=True, map_fn=map_fn)
+    assert metrics.done == 5_000
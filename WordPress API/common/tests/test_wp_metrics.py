@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from wp_metrics import LatencyHistogram, RunMetrics
+
+
+def test_histogram_uses_sub_buckets_per_octave():
+    hist = LatencyHistogram()
+    # Every microsecond value of one octave above the exact range lands in its own bucket
+    octave = range(4 * LatencyHistogram.SUB_BUCKETS, 8 * LatencyHistogram.SUB_BUCKETS, 4)
+    assert len({hist._index(micros) for micros in octave}) == LatencyHistogram.SUB_BUCKETS
+
+
+def test_histogram_percentiles_within_one_sub_bucket():
+    for value_ms in (0.05, 1.234, 87.6, 1_234.5, 98_765.4):
+        hist = LatencyHistogram()
+        hist.record(value_ms * 0.5)  # min and max clamp the reported value, so keep them away from it
+        hist.record(value_ms)
+        hist.record(value_ms * 2)
+        assert abs(hist.percentile(50) - value_ms) <= value_ms / (2 * LatencyHistogram.SUB_BUCKETS) + 0.01
+
+
+def test_cache_hits_stay_out_of_latency_and_status_codes():
+    metrics = RunMetrics()
+    metrics.record(200, {"total_ms": 120.0, "attempts": 1})
+    metrics.record(200, {"total_ms": 0.2, "cache": "hit"})
+
+    assert metrics.done == 2
+    assert metrics.cache_hits == 1
+    assert metrics.status_codes == {"200": 1}
+    assert metrics.histograms["total_ms"].count == 1
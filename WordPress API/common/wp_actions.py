@@ -0,0 +1,320 @@
+"""
+Built-in wp_jobs actions: the per-item operations of the bulk WordPress tools.
+
+The bulk scripts call these for their per-item work too, so a script run and
+a wp_jobs run of the same operation send exactly the same requests.
+"""
+import json
+import logging
+import os
+import sys
+import time
+import urllib.parse
+
+import httpx
+
+from wp_client import get_client
+from wp_image import ImageTooLarge, open_bounded
+from wp_input import post_id as parse_post_id
+from wp_jobs import RETRY_STATUS_CODES, Action, register_action
+from wp_profile import stage
+from wp_status import StatusRecord
+
+logger = logging.getLogger("wp_actions")
+
+PRECHECK_PAGE_SIZE = 100  # WordPress caps per_page (and so include=) at 100
+IMAGE_UTILS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Bulk Add images to articles from CSV', 'src')
+
+
+def image_utils():
+    """The image uploader's utils module (compress_image, extract_caption_credit), imported on first use."""
+    if IMAGE_UTILS_DIR not in sys.path:
+        sys.path.append(IMAGE_UTILS_DIR)
+    import utils
+    return utils
+
+
+def with_query(url, query):
+    return urllib.parse.urlparse(url)._replace(query=query).geturl()
+
+
+class PostAction(Action):
+    """Base for actions that send one request per post id and record the response."""
+
+    verb = None  # "delete", used in messages
+    done = None  # "deleted"
+
+    def client(self):
+        return get_client(timeout=self.env.TIMEOUT_SEC, **self.env.CLIENT_OPTIONS)
+
+    def send(self, post_url):
+        raise NotImplementedError
+
+    def post_url(self, post_id):
+        raise NotImplementedError
+
+    def parse(self, row):
+        return (parse_post_id(row[0]),) + tuple(row[1:])
+
+    def run(self, post_id):
+        post_url = os.path.join(self.env.WP_API_ENDPOINT, str(post_id))
+        try:
+            post_url = self.post_url(post_id)
+            with stage("request"):
+                response = self.send(post_url)
+            ok = response.status_code == 200
+            message = f"Post {post_id} {self.done} successfully." if ok else f"Failed to {self.verb} post {post_id}."
+            with stage("parse"):
+                return StatusRecord.from_response(post_id, post_url, response, ok, message, self.env.STATUS_CAPTURE)
+        except httpx.TimeoutException:
+            return StatusRecord(post_id, post_url, message=f"Timeout while trying to {self.verb} post {post_id}.")
+        except Exception as exc:
+            logger.exception(exc)
+            return StatusRecord(post_id, post_url, message=f"Exception while trying to {self.verb} post {post_id}.")
+
+
+@register_action
+class DeleteAction(PostAction):
+    """Force-deletes posts. With `precheck` (the default), ids that no longer exist are skipped in bulk first."""
+
+    name = "delete"
+    verb = "delete"
+    done = "deleted"
+
+    def post_url(self, post_id):
+        # We _really_ want to delete the article!
+        query = 'force=true'
+        if self.env.STATUS_CAPTURE != 'always':
+            # Only ask for the fields the status record keeps, instead of the whole deleted post
+            query += '&_fields=deleted,previous.id,previous.slug,previous.title'
+        return with_query(os.path.join(self.env.WP_API_ENDPOINT, str(post_id)), query)
+
+    def send(self, post_url):
+        return self.client().delete(url=post_url, auth=self.env.AUTH, headers={'Content-Type': 'application/json'},
+                                    timeout=self.env.TIMEOUT_SEC)
+
+    def find_existing(self, post_ids):
+        """
+        Asks WordPress which of up to 100 post ids still exist, in one request.
+
+        Returns (existing ids, None), or (None, error message) if the check failed,
+        in which case the caller keeps every id.
+        """
+        try:
+            query = urllib.parse.urlencode({
+                'include': ','.join(str(post_id) for post_id in post_ids),
+                'per_page': PRECHECK_PAGE_SIZE,
+                '_fields': 'id',
+                'status': 'any,trash',  # 'any' alone excludes trashed posts, which force=true would still delete
+                'orderby': 'include',
+            })
+            response = self.client().get(f"{self.env.WP_API_ENDPOINT}?{query}", auth=self.env.AUTH)
+            if response.status_code != 200:
+                return None, f"status code {response.status_code}"
+            return {record['id'] for record in response.json()}, None
+        except Exception as exc:
+            return None, repr(exc)
+
+    def before_chunk(self, rows, map_fn):
+        if not self.options.get('precheck', True):
+            return rows, []
+        pages = [rows[i:i + PRECHECK_PAGE_SIZE] for i in range(0, len(rows), PRECHECK_PAGE_SIZE)]
+        with stage("precheck"):
+            checks = map_fn(self.find_existing, [[row[0] for row in page] for page in pages])
+        keep, skipped = [], []
+        for page, (existing, error) in zip(pages, checks):
+            if existing is None:
+                logger.warning(f"Existence check failed for {len(page)} ids ({error}); deleting them anyway.")
+                keep.extend(page)
+                continue
+            for row in page:
+                if row[0] in existing:
+                    keep.append(row)
+                else:
+                    skipped.append(StatusRecord(row[0], message=f"Post {row[0]} not found, skipped."))
+        return keep, skipped
+
+
+@register_action
+class UpdateMetaAction(PostAction):
+    """Sets post meta fields. Options: `meta`, the dict of meta keys and values to write."""
+
+    name = "update-meta"
+    verb = "Update"
+    done = "Updated"
+
+    def post_url(self, post_id):
+        post_url = os.path.join(self.env.WP_API_ENDPOINT, str(post_id))
+        if self.env.STATUS_CAPTURE != 'always':
+            # Only ask for the fields the status record keeps, instead of the whole updated post
+            post_url = with_query(post_url, '_fields=id,slug,title')
+        return post_url
+
+    def send(self, post_url):
+        return self.client().post(url=post_url, auth=self.env.AUTH, headers={'Content-Type': 'application/json'},
+                                  content=json.dumps({"meta": self.options['meta']}), timeout=self.env.TIMEOUT_SEC)
+
+
+@register_action
+class FetchBySlugAction(Action):
+    """
+    Looks up the post id of each slug. The status record's id is the post id, or None if no post has that slug.
+
+    GETs go through env.HTTP_CACHE when one is set (see wp_cache).
+    """
+
+    name = "fetch-by-slug"
+    fields = ("slug",)
+
+    def run(self, slug):
+        query = urllib.parse.urlencode({'slug': slug, '_fields': 'id,slug,title'})
+        url = f"{self.env.WP_API_ENDPOINT}?{query}"
+        try:
+            with stage("request"):
+                client = get_client(timeout=self.env.TIMEOUT_SEC, cache=getattr(self.env, 'HTTP_CACHE', None),
+                                    **self.env.CLIENT_OPTIONS)
+                response = client.get(url)
+            timing = getattr(response, 'timings', None)
+            if response.status_code != 200:
+                return StatusRecord(None, url, response.status_code, f"Failed to fetch ID for slug {slug}.", slug=slug,
+                                    response=response.text if self.env.STATUS_CAPTURE != 'never' else None, timing=timing)
+            with stage("parse"):
+                posts = response.json()
+            if not posts:
+                return StatusRecord(None, url, response.status_code, f"No post found for slug {slug}.", slug=slug,
+                                    timing=timing)
+            title = posts[0].get('title')
+            return StatusRecord(posts[0]['id'], url, response.status_code, f"Fetched ID {posts[0]['id']} for slug {slug}.",
+                                slug=slug, title=title.get('rendered') if isinstance(title, dict) else title, timing=timing)
+        except httpx.TimeoutException:
+            return StatusRecord(None, url, message=f"Timeout while fetching slug {slug}.", slug=slug)
+        except Exception as exc:
+            logger.exception(exc)
+            return StatusRecord(None, url, message=f"Exception while fetching slug {slug}.", slug=slug)
+
+    def is_done(self, status):
+        """Only found slugs are checkpointed, so a rerun looks up missing and failed slugs again."""
+        return status.id is not None
+
+
+@register_action
+class AttachImageAction(Action):
+    """
+    Uploads a local image and makes it the post's featured image and first content block.
+
+    Input rows come from the image uploader's CSV (`content_id`, `image file name`).
+    Options: `images_dir` (required) and `post_type` (default "posts").
+    Needs the WP_SITE_URL env setting, which defaults to the origin of WP_ENDPOINT.
+
+    The job engine never re-runs an item: a re-sent upload could add a second
+    attachment. wp_client already re-sends uploads the server did not act on
+    (connect errors, 429, 503), and only the post update is retried here,
+    which is safe because it is skipped once the post has the media.
+    """
+
+    name = "attach-image"
+    fields = ("content_id", "image file name")
+    NOT_RETRIED = ("image_not_found", "image_too_large", "attach_failed")
+    ATTACH_ATTEMPTS = 3
+
+    def parse(self, row):
+        return (parse_post_id(row[0]), row[1])
+
+    def client(self):
+        return get_client(auth=self.env.AUTH, timeout=self.env.TIMEOUT_SEC, **self.env.CLIENT_OPTIONS)
+
+    def upload(self, image_path):
+        """Compresses and uploads an image; returns (media id, source url)."""
+        filename = os.path.basename(image_path)
+        with stage("encode"), open_bounded(image_path) as img:
+            image_data = image_utils().compress_image(img)
+        if not image_data:
+            raise ValueError("Compression failed")
+
+        with stage("upload"):
+            response = self.client().post(
+                f"{self.env.WP_SITE_URL}/wp-json/wp/v2/media",
+                headers={'Content-Disposition': f'attachment; filename={filename}', 'Content-Type': 'image/jpeg'},
+                content=image_data
+            )
+        response.raise_for_status()
+        media = response.json()
+        logger.info(f"✅ Uploaded image: {filename} (Media ID: {media['id']})")
+        return media['id'], media['source_url']
+
+    def attach(self, post_id, media_id, image_url, caption):
+        """Sets the featured image, flags the post for the home/category pages and prepends an image block."""
+        post_type = self.options.get('post_type', 'posts')
+        url = f"{self.env.WP_SITE_URL}/wp-json/wp/v2/{post_type}/{post_id}?context=edit"
+        client = self.client()
+
+        with stage("update"):
+            post_response = client.get(url)
+            post_response.raise_for_status()
+            post = post_response.json()
+            if post.get('featured_media') == media_id:
+                # An earlier attempt got through even though it reported a failure
+                logger.info(f"✅ Media {media_id} is already attached to post ID {post_id}")
+                return post_response
+
+            content = post['content'].get('raw') or post['content'].get('rendered', '')
+            block_json = '{"className":"wp-block-image"}'
+            caption_html = f'<figcaption class="wp-element-caption">{caption}</figcaption>' if caption else ''
+            image_block = (
+                f'<!-- wp:image {block_json} -->\n'
+                f'<figure class="wp-block-image"><img src="{image_url}" alt=""/>{caption_html}</figure>\n'
+                f'<!-- /wp:image -->'
+            )
+            # Featured image and content go in one update instead of two
+            response = client.post(url, json={'featured_media': media_id, 'content': image_block + "\n\n" + content})
+            response.raise_for_status()
+            logger.info(f"✅ Set featured image and added image block to post ID {post_id}")
+
+            try:
+                acf_response = client.post(url, json={"acf": {"public": {"show_on_homecategory_pages": True}}})
+                acf_response.raise_for_status()
+                logger.info(f"✅ ACF field updated for post ID {post_id}")
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to update ACF: {e}")
+        return response
+
+    def run(self, post_id, filename):
+        image_path = os.path.join(self.options['images_dir'], filename)
+        if not os.path.exists(image_path):
+            logger.error(f"❌ Image file not found: {image_path}")
+            return StatusRecord(post_id, image_path, message=f"Image file not found: {image_path}", error_code="image_not_found")
+
+        with stage("metadata"):
+            caption, credit = image_utils().extract_caption_credit(image_path)
+        final_caption = f"Photo Courtesy: {credit}" if credit else None
+
+        try:
+            media_id, image_url = self.upload(image_path)
+        except ImageTooLarge as e:
+            logger.error(f"❌ Skipped {image_path}: {e}")
+            return StatusRecord(post_id, image_path, message=str(e), error_code="image_too_large")
+        except Exception as e:
+            logger.error(f"❌ Failed to upload {image_path}: {e}")
+            return StatusRecord(post_id, image_path, getattr(getattr(e, 'response', None), 'status_code', None),
+                                f"Failed to upload {image_path}: {e}")
+        for attempt in range(self.ATTACH_ATTEMPTS):
+            try:
+                response = self.attach(post_id, media_id, image_url, final_caption)
+                break
+            except Exception as e:
+                status_code = getattr(getattr(e, 'response', None), 'status_code', None)
+                if attempt + 1 < self.ATTACH_ATTEMPTS and (status_code is None or status_code in RETRY_STATUS_CODES):
+                    logger.warning(f"⚠️ Attaching media {media_id} to post ID {post_id} failed ({e}), retrying")
+                    time.sleep(2 ** attempt)
+                    continue
+                logger.error(f"❌ Failed to attach media {media_id} to post ID {post_id}: {e}")
+                return StatusRecord(post_id, image_url, status_code,
+                                    f"Failed to attach media {media_id} to post {post_id}: {e}", error_code="attach_failed")
+        return StatusRecord(post_id, image_url, response.status_code, f"Attached media {media_id} to post {post_id}.")
+
+    def should_retry(self, status):
+        return False  # Re-running the item would upload the image again; see the class docstring
+
+    def is_done(self, status):
+        """Upload timeouts and 5xx stay out of the checkpoint, so a later run of the job tries them again."""
+        return status.error_code in self.NOT_RETRIED or not super().should_retry(status)
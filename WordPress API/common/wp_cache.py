@@ -0,0 +1,180 @@
+"""
+Opt-in on-disk cache for the read-only GET requests of the WordPress scripts.
+
+Reruns of keyword_generation_prep.py or the slug lookup while iterating on
+prompts used to fetch every page from the production site again. With
+HTTP_CACHE_DIR set, WPClient GETs go through an HTTPCache:
+
+* a response younger than HTTP_CACHE_TTL_SEC is served from disk, without a
+  request
+* an older one is revalidated with If-None-Match / If-Modified-Since, so an
+  unchanged page costs a 304 instead of a full body
+* the cache is kept under HTTP_CACHE_MAX_MB by evicting the least recently
+  used responses
+
+Only 200 responses without `Cache-Control: no-store` are stored. Entries are
+keyed by URL, user and the request headers that can change the response
+(e.g. Accept, Accept-Language), so two accounts or two representations never
+share an entry. The index and bodies live in one SQLite file, shared safely by
+pool workers.
+
+    cache = HTTPCache.from_env()            # None unless HTTP_CACHE_DIR is set
+    client = get_client(timeout=60, cache=cache)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_DIR_ENV = "HTTP_CACHE_DIR"
+DEFAULT_TTL_SEC = 3600.0
+DEFAULT_MAX_MB = 256.0
+# Stored bodies are already decoded, so these would describe the wrong bytes
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+# Request headers left out of the cache key: credentials (the user is keyed separately), transport
+# details that don't change the decoded body, and the validators added when revalidating
+UNKEYED_HEADERS = {"authorization", "cookie", "user-agent", "accept-encoding", "connection", "host",
+                   "content-length", "if-none-match", "if-modified-since"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CacheEntry(object):
+    __slots__ = ("status_code", "headers", "body", "etag", "last_modified", "stored_at")
+
+    def __init__(self, status_code, headers, body, etag, last_modified, stored_at):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    def is_fresh(self, ttl_sec):
+        return time.time() - self.stored_at < ttl_sec
+
+    def validators(self):
+        """Conditional request headers for revalidating this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache(object):
+    """
+    An LRU, size-bounded store of GET responses in `<path>/http-cache.sqlite`.
+
+    Picklable, so it can be handed to multiprocessing workers; each process
+    opens its own connection on first use.
+    """
+
+    def __init__(self, path, ttl_sec=DEFAULT_TTL_SEC, max_mb=DEFAULT_MAX_MB):
+        self.path = path
+        self.ttl_sec = float(ttl_sec)
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self._db = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """An HTTPCache configured from HTTP_CACHE_DIR, HTTP_CACHE_TTL_SEC and HTTP_CACHE_MAX_MB, or None if it is off."""
+        environ = os.environ if environ is None else environ
+        path = environ.get(CACHE_DIR_ENV)
+        if not path:
+            return None
+        return cls(path, environ.get("HTTP_CACHE_TTL_SEC", DEFAULT_TTL_SEC), environ.get("HTTP_CACHE_MAX_MB", DEFAULT_MAX_MB))
+
+    def __repr__(self):
+        # get_client() keys its clients on repr(), so equal settings share one client
+        return f"HTTPCache({self.path!r}, ttl_sec={self.ttl_sec}, max_mb={self.max_bytes / 1024 / 1024:g})"
+
+    def __getstate__(self):
+        return {"path": self.path, "ttl_sec": self.ttl_sec, "max_bytes": self.max_bytes, "_db": None, "_pid": None}
+
+    def db(self):
+        if self._db is None or self._pid != os.getpid():
+            os.makedirs(self.path, exist_ok=True)
+            # isolation_level=None: every statement commits on its own, so workers never hold a lock between calls
+            self._db = sqlite3.connect(os.path.join(self.path, "http-cache.sqlite"), timeout=30,
+                                       isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._db
+
+    @staticmethod
+    def key(url, user=None, headers=None):
+        """Cache key of a GET; `headers` are the request's headers, of which those not in UNKEYED_HEADERS count."""
+        keyed = sorted((name.lower(), value) for name, value in (headers or {}).items()
+                       if name.lower() not in UNKEYED_HEADERS)
+        return hashlib.sha256(f"{user or ''}\0{url}\0{json.dumps(keyed)}".encode("utf-8")).hexdigest()
+
+    def lookup(self, key):
+        """Returns the stored CacheEntry for key, or None, and marks it as recently used."""
+        row = self.db().execute(
+            "SELECT status_code, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.db().execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        status_code, headers, body, etag, last_modified, stored_at = row
+        return CacheEntry(status_code, json.loads(headers), bytes(body), etag, last_modified, stored_at)
+
+    def store(self, key, response):
+        """Stores a 200 response unless it says no-store. Returns True if it was stored."""
+        if response.status_code != 200 or "no-store" in response.headers.get("Cache-Control", ""):
+            return False
+        body = response.content
+        if len(body) > self.max_bytes:
+            return False
+        headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in DROPPED_HEADERS]
+        now = time.time()
+        self.db().execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, str(response.url), response.status_code, json.dumps(headers), body, len(body),
+             response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now),
+        )
+        self.evict()
+        return True
+
+    def touch(self, key):
+        """Restarts an entry's TTL after the server confirmed it is unchanged (304)."""
+        now = time.time()
+        self.db().execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+
+    def evict(self):
+        """Deletes least recently used entries until the cache is within max_mb."""
+        db = self.db()
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def clear(self):
+        self.db().execute("DELETE FROM responses")
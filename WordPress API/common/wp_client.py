@@ -0,0 +1,304 @@
+"""
+Shared, pooled HTTP client for the WordPress and WooCommerce REST scripts.
+
+Every script used to build its own HTTP layer (a new httpx.Client per call,
+bare httpx.get with no timeout, un-sessioned requests.post). This module gives
+them one implementation with:
+
+* keep-alive connection pooling (one client per process, reused across calls)
+* HTTP/2 when the `h2` package is installed (`pip install httpx[http2]`)
+* uniform timeouts
+* retries with exponential backoff on connection errors, 429 and 5xx,
+  honouring `Retry-After`
+* gzip/deflate response compression
+* per-request timings (connect, TLS, time to first byte, total including any
+  retry backoff, and the backoff itself) attached to every response as
+  `response.timings`, for wp_metrics.RunMetrics
+* an optional on-disk cache for GETs (`cache=HTTPCache(...)`, see wp_cache)
+
+Scripts import it by adding this folder to sys.path:
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'common'))
+    from wp_client import get_client
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+logger = logging.getLogger("wp_client")
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # Seconds; doubled on every retry, plus jitter
+DEFAULT_MAX_CONNECTIONS = 20
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Status codes that mean the server did not act on the request, so even a POST can be re-sent
+NOT_PROCESSED_STATUS_CODES = {429, 503}
+# Requests that may be safely re-sent after the server could have received them
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _client_kwargs(base_url, auth, timeout, max_connections, http2, headers):
+    return dict(
+        base_url=base_url or "",
+        auth=auth,
+        timeout=httpx.Timeout(timeout),
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        http2=http2 and HTTP2_AVAILABLE,
+        headers={"Accept-Encoding": "gzip, deflate", **(headers or {})},
+    )
+
+
+class RequestTimer:
+    """
+    Collects per-phase timings for one request from httpcore trace events.
+
+    httpcore resolves DNS inside the TCP connect, so DNS time is part of
+    connect_ms. Phases that did not happen (e.g. connect on a reused keep-alive
+    connection) are left out.
+    """
+
+    PHASES = {
+        "connection.connect_tcp": "connect_ms",
+        "connection.start_tls": "tls_ms",
+    }
+
+    def __init__(self, start=None):
+        self.start = start or time.perf_counter()
+        self.timings = {}
+        self._started = {}
+        self._request_sent = None
+
+    def __call__(self, event_name, info):
+        now = time.perf_counter()
+        name, _, stage = event_name.rpartition(".")
+        if name in self.PHASES:
+            if stage == "started":
+                self._started[name] = now
+            elif stage == "complete" and name in self._started:
+                self.timings[self.PHASES[name]] = round((now - self._started[name]) * 1000, 2)
+        elif name.endswith("send_request_headers") and stage == "started":
+            self._request_sent = now
+        elif name.endswith("receive_response_headers") and stage == "complete" and self._request_sent:
+            self.timings["ttfb_ms"] = round((now - self._request_sent) * 1000, 2)
+
+    async def trace_async(self, event_name, info):
+        self(event_name, info)
+
+    def result(self, attempts, backoff_sec=0.0):
+        """
+        The timings of the last attempt, plus total_ms over every attempt.
+
+        total_ms is the wall time of the whole call, so it includes the backoff
+        sleeps between retries; those are also reported on their own as backoff_ms.
+        """
+        timings = dict(self.timings, total_ms=round((time.perf_counter() - self.start) * 1000, 2), attempts=attempts)
+        if backoff_sec:
+            timings["backoff_ms"] = round(backoff_sec * 1000, 2)
+        return timings
+
+
+def _with_trace(kwargs, trace):
+    """Adds the trace callback to the request's extensions without mutating the caller's dict."""
+    return dict(kwargs, extensions={**kwargs.get("extensions", {}), "trace": trace})
+
+
+def _retry_delay(attempt, backoff, response=None):
+    """Seconds to wait before the next attempt: Retry-After if the server sent one, else exponential backoff."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+    return backoff * (2 ** attempt) + random.uniform(0, backoff)
+
+
+def _should_retry(method, attempt, retries, response=None, error=None):
+    if attempt >= retries:
+        return False
+    if response is not None:
+        if method.upper() not in IDEMPOTENT_METHODS:
+            return response.status_code in NOT_PROCESSED_STATUS_CODES
+        return response.status_code in RETRY_STATUS_CODES
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True  # The request never reached the server
+    return isinstance(error, httpx.TransportError) and method.upper() in IDEMPOTENT_METHODS
+
+
+def _cache_user(auth):
+    """What separates one account's cached responses from another's: the user name, or the Basic auth header."""
+    if isinstance(auth, tuple):
+        return auth[0]
+    return getattr(auth, "_auth_header", None)
+
+
+def _cached_response(entry, request, start, outcome, timings=None):
+    """
+    Rebuilds an httpx.Response from a cache entry. Its timings say whether it was a plain hit or a 304.
+
+    A hit made no request, so its timings only hold cache="hit" and the lookup time; RunMetrics counts
+    hits apart instead of as requests.
+    """
+    response = httpx.Response(entry.status_code, headers=entry.headers, content=entry.body, request=request)
+    response.timings = dict(timings or {}, total_ms=round((time.perf_counter() - start) * 1000, 2), cache=outcome)
+    return response
+
+
+class WPClient:
+    """Synchronous WordPress REST client with pooling, timeouts and retries."""
+
+    def __init__(self, base_url=None, auth=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, max_connections=DEFAULT_MAX_CONNECTIONS, http2=True, headers=None,
+                 cache=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.client = httpx.Client(**_client_kwargs(base_url, auth, timeout, max_connections, http2, headers))
+
+    def request(self, method, url, **kwargs):
+        if self.cache is not None and method.upper() == "GET":
+            return self._cached_get(url, **kwargs)
+        return self._request(method, url, **kwargs)
+
+    def _cached_get(self, url, **kwargs):
+        """GET through the HTTPCache: fresh entries skip the network, stale ones are revalidated with a conditional GET."""
+        start = time.perf_counter()
+        request = self.client.build_request("GET", url, params=kwargs.get("params"), headers=kwargs.get("headers"))
+        key = self.cache.key(str(request.url), _cache_user(kwargs.get("auth") or self.client.auth), request.headers)
+
+        entry = self.cache.lookup(key)
+        if entry is not None and entry.is_fresh(self.cache.ttl_sec):
+            return _cached_response(entry, request, start, "hit")
+
+        if entry is not None:
+            kwargs = dict(kwargs, headers={**entry.validators(), **(kwargs.get("headers") or {})})
+        response = self._request("GET", url, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.cache.touch(key)
+            return _cached_response(entry, request, start, "revalidated", response.timings)
+        if self.cache.store(key, response):
+            response.timings["cache"] = "miss"
+        return response
+
+    def _request(self, method, url, **kwargs):
+        attempt = 0
+        slept = 0.0
+        start = time.perf_counter()
+        while True:
+            timer = RequestTimer(start)
+            try:
+                response = self.client.request(method, url, **_with_trace(kwargs, timer))
+            except httpx.TransportError as e:
+                if not _should_retry(method, attempt, self.retries, error=e):
+                    raise
+                delay = _retry_delay(attempt, self.backoff)
+                logger.warning(f"{method} {url} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if not _should_retry(method, attempt, self.retries, response=response):
+                    response.timings = timer.result(attempt + 1, slept)
+                    return response
+                delay = _retry_delay(attempt, self.backoff, response)
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            slept += delay
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncWPClient:
+    """Asynchronous counterpart of WPClient, for asyncio-based scripts."""
+
+    def __init__(self, base_url=None, auth=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, max_connections=DEFAULT_MAX_CONNECTIONS, http2=True, headers=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(**_client_kwargs(base_url, auth, timeout, max_connections, http2, headers))
+
+    async def request(self, method, url, **kwargs):
+        attempt = 0
+        slept = 0.0
+        start = time.perf_counter()
+        while True:
+            timer = RequestTimer(start)
+            try:
+                response = await self.client.request(method, url, **_with_trace(kwargs, timer.trace_async))
+            except httpx.TransportError as e:
+                if not _should_retry(method, attempt, self.retries, error=e):
+                    raise
+                delay = _retry_delay(attempt, self.backoff)
+                logger.warning(f"{method} {url} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if not _should_retry(method, attempt, self.retries, response=response):
+                    response.timings = timer.result(attempt + 1, slept)
+                    return response
+                delay = _retry_delay(attempt, self.backoff, response)
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            slept += delay
+            attempt += 1
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request("DELETE", url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(**kwargs):
+    """
+    Returns a WPClient shared by every caller in this process with the same settings.
+
+    Safe to call from multiprocessing workers: each worker process builds its own
+    client on first use and then reuses its connections for every later call.
+    """
+    # The pid is part of the key so a forked worker never reuses its parent's sockets
+    key = (os.getpid(),) + tuple(sorted((k, repr(v)) for k, v in kwargs.items()))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = WPClient(**kwargs)
+        return _clients[key]
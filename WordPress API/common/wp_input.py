@@ -0,0 +1,181 @@
+"""
+Streaming JSONL and CSV readers for the bulk WordPress tools.
+
+Input files can be tens of millions of lines of `{"id": ...}`. The readers
+work on large blocks of raw lines and only keep the requested fields as
+plain tuples, so no per-line dicts or DataFrames are built. Files ending in
+`.gz` are decompressed on the fly. JSON parsing uses msgspec or orjson when
+installed and falls back to the stdlib `json` module.
+"""
+import csv
+import gzip
+import json
+
+CHUNK_BYTES = 8 * 1024 * 1024
+DEFAULT_CHUNK_ROWS = 100_000
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_backend() -> str:
+    """Name of the JSON library used to parse lines."""
+    if msgspec is not None:
+        return "msgspec"
+    if orjson is not None:
+        return "orjson"
+    return "json"
+
+
+def open_input(path: str, mode: str = "rb"):
+    """Opens a plain or gzip-compressed file."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode) if "b" in mode else gzip.open(path, mode, encoding="utf-8-sig", newline="")
+    return open(path, mode) if "b" in mode else open(path, mode, encoding="utf-8-sig", newline="")
+
+
+def _block_decoder(fields):
+    """Returns decode(lines) -> list of row tuples of the given fields (None when missing)."""
+    if msgspec is not None:
+        # A Struct with only the wanted fields makes msgspec skip everything else without building it
+        row_type = msgspec.defstruct("Row", [(name, object, None) for name in fields])
+        decode_line = msgspec.json.Decoder(row_type).decode
+        astuple = msgspec.structs.astuple
+        return lambda lines: [astuple(decode_line(line)) for line in lines if not line.isspace()]
+
+    loads = orjson.loads if orjson is not None else json.loads
+    if len(fields) == 1:
+        name = fields[0]
+        return lambda lines: [(record.get(name),) for record in map(loads, _non_blank(lines))]
+    return lambda lines: [tuple(map(record.get, fields)) for record in map(loads, _non_blank(lines))]
+
+
+def _non_blank(lines):
+    return [line for line in lines if not line.isspace()]
+
+
+def _rechunk(blocks, chunk_rows):
+    """Re-slices lists of rows of any length into lists of exactly chunk_rows, carrying the remainder forward."""
+    chunk_rows = max(1, int(chunk_rows))
+    pending = []
+    for rows in blocks:
+        if pending:
+            rows = pending + rows
+        full = len(rows) - len(rows) % chunk_rows
+        for start in range(0, full, chunk_rows):
+            yield rows[start:start + chunk_rows]
+        pending = rows[full:]
+    if pending:
+        yield pending
+
+
+def _iter_line_blocks(path: str):
+    with open_input(path, "rb") as f:
+        while True:
+            lines = f.readlines(CHUNK_BYTES)
+            if not lines:
+                return
+            yield lines
+
+
+def iter_jsonl_chunks(path: str, fields, chunk_rows: int = DEFAULT_CHUNK_ROWS, types=None):
+    """
+    Yields lists of row tuples holding only `fields`, `chunk_rows` per list (the last one may be shorter).
+
+    `types` is an optional tuple of callables (e.g. `(int,)`) applied to each
+    field that is present. Blank lines are skipped.
+    """
+    fields = tuple(fields)
+    decode = _block_decoder(fields)
+
+    def blocks():
+        for lines in _iter_line_blocks(path):
+            rows = decode(lines)
+            if types is not None:
+                rows = [tuple(v if v is None else t(v) for t, v in zip(types, row)) for row in rows]
+            yield rows
+
+    yield from _rechunk(blocks(), chunk_rows)
+
+
+def iter_jsonl(path: str, fields, types=None):
+    """Yields one row tuple per JSONL line, holding only `fields`."""
+    for chunk in iter_jsonl_chunks(path, fields, types=types):
+        yield from chunk
+
+
+def post_id(value) -> int:
+    """
+    Returns a post id from an input field as an int.
+
+    Accepts ints and digit strings with surrounding whitespace (CSV cells, ids
+    written as strings); raises ValueError for anything else, including 0 and
+    negative numbers.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid post id {value!r}")
+    if isinstance(value, str):
+        value = value.strip()
+        if not value.isdigit():
+            raise ValueError(f"Invalid post id {value!r}")
+    if not isinstance(value, (int, str)) or int(value) <= 0:
+        raise ValueError(f"Invalid post id {value!r}")
+    return int(value)
+
+
+def read_ids(path: str, field: str = "id") -> list:
+    """Returns every non-empty `field` value of a JSONL file, in file order."""
+    decode = _block_decoder((field,))
+    ids = []
+    for lines in _iter_line_blocks(path):
+        ids.extend(row[0] for row in decode(lines) if row[0])
+    return ids
+
+
+def iter_csv_chunks(path: str, columns, chunk_rows: int = DEFAULT_CHUNK_ROWS, types=None):
+    """
+    Yields lists of row tuples holding only `columns` of a CSV file with a header row, `chunk_rows` per list.
+
+    Raises ValueError naming any column missing from the header. Empty cells
+    are returned as None and are not passed to `types`.
+    """
+    columns = tuple(columns)
+    chunk_rows = max(1, int(chunk_rows))
+    with open_input(path, "rt") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        header = [name.strip() for name in header]
+        missing = [name for name in columns if name not in header]
+        if missing:
+            raise ValueError(f"{path} is missing column(s) {missing}; found {header}")
+        indexes = [header.index(name) for name in columns]
+        width = max(indexes) + 1
+
+        chunk = []
+        for record in reader:
+            if not record:
+                continue
+            if len(record) < width:
+                record = record + [""] * (width - len(record))
+            row = tuple(record[i] or None for i in indexes)
+            if types is not None:
+                row = tuple(v if v is None else t(v) for t, v in zip(types, row))
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def iter_csv(path: str, columns, types=None):
+    """Yields one row tuple per CSV record, holding only `columns`."""
+    for chunk in iter_csv_chunks(path, columns, types=types):
+        yield from chunk
@@ -0,0 +1,344 @@
+"""
+Job engine for the bulk WordPress operations.
+
+Every bulk script used to do the same things around a different per-item call:
+read ids, fan out over multiprocessing.Pool in BULK_SIZE chunks, log a random
+record and write a status file. The engine does that once, for any Action:
+
+* streams the input (JSONL, plain or gzip, or CSV) in chunks through wp_input,
+  reading only the fields the action needs
+* runs each chunk on a pool of processes (`concurrency`)
+* re-runs items that failed with a timeout, 429 or 5xx, up to `retries` times
+  with exponential backoff
+* appends each finished chunk to the status file and its keys to a checkpoint
+  file. A rerun of the same spec skips everything already done. The checkpoint
+  starts with a fingerprint of the action, options and input, and a different
+  job refuses to resume from it instead of skipping ids it has never run.
+* reports progress and a metrics summary through wp_metrics.RunMetrics
+
+A job is described by a spec, as JSON or YAML:
+
+    action: delete                  # or update-meta, fetch-by-slug, attach-image, "module:Class"
+    input: ids.jsonl.gz
+    status_file: /tmp/delete-status.jsonl.gz
+    concurrency: 8
+    options: {precheck: true}       # passed to the action
+    env: {WP_ENDPOINT: https://www.example.com/wp-json/wp/v2/posts}
+
+and run with `python3 wp_jobs.py job.yaml`. Settings not in `env` (for example
+WP_USERNAME and WP_PASSWORD) are read from the environment.
+"""
+import gzip
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import os
+import random
+import time
+import urllib.parse
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+from wp_cache import HTTPCache
+from wp_input import iter_csv_chunks, iter_jsonl_chunks
+from wp_metrics import RunMetrics
+from wp_profile import profiled, profiled_pool, stage
+from wp_status import StatusRecord
+
+logger = logging.getLogger("wp_jobs")
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+ACTIONS = {}
+
+
+def register_action(cls):
+    """Class decorator that makes an Action available to specs under its `name`."""
+    ACTIONS[cls.name] = cls
+    return cls
+
+
+class Action(object):
+    """
+    One kind of per-item WordPress operation.
+
+    Subclasses set `name` and `fields` (the input fields handed to run(), in
+    order) and implement run(), which returns a StatusRecord. Instances are
+    pickled to the worker processes, so keep their state to the env and plain
+    options.
+    """
+
+    name = None
+    fields = ("id",)
+
+    def __init__(self, env, **options):
+        self.env = env
+        self.options = options
+
+    def run(self, *fields):
+        raise NotImplementedError
+
+    def __call__(self, row):
+        return self.run(*row)
+
+    def key(self, row):
+        """Checkpoint key of an input row; the first field by default."""
+        return row[0]
+
+    def parse(self, row):
+        """Normalizes an input row before it is checkpointed or run. Raises ValueError for a row that can't run."""
+        return row
+
+    def before_chunk(self, rows, map_fn):
+        """Hook to filter a chunk before it runs. Returns (rows to run, StatusRecords of skipped rows)."""
+        return rows, []
+
+    def should_retry(self, status):
+        return status.status_code is None or status.status_code in RETRY_STATUS_CODES
+
+    def is_done(self, status):
+        """True if the item must not run again on resume. Failures worth retrying stay out of the checkpoint."""
+        return not self.should_retry(status)
+
+
+def get_action(name):
+    """Returns the Action class for a built-in name or a `package.module:ClassName` plugin."""
+    if ":" in name:
+        module_name, class_name = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), class_name)
+    if name not in ACTIONS:
+        import wp_actions  # noqa: F401  Registers the built-in actions
+    if name not in ACTIONS:
+        raise ValueError(f"Unknown action '{name}'. Choose one of: {', '.join(sorted(ACTIONS))} or module:Class")
+    return ACTIONS[name]
+
+
+def job_env(settings):
+    """Builds the env namespace the actions expect, with the same names and defaults as the bulk tools' get_env_vars()."""
+    endpoint = settings.get("WP_ENDPOINT") or settings.get("WP_API_ENDPOINT")
+    site_url = settings.get("WP_SITE_URL")
+    if not site_url and endpoint:
+        url = urllib.parse.urlparse(endpoint)
+        site_url = f"{url.scheme}://{url.netloc}"
+    return SimpleNamespace(
+        WP_API_ENDPOINT=endpoint,
+        WP_SITE_URL=site_url,
+        AUTH=(settings.get("WP_USERNAME"), settings.get("WP_PASSWORD")),
+        TIMEOUT_SEC=float(settings.get("TIMEOUT_SEC", 10)),
+        STATUS_CAPTURE=settings.get("STATUS_CAPTURE", "failure"),
+        CLIENT_OPTIONS={},
+        HTTP_CACHE=HTTPCache.from_env(settings),
+    )
+
+
+class JobSpec(object):
+    """A declarative job: which action to run over which input, how fast, and where results go."""
+
+    def __init__(self, action, input, status_file=None, checkpoint=None, fields=None, concurrency=8,
+                 chunk_size=1000, retries=2, retry_backoff_sec=1.0, progress_interval_sec=10.0,
+                 options=None, env=None):
+        self.action = action
+        self.input = input
+        self.status_file = status_file or f"/tmp/wp-job-{action.replace(':', '-')}.jsonl"
+        base = self.status_file[:-3] if self.status_file.endswith(".gz") else self.status_file
+        self.checkpoint = checkpoint or f"{os.path.splitext(base)[0]}.checkpoint"
+        self.fields = tuple(fields) if fields else None
+        self.concurrency = int(concurrency)
+        self.chunk_size = int(chunk_size)
+        self.retries = int(retries)
+        self.retry_backoff_sec = float(retry_backoff_sec)
+        self.progress_interval_sec = float(progress_interval_sec)
+        self.options = options or {}
+        self.env = env or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        unknown = set(data) - set(inspect.signature(cls).parameters)
+        if unknown:
+            raise ValueError(f"{path}: unknown job settings {sorted(unknown)}")
+        return cls(**data)
+
+
+def open_status_file(path):
+    """Opens the status file for appending, so a resumed job adds to the previous run's records."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "at")
+    return open(path, "a")
+
+
+class CheckpointMismatch(ValueError):
+    """The checkpoint next to the status file was written by a different job."""
+
+
+def job_fingerprint(spec, fields):
+    """Short hash of what makes two runs the same job: the action, its options, the input file and fields."""
+    job = {"action": spec.action, "options": spec.options, "input": os.path.abspath(spec.input), "fields": list(fields)}
+    return hashlib.sha1(json.dumps(job, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+
+
+def load_checkpoint(path, fingerprint):
+    """
+    Returns the keys already done according to the checkpoint at path.
+
+    Its first line is {"job": fingerprint}; raises CheckpointMismatch if the
+    checkpoint was written by another job (or has no header).
+    """
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return set()
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    header = lines[0] if lines and isinstance(lines[0], dict) else {}
+    if header.get("job") != fingerprint:
+        raise CheckpointMismatch(
+            f"{path} belongs to a different job (action, options or input changed). "
+            f"Run with --fresh to start over, or use another status file.")
+    return set(lines[1:])
+
+
+def read_chunks(spec, fields):
+    if spec.input.endswith((".csv", ".csv.gz")):
+        return iter_csv_chunks(spec.input, fields, chunk_rows=spec.chunk_size)
+    return iter_jsonl_chunks(spec.input, fields, chunk_rows=spec.chunk_size)
+
+
+def write_incomplete(rows, fields, status_out):
+    """Records input rows with empty required fields as skipped; they are never sent to the action."""
+    logger.warning(f"Skipping {len(rows)} input rows with an empty {' / '.join(fields)} field")
+    for row in rows:
+        missing = [name for name, value in zip(fields, row) if value is None]
+        status = StatusRecord(row[0], message=f"Missing {', '.join(missing)} in input row; skipped.",
+                              error_code="missing_fields")
+        status_out.write(json.dumps(status.as_dict()) + "\n")
+
+
+def parse_rows(action, rows, status_out):
+    """Returns the rows normalized by action.parse(); rows it rejects are recorded as skipped and dropped."""
+    parsed, invalid = [], 0
+    for row in rows:
+        try:
+            parsed.append(action.parse(row))
+        except ValueError as exc:
+            status = StatusRecord(row[0], message=f"{exc}; skipped.", error_code="invalid_input")
+            status_out.write(json.dumps(status.as_dict()) + "\n")
+            invalid += 1
+    if invalid:
+        logger.warning(f"Skipping {invalid} input rows the {action.name} action can't run")
+    return parsed, invalid
+
+
+def run_with_retries(action, rows, map_fn, spec):
+    """Runs the action over rows, re-running retryable failures with exponential backoff."""
+    statuses = map_fn(action, rows)
+    for attempt in range(spec.retries):
+        pending = [i for i, status in enumerate(statuses) if action.should_retry(status)]
+        if not pending:
+            break
+        delay = spec.retry_backoff_sec * (2 ** attempt)
+        logger.info(f"Retrying {len(pending)} items in {delay:.1f}s (attempt {attempt + 2}/{spec.retries + 1})")
+        time.sleep(delay)
+        for i, status in zip(pending, map_fn(action, [rows[i] for i in pending])):
+            statuses[i] = status
+    return statuses
+
+
+def run_job(spec, fresh=False, map_fn=None, env=None, metrics=None):
+    """
+    Runs a JobSpec and returns its RunMetrics.
+
+    `map_fn(fn, items)` defaults to a profiled process pool of `concurrency`
+    workers. `fresh` ignores and replaces an existing checkpoint and status file.
+    `env` replaces the env built from spec.env and the environment; the bulk
+    scripts pass the one from their get_env_vars(). `metrics` collects into an
+    existing RunMetrics.
+    """
+    if map_fn is None:
+        with profiled_pool(spec.concurrency) as pool:
+            chunksize = lambda items: max(1, len(items) // (spec.concurrency * 4))
+            return run_job(spec, fresh, lambda fn, items: pool.map(fn, items, chunksize(items)), env, metrics)
+
+    action_class = get_action(spec.action)
+    if env is None:
+        env = job_env({**os.environ, **{k: str(v) for k, v in spec.env.items()}})
+    action = action_class(env, **spec.options)
+    fields = spec.fields or action_class.fields
+
+    if fresh:
+        for path in (spec.checkpoint, spec.status_file):
+            if os.path.exists(path):
+                os.remove(path)
+    fingerprint = job_fingerprint(spec, fields)
+    done = load_checkpoint(spec.checkpoint, fingerprint)
+    if done:
+        logger.info(f"Resuming: {len(done)} items already done according to {spec.checkpoint}")
+
+    metrics = RunMetrics(progress_interval_sec=spec.progress_interval_sec) if metrics is None else metrics
+    skipped = rejected_rows = 0
+    with open_status_file(spec.status_file) as status_out, open(spec.checkpoint, "a") as checkpoint_out:
+        if not checkpoint_out.tell():
+            checkpoint_out.write(json.dumps({"job": fingerprint}) + "\n")
+        for rows in read_chunks(spec, fields):
+            with stage("read"):
+                incomplete = [row for row in rows if None in row]
+                rows, invalid = parse_rows(action, [row for row in rows if None not in row], status_out)
+                rows = [row for row in rows if action.key(row) not in done]
+            if incomplete:
+                write_incomplete(incomplete, fields, status_out)
+            skipped += len(incomplete) + invalid
+            rejected_rows += len(incomplete) + invalid
+            if not rows:
+                continue
+
+            rows, skipped_statuses = action.before_chunk(rows, map_fn)
+            statuses = run_with_retries(action, rows, map_fn, spec) if rows else []
+
+            with stage("write"):
+                for status in statuses:
+                    metrics.record_status(status)
+                for status in skipped_statuses + statuses:
+                    status_out.write(json.dumps(status.as_dict()) + "\n")
+                status_out.flush()
+                # Checkpoint only after the status records are on disk
+                finished = [action.key(row) for row, status in zip(rows, statuses) if action.is_done(status)]
+                finished += [status.id for status in skipped_statuses]
+                for key in finished:
+                    checkpoint_out.write(json.dumps(key) + "\n")
+                checkpoint_out.flush()
+            done.update(finished)
+            skipped += len(skipped_statuses)
+
+            if statuses:
+                logger.info(f"Random record from current chunk: {random.choice(statuses)}")
+            if metrics.progress_due():
+                logger.info(f"Progress: {metrics.progress_line()} | skipped {skipped}")
+
+    if not metrics.done and skipped == rejected_rows:
+        # Keep the summary of the run that did the work instead of replacing it with an empty one
+        logger.info(f"Nothing left to run; status is in {os.path.abspath(spec.status_file)}")
+        return metrics
+    logger.info(f"Final: {metrics.progress_line()} | skipped {skipped}")
+    metrics_file = metrics.write_summary(spec.status_file)
+    logger.info(f"Status written to {os.path.abspath(spec.status_file)}, metrics to {os.path.abspath(metrics_file)}")
+    return metrics
+
+
+def main():
+    parser = ArgumentParser(description="Run a bulk WordPress job from a spec file")
+    parser.add_argument("spec", help="Job spec (.json or .yaml)")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=os.getenv("APP_LOG_LEVEL", "INFO"), format="[%(asctime)s] [%(levelname)s] %(message)s")
+    run_job(JobSpec.load(args.spec), fresh=args.fresh)
+
+
+if __name__ == "__main__":
+    with profiled("wp_jobs"):
+        main()
@@ -0,0 +1,179 @@
+"""
+Request latency instrumentation for the bulk WordPress tools.
+
+RunMetrics collects the `timings` that wp_client attaches to every response,
+keeps them in HDR-style log-linear histograms (bounded memory, under 1%
+error at any magnitude), and produces:
+
+* periodic progress lines with RPS, p50/p95/p99 latency, error mix and ETA
+* a final JSON summary written next to the status file
+
+total_ms is the wall time of the whole call, retries and the backoff sleeps
+between them included, so retried requests show up in its tail. backoff_ms
+holds just the sleeps, for the requests that were retried.
+"""
+import json
+import math
+import os
+import time
+from collections import Counter
+
+PHASES = ("total_ms", "ttfb_ms", "connect_ms", "tls_ms", "backoff_ms")
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram in the style of HdrHistogram.
+
+    Values below SUB_BUCKETS microseconds are kept exactly. Above that, each
+    power-of-two range of microseconds is split into SUB_BUCKETS linear
+    buckets, so a bucket is at most 1/SUB_BUCKETS of its values wide and its
+    midpoint is within half that of any value in it, while memory stays
+    bounded however many values are recorded.
+    """
+
+    SUB_BUCKETS = 128
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, micros):
+        if micros < self.SUB_BUCKETS:
+            return 0, micros
+        # Keep the top log2(SUB_BUCKETS) + 1 bits: SUB_BUCKETS sub-buckets in [SUB_BUCKETS, 2 * SUB_BUCKETS)
+        exponent = micros.bit_length() - self.SUB_BUCKETS.bit_length()
+        return exponent, micros >> exponent
+
+    def _value(self, exponent, sub_bucket):
+        return ((sub_bucket << exponent) + ((1 << exponent) >> 1)) / 1000  # Bucket midpoint, in ms
+
+    def record(self, value_ms):
+        self.counts[self._index(max(0, int(value_ms * 1000)))] += 1
+        self.count += 1
+        self.total += value_ms
+        self.min = min(self.min, value_ms)
+        self.max = max(self.max, value_ms)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        target = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return round(min(max(self._value(*bucket), self.min), self.max), 2)
+        return round(self.max, 2)
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "min": round(self.min, 2),
+            "mean": round(self.total / self.count, 2),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": round(self.max, 2),
+        }
+
+
+class RunMetrics:
+    """Aggregates per-request outcomes and timings for one bulk run."""
+
+    def __init__(self, total=None, progress_interval_sec=10.0):
+        self.total = total
+        self.progress_interval_sec = progress_interval_sec
+        self.start = time.time()
+        self.done = 0
+        self.status_codes = Counter()
+        self.errors = Counter()
+        self.cache_hits = 0
+        self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+        self._last_progress = self.start
+
+    def record(self, status_code=None, timings=None, error=None):
+        """
+        Records one request: its HTTP status (or None), wp_client timings and error kind, if any.
+
+        Answers served from the HTTP cache without a request count as done and in
+        cache_hits, but stay out of the status codes and latency histograms.
+        """
+        self.done += 1
+        if (timings or {}).get("cache") == "hit":
+            self.cache_hits += 1
+            return
+        self.status_codes[str(status_code)] += 1
+        if error or status_code is None or status_code >= 400:
+            self.errors[error or str(status_code)] += 1
+        for phase, value in (timings or {}).items():
+            if phase in self.histograms:
+                self.histograms[phase].record(value)
+
+    def record_status(self, status):
+        """Records a status record produced by a bulk worker (dict with 'status_code' and optional 'timing')."""
+        error = None if status.get('status_code') else status.get('message', 'exception')
+        self.record(status.get('status_code'), status.get('timing'), error and error.split(' ')[0])
+
+    def rps(self):
+        elapsed = time.time() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta_sec(self):
+        rps = self.rps()
+        if not self.total or not rps:
+            return None
+        return max(0, (self.total - self.done) / rps)
+
+    def progress_line(self):
+        total = self.histograms["total_ms"]
+        ttfb = self.histograms["ttfb_ms"]
+        eta = self.eta_sec()
+        error_mix = ", ".join(f"{kind}={n}" for kind, n in self.errors.most_common(4)) or "none"
+        return (
+            f"{self.done}/{self.total or '?'} done | {self.rps():.1f} req/s | "
+            f"latency p50={total.percentile(50)}ms p95={total.percentile(95)}ms p99={total.percentile(99)}ms | "
+            f"ttfb p50={ttfb.percentile(50)}ms | errors {sum(self.errors.values())} ({error_mix}) | "
+            f"ETA {f'{eta:.0f}s' if eta is not None else '?'}"
+            + (f" | cache hits {self.cache_hits}" if self.cache_hits else "")
+        )
+
+    def progress_due(self):
+        """True at most once per progress_interval_sec, so callers can log progress after every batch."""
+        now = time.time()
+        if now - self._last_progress >= self.progress_interval_sec:
+            self._last_progress = now
+            return True
+        return False
+
+    def summary(self):
+        elapsed = time.time() - self.start
+        return {
+            "requests": self.done,
+            "elapsed_sec": round(elapsed, 3),
+            "requests_per_sec": round(self.rps(), 2),
+            "status_codes": dict(self.status_codes),
+            "errors": dict(self.errors),
+            "cache_hits": self.cache_hits,
+            "latency_ms": {phase: hist.summary() for phase, hist in self.histograms.items()},
+        }
+
+    @staticmethod
+    def summary_path(status_file):
+        """Where write_summary() puts the summary of a status file."""
+        base = status_file[:-3] if status_file.endswith(".gz") else status_file
+        return f"{os.path.splitext(base)[0]}.metrics.json"
+
+    def write_summary(self, status_file):
+        """Writes the summary as JSON next to the status file and returns its path."""
+        path = self.summary_path(status_file)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
@@ -0,0 +1,67 @@
+"""
+Compact per-item status records for the bulk WordPress tools.
+
+Workers used to return the full `response.text` (the whole post, rendered
+content included) for every item. That text was pickled back from the
+multiprocessing pool, deep-copied for logging and written to the status file.
+A StatusRecord keeps only the fields the status file needs. The full body is
+captured only on failure unless STATUS_CAPTURE=always.
+"""
+
+CAPTURE_MODES = ("failure", "always", "never")
+
+
+class StatusRecord:
+    """One item's outcome. Uses __slots__ so millions of records stay small in memory and over IPC."""
+
+    __slots__ = ("id", "status_code", "post_url", "message", "slug", "title", "deleted", "error_code", "response", "timing")
+
+    def __init__(self, id, post_url=None, status_code=None, message=None, **fields):
+        self.id = id
+        self.post_url = post_url
+        self.status_code = status_code
+        self.message = message
+        for name in ("slug", "title", "deleted", "error_code", "response", "timing"):
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_response(cls, item_id, post_url, response, ok, message, capture="failure"):
+        """Builds a record from an HTTP response, extracting only id/slug/title/deleted or the error code."""
+        record = cls(item_id, post_url, response.status_code, message, timing=getattr(response, "timings", None))
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+
+        if isinstance(body, dict):
+            if ok:
+                # DELETE ?force=true wraps the deleted post in 'previous'
+                post = body.get("previous", body)
+                title = post.get("title")
+                record.slug = post.get("slug")
+                record.title = (title.get("raw") or title.get("rendered")) if isinstance(title, dict) else title
+                record.deleted = body.get("deleted")
+            else:
+                record.error_code = body.get("code")
+
+        if capture == "always" or (capture == "failure" and not ok):
+            record.response = response.text
+        return record
+
+    def get(self, name, default=None):
+        """Dict-style access, so code written for the old status dicts keeps working."""
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def as_dict(self):
+        """Status file representation; empty fields are left out."""
+        data = {"id": self.id, "status_code": self.status_code, "post_url": self.post_url, "message": self.message}
+        for name in ("slug", "title", "deleted", "error_code", "response", "timing"):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    def __repr__(self):
+        summary = {k: v for k, v in self.as_dict().items() if k not in ("response", "timing")}
+        return f"StatusRecord({summary})"
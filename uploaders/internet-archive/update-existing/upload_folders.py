@@ -1,6 +1,10 @@
 import os
+import json
+import mmap
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import internetarchive
-from internetarchive import upload
 from dotenv import load_dotenv  # To load .env file if present
 
 # Load environment variables from a .env file, if it exists
@@ -12,6 +16,16 @@ secret_key = os.getenv("INTERNET_ARCHIVE_SECRET_KEY")
 item_name = os.getenv("ITEM_NAME")
 root_dir = os.getenv("ROOT_DIR")
 
+# Sync settings (optional)
+sync_mode = os.getenv("SYNC_MODE", "true").lower() in ("1", "true", "yes")  # Only upload new or changed files
+upload_workers = int(os.getenv("UPLOAD_WORKERS", 4))  # Batches uploaded in parallel; a batch's files go up one after another
+journal_file = os.getenv("JOURNAL_FILE", f".upload_journal_{item_name}.jsonl")  # Progress journal used to resume interrupted runs
+batch_max_files = int(os.getenv("BATCH_MAX_FILES", 100))  # Files per batch (each file is still its own PUT request)
+batch_max_mb = float(os.getenv("BATCH_MAX_MB", 512))  # Size budget per batch
+defer_derive = os.getenv("DEFER_DERIVE", "true").lower() in ("1", "true", "yes")  # Queue one derive task after all uploads
+manifest_file = os.getenv("MANIFEST_FILE", f".local_manifest_{item_name}.json")  # Cached size/mtime/MD5 of local files
+hash_workers = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))  # Files hashed in parallel
+
 # Ensure required environment variables are set
 if not all([access_key, secret_key, item_name, root_dir]):
     raise EnvironmentError("Missing required environment variables")
@@ -30,22 +44,224 @@ updated_metadata = {
 # Get the existing item from Internet Archive
 item = internetarchive.get_item(item_name, session=session)
 
-# Update the metadata for the existing item (optional)
-item.metadata.update(updated_metadata)
-item.metadata.commit()
+# Update the metadata for the existing item (optional). This is the only metadata
+# write; uploads below do not resend it.
+item.modify_metadata(updated_metadata)
 
-# Function to upload files recursively while preserving folder structure
-def upload_directory(item_name, root_dir, session):
+
+def md5_of(file_path):
+    """Computes the MD5 of a local file through mmap; hashlib releases the GIL, so threads hash in parallel."""
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.md5().hexdigest()  # Empty files cannot be memory-mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return hashlib.md5(mm).hexdigest()
+
+
+def load_manifest(path):
+    """Returns the persisted {relative_path: {"size", "mtime", "md5"}} manifest, or {} if there is none."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"Ignoring unreadable manifest {path}; files will be rehashed.")
+        return {}
+
+
+def save_manifest(path, manifest):
+    """Writes the manifest atomically so an interrupted run never leaves it half-written."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_remote_files(item):
+    """Returns {name: {"size": int, "md5": str}} for every file already in the item (one request)."""
+    remote = {}
+    for f in item.files:
+        remote[f["name"]] = {"size": int(f.get("size", -1)), "md5": f.get("md5")}
+    return remote
+
+
+def load_journal(path):
+    """Returns {relative_path: (size, mtime)} for files uploaded by a previous (possibly interrupted) run."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A run killed mid-write can leave a partial last line
+                done[entry["path"]] = (entry["size"], entry["mtime"])
+    return done
+
+
+class Journal:
+    """Appends one line per successfully uploaded file, flushed immediately so progress survives a crash."""
+
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def record(self, relative_path, size, mtime):
+        with self.lock:
+            self.file.write(json.dumps({"path": relative_path, "size": size, "mtime": mtime}) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def walk_local_files(root_dir):
+    """Yields (file_path, relative_path) for every file under root_dir, preserving folder structure."""
     for root, dirs, files in os.walk(root_dir):
-        for file in files:
+        dirs.sort()
+        for file in sorted(files):
             file_path = os.path.join(root, file)
-            
             # Get the relative path of the file within the root directory
-            relative_path = os.path.relpath(file_path, root_dir)
-            
-            # Upload the file with the preserved relative path
-            print(f"Uploading file: {relative_path}")
-            upload(item_name, files=[file_path], metadata=item.metadata, session=session, file_path=relative_path)
+            yield file_path, os.path.relpath(file_path, root_dir).replace(os.sep, "/")
+
+
+def plan_uploads(root_dir, remote, journaled):
+    """
+    Returns the (file_path, relative_path, size, mtime) of every file that is new or changed.
+
+    Local MD5s come from the manifest and are only recomputed when a file's size
+    or mtime changed. A file is only hashed at all when the remote copy has the
+    same size, since a size mismatch already means it changed.
+    """
+    manifest = load_manifest(manifest_file)
+    local = []
+    to_hash = []
+    for file_path, relative_path in walk_local_files(root_dir):
+        stat = os.stat(file_path)
+        size, mtime = stat.st_size, stat.st_mtime
+        local.append((file_path, relative_path, size, mtime))
+
+        cached = manifest.get(relative_path)
+        remote_file = remote.get(relative_path)
+        needs_md5 = remote_file and remote_file["size"] == size and journaled.get(relative_path) != (size, mtime)
+        if needs_md5 and not (cached and cached["size"] == size and cached["mtime"] == mtime):
+            to_hash.append((file_path, relative_path, size, mtime))
+
+    if to_hash:
+        print(f"Hashing {len(to_hash)} new or modified files with {hash_workers} workers...")
+        with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+            for (_, relative_path, size, mtime), md5 in zip(to_hash, pool.map(lambda entry: md5_of(entry[0]), to_hash)):
+                manifest[relative_path] = {"size": size, "mtime": mtime, "md5": md5}
+
+    # Drop entries for files that no longer exist locally
+    present = {relative_path for _, relative_path, _, _ in local}
+    manifest = {path: entry for path, entry in manifest.items() if path in present}
+    save_manifest(manifest_file, manifest)
+
+    to_upload = []
+    skipped = 0
+    for file_path, relative_path, size, mtime in local:
+        if journaled.get(relative_path) == (size, mtime):
+            skipped += 1
+            continue
+
+        remote_file = remote.get(relative_path)
+        cached = manifest.get(relative_path)
+        if remote_file and cached and remote_file["size"] == size and remote_file["md5"] == cached["md5"]:
+            skipped += 1
+            continue
+
+        to_upload.append((file_path, relative_path, size, mtime))
+    return to_upload, skipped
+
+
+def make_batches(to_upload, max_files, max_bytes):
+    """
+    Groups files into upload batches by directory, splitting a directory when it
+    exceeds max_files or max_bytes. Returns a list of lists of upload tuples.
+    """
+    batches = []
+    current, current_dir, current_bytes = [], None, 0
+    for entry in to_upload:
+        directory = os.path.dirname(entry[1])
+        size = entry[2]
+        if current and (directory != current_dir or len(current) >= max_files or current_bytes + size > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(entry)
+        current_dir = directory
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def upload_batch(item, batch, queue_derive, journal):
+    """
+    Uploads a batch of files one PUT at a time, each under its relative path in the
+    item. The Internet Archive's S3 API takes one file per request, so a batch only
+    decides which worker sends which files. Each file is journaled as soon as it is
+    uploaded, so a failure partway through a batch doesn't lose the files before it.
+    Returns (uploaded count, [(relative_path, error)] for files that failed).
+    """
+    uploaded, failed = 0, []
+    for file_path, relative_path, size, mtime in batch:
+        try:
+            responses = item.upload({relative_path: file_path}, checksum=False, retries=3, queue_derive=queue_derive)
+            for response in responses:
+                response.raise_for_status()
+        except Exception as e:
+            failed.append((relative_path, e))
+            continue
+        journal.record(relative_path, size, mtime)
+        uploaded += 1
+    return uploaded, failed
+
+
+# Function to upload files recursively while preserving folder structure
+def upload_directory(item_name, root_dir, session):
+    remote = fetch_remote_files(item) if sync_mode else {}
+    journaled = load_journal(journal_file) if sync_mode else {}
+
+    if sync_mode:
+        print(f"Remote item has {len(remote)} files, journal has {len(journaled)} uploaded files.")
+        to_upload, skipped = plan_uploads(root_dir, remote, journaled)
+        print(f"{len(to_upload)} files to upload, {skipped} unchanged files skipped.")
+    else:
+        to_upload = []
+        for file_path, relative_path in walk_local_files(root_dir):
+            stat = os.stat(file_path)
+            to_upload.append((file_path, relative_path, stat.st_size, stat.st_mtime))
+
+    batches = make_batches(to_upload, batch_max_files, batch_max_mb * 1024 * 1024)
+    print(f"Uploading {len(to_upload)} files in {len(batches)} batches...")
+
+    journal = Journal(journal_file)
+    uploaded, failed = 0, []
+    try:
+        with ThreadPoolExecutor(max_workers=upload_workers) as pool:
+            futures = {pool.submit(upload_batch, item, batch, not defer_derive, journal): batch for batch in batches}
+            for done, future in enumerate(as_completed(futures), start=1):
+                batch = futures[future]
+                first = batch[0][1]
+                batch_uploaded, batch_failed = future.result()
+                uploaded += batch_uploaded
+                print(f"[{done}/{len(futures)}] Uploaded {batch_uploaded}/{len(batch)} files starting at: {first}")
+                for relative_path, e in batch_failed:
+                    failed.append(relative_path)
+                    print(f"Failed to upload {relative_path}: {e}")
+    finally:
+        journal.close()
+
+    # One derive task for the whole run instead of one per uploaded file
+    if defer_derive and uploaded:
+        print("Queueing a single derive task for the item...")
+        item.derive()
+
+    if failed:
+        print(f"{len(failed)} files failed to upload; run the script again to retry them.")
+
 
 # Start the upload process
 print(f"Updating metadata and uploading files for {item_name}...")
@@ -54,4 +270,4 @@ print(f"Updating metadata and uploading files for {item_name}...")
 upload_directory(item_name, root_dir, session)
 
 # Done!
-print(f"Upload process completed. Visit your item here: https://archive.org/details/{item_name}")
\ No newline at end of file
+print(f"Upload process completed. Visit your item here: https://archive.org/details/{item_name}")